@@ -53,10 +53,12 @@ from bcolz.arrayprint import (
     array2string, set_printoptions, get_printoptions )
 
 from bcolz.carray_ext import (
-    carray, blosc_version, blosc_compressor_list,
-    _blosc_set_nthreads as blosc_set_nthreads,
+    carray, chunkcache, blosc_version, blosc_compressor_list,
+    _blosc_set_nthreads as blosc_set_nthreads, _set_nthreads,
     _blosc_init, _blosc_destroy)
 from bcolz.ctable import ctable
+from bcolz.vlcarray import vlcarray
+from bcolz.catcarray import catcarray
 from bcolz.toplevel import (
     print_versions, detect_number_of_cores, set_nthreads,
     open, fromiter, arange, zeros, ones, fill,
@@ -107,6 +109,7 @@ ncores = detect_number_of_cores()
 blosc_set_nthreads(ncores)
 # Benchmarks show that using several threads can be an advantage in bcolz
 blosc_set_nthreads(ncores)
+_set_nthreads(ncores)
 if numexpr_here:
     numexpr.set_num_threads(ncores)
 import atexit
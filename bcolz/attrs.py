@@ -46,7 +46,7 @@ class attrs(object):
     def __init__(self, rootdir, mode, _new=False):
         self.rootdir = rootdir
         self.mode = mode
-        self.attrs = {}
+        self._attrs = {}
 
         if self.rootdir:
             self.attrsfile = os.path.join(self.rootdir, ATTRSDIR)
@@ -55,7 +55,15 @@ class attrs(object):
             if _new:
                 self._create()
             else:
-                self._open()
+                # The attributes are read on first access
+                self._attrs = None
+
+    @property
+    def attrs(self):
+        "The dictionary of attributes."
+        if self._attrs is None:
+            self._open()
+        return self._attrs
 
     def _create(self):
         if self.mode != 'r':
@@ -77,7 +85,7 @@ class attrs(object):
             except:
                 raise IOError(
                     "Attribute file is not readable")
-        self.attrs = data
+        self._attrs = data
 
     def _update_meta(self):
         """Update attributes on-disk."""
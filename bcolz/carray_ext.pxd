@@ -7,8 +7,22 @@ cdef class chunk:
     cdef int true_count
     cdef char *data
     cdef object atom, constant, dobject
+    cdef readonly object stats
+    # For constant and run-length chunks
+    cdef readonly int flags
+    cdef object constbuf, runends, runvalues
+    # The prefilter applied before compressing (see `bcolz.cparams`)
+    cdef readonly int prefilter
+    # The decoded values of delta chunks (see `chunk.getprefiltered`)
+    cdef object decoded
 
     cdef void _getitem(self, int start, int stop, char *dest)
+    cdef getruns(self, npy_intp start, npy_intp stop, char *dest)
+    cdef getprefiltered(self, npy_intp start, npy_intp stop, char *dest)
+    cdef set_constant(self, ndarray value)
+    cdef int special_blocksize(self)
+    cdef encode_special(self, npy_intp nitems)
+    cdef size_t decode_special(self, int flags, size_t nbytes)
     cdef compress_data(self, char *data, size_t itemsize, size_t nbytes,
                        object cparams)
     cdef compress_arrdata(self, ndarray array, int itemsize,
@@ -18,11 +32,20 @@ cdef class chunk:
 cdef class chunks(object):
     cdef object _rootdir, _mode
     cdef object dtype, cparams, lastchunkarr
-    cdef object chunk_cached
-    cdef npy_intp nchunks, nchunk_cached, len
+    cdef object _cache, _cacheid
+    cdef npy_intp nchunks, len
+    # For the 'segments' layout
+    cdef int _segments, _mmap
+    cdef object _index, _segfiles, _segmaps
+    cdef npy_intp _nsegment, _segsize
+    # For the zone maps (statistics of the chunks)
+    cdef object _zonemaps
+    cdef int _zonemaps_dirty
 
     cdef read_chunk(self, nchunk)
+    cdef _read_segment_chunk(self, nchunk)
     cdef _save(self, nchunk, chunk_)
+    cdef _save_segment(self, nchunk, chunk_)
 
 cdef class carray:
     cdef public int itemsize, atomsize
@@ -41,17 +64,30 @@ cdef class carray:
     cdef object _dtype
     cdef object _safe
     cdef public object chunks
-    cdef object _rootdir, datadir, metadir, _mode
+    cdef object _rootdir, datadir, metadir, _mode, _layout
     cdef object _attrs, iter_exhausted
+    # For objects stored in batches (and the last batch read)
+    cdef int _objbatches
+    cdef object objcache
+    cdef int prefetch
+    cdef object prefetcher
     cdef ndarray iobuf, where_buf
     # For block cache
     cdef int idxcache
-    cdef ndarray blockcache
+    cdef ndarray blockcache, blocktags, blockticks
     cdef char *datacache
+    cdef npy_intp blockcachelen, nblockslots, blockways, blocktick
+    cdef npy_intp blockhits, blockmisses, _blockcache_size
 
     cdef void bool_update(self, boolarr, value)
+    cdef _init_blockcache(self, npy_intp blocklen)
     cdef int getitem_cache(self, npy_intp pos, char *dest)
     cdef reset_iter_sentinels(self)
+    cdef next_prefetched(self, npy_intp nrow)
     cdef int check_zeros(self, object barr)
     cdef _adapt_dtype(self, dtype_, shape)
+    cdef append_chunks(self, ndarray array_, npy_intp nchunks)
+    cdef trim_values(self, object array)
+    cdef read_chunks(self, ndarray out, object reads)
+    cdef read_chunk(self, ndarray out, object read)
 
@@ -12,10 +12,16 @@ import sys
 import os
 import os.path
 import struct
+import mmap
 import shutil
 import tempfile
 import json
 import datetime
+import pickle
+import threading
+import itertools
+from collections import OrderedDict, deque
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
 cimport numpy as np
@@ -58,6 +64,50 @@ FORMAT_VERSION = 1
 MAX_FORMAT_VERSION = 255
 MAX_CHUNKS = (2 ** 63) - 1
 
+# For the 'segments' layout of the persistence layer
+LAYOUTS = ('files', 'segments')
+SEGMENT_PREFIX = '__seg'
+SEGMENT_INDEX_FILE = '__segindex__'
+LEFTOVER_FILE = '__leftover__' + EXTENSION
+# Every entry in the segment index is made of 4 little-endian int64:
+# (segment number, offset inside segment, compressed bytes, flags)
+SEGMENT_INDEX_DTYPE = np.dtype('<i8')
+SEGMENT_INDEX_WIDTH = 4
+SEGMENT_INDEX_ENTRY = SEGMENT_INDEX_WIDTH * SEGMENT_INDEX_DTYPE.itemsize
+# Start a new segment file when the current one exceeds this size
+SEGMENT_SIZE = 2 ** 30
+
+# The file in the meta directory keeping the statistics of every chunk
+ZONEMAPS_FILE = 'zonemaps'
+# The dtype kinds for which chunk statistics are computed
+ZONEMAP_KINDS = 'biufMm'
+
+# The number of slots in every set of the cache for decompressed blocks
+BLOCKCACHE_WAYS = 4
+
+# The flags for chunks that are not stored as plain Blosc buffers, but as
+# a single value (constant) or as runs of values (run-length)
+CONSTANT_CHUNK = 1
+RLE_CHUNK = 2
+# The flags known by this version of bcolz
+KNOWN_FLAGS = (0, CONSTANT_CHUNK, RLE_CHUNK)
+# The format version of the files with chunks having flags, so that they
+# are not mistaken by plain Blosc buffers
+FLAGS_FORMAT_VERSION = 2
+# Chunks are run-length encoded when runs are this long in average
+RLE_MIN_RUNLEN = 64
+
+# The codes for the prefilters in `bcolz.cparams`, and the kinds of data
+# they are applied to
+PREFILTER_DELTA = 1
+PREFILTER_DELTA2 = 2
+PREFILTER_FOR = 3
+PREFILTER_CODES = {None: 0, 'delta': PREFILTER_DELTA,
+                   'delta2': PREFILTER_DELTA2, 'for': PREFILTER_FOR}
+PREFILTER_KINDS = 'iumM'
+# The number of delta chunks that keep their values decoded
+PREFILTER_CACHE_CHUNKS = 4
+
 # The type used for size values: indexes, coordinates, dimension
 # lengths, row numbers, shapes, chunk shapes, byte counts...
 SizeType = np.int64
@@ -73,6 +123,7 @@ from definitions cimport (malloc,
                           free,
                           memcpy,
                           memset,
+                          memcmp,
                           strdup,
                           strcmp,
                           PyString_AsString,
@@ -169,6 +220,54 @@ def _blosc_set_nthreads(nthreads):
     """
     return blosc_set_nthreads(nthreads)
 
+# The pool of threads for computing the partial results of reductions
+_nthreads = 1
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def _set_nthreads(nthreads):
+    """
+    _set_nthreads(nthreads)
+
+    Sets the number of threads for computing the partial results of
+    reductions.
+
+    Parameters
+    ----------
+    nthreads : int
+        The desired number of threads to use.
+
+    Returns
+    -------
+    out : int
+        The previous setting for the number of threads.
+    """
+    global _nthreads
+    nthreads_old = _nthreads
+    _nthreads = max(1, nthreads)
+    return nthreads_old
+
+def _get_pool():
+    """Return the pool of threads for computing the partial results.
+
+    The pool has as many threads as set in `_set_nthreads()`.  None is
+    returned if just one thread is to be used.
+    """
+    global _pool, _pool_pid
+    if _nthreads <= 1:
+        return None
+    with _pool_lock:
+        # The threads of the pool do not survive a fork()
+        if (_pool is None or _pool._processes != _nthreads or
+                _pool_pid != os.getpid()):
+            if _pool is not None and _pool_pid == os.getpid():
+                # Threads will go away after finishing the pending tasks
+                _pool.close()
+            _pool = ThreadPool(_nthreads)
+            _pool_pid = os.getpid()
+        return _pool
+
 def _blosc_init():
     """
     _blosc_init()
@@ -277,6 +376,97 @@ cdef int check_zeros(char *data, int nbytes):
                     break
     return iszero
 
+cdef int check_constant(char *data, npy_intp nbytes, int atomsize):
+    """Check whether all the atoms in [data, data+nbytes] are equal."""
+    if nbytes <= atomsize:
+        return 1
+    # The data is equal to itself shifted by one atom only if it is made
+    # of repetitions of the first atom
+    return memcmp(data, data + atomsize, nbytes - atomsize) == 0
+
+cdef npy_intp find_runs(char *data, npy_intp nitems, int atomsize,
+                        ndarray ends):
+    """Put the end of every run of equal atoms in `data` into `ends`.
+
+    Return the number of runs, or -1 if they do not fit in `ends`.
+    """
+    cdef npy_intp i, nruns, maxruns
+    cdef npy_intp *ends_
+
+    ends_ = <npy_intp *> ends.data
+    maxruns = len(ends)
+    nruns = 0
+    for i from 1 <= i < nitems:
+        if memcmp(data + (i - 1) * atomsize, data + i * atomsize,
+                  atomsize) != 0:
+            if nruns == maxruns:
+                return -1
+            ends_[nruns] = i
+            nruns += 1
+    if nruns == maxruns:
+        return -1
+    ends_[nruns] = nitems
+    return nruns + 1
+
+def prefilter_code(object cparams, object atom):
+    """Return the code of the prefilter for chunks of `atom` data."""
+    if cparams.prefilter is None or atom.base.kind not in PREFILTER_KINDS:
+        return 0
+    return PREFILTER_CODES[cparams.prefilter]
+
+cdef object prefilter_values(ndarray array):
+    """Return a 2-d integer view of `array` with one row per atom."""
+    if array.dtype.kind in 'mM':
+        array = array.view(np.int64)
+    return array.reshape((len(array), -1))
+
+def encode_prefilter(ndarray array, int code):
+    """Return a copy of `array` with the prefilter `code` applied.
+
+    The first value of the chunk is kept, and integer overflows just wrap
+    around, so the filter can always be undone.
+    """
+    encoded = prefilter_values(np.ascontiguousarray(array)).copy()
+    if code == PREFILTER_FOR:
+        encoded[1:] -= encoded[0]
+    else:
+        encoded[1:] = np.diff(encoded, axis=0)
+        if code == PREFILTER_DELTA2:
+            encoded[2:] = np.diff(encoded[1:], axis=0)
+    return encoded
+
+def undo_prefilter(ndarray array, int code):
+    """Undo the prefilter `code` in the (contiguous) `array` in-place."""
+    values = prefilter_values(array)
+    if code == PREFILTER_FOR:
+        values[1:] += values[0]
+    else:
+        if code == PREFILTER_DELTA2:
+            np.cumsum(values[1:], axis=0, dtype=values.dtype,
+                      out=values[1:])
+        np.cumsum(values, axis=0, dtype=values.dtype, out=values)
+
+def trim_mantissa(object array, int bits):
+    """Return a copy of the float `array` with the `bits` lowest bits of
+    the mantissas set to zero.
+
+    Non-finite values are kept, and so is the whole array if its type
+    cannot be handled.
+    """
+    floats = np.ascontiguousarray(array)
+    if floats.dtype.kind == 'c':
+        # Trim the real and imaginary parts
+        floats = floats.view('f%d' % cython.cdiv(floats.dtype.itemsize, 2))
+    if floats.dtype.itemsize not in (2, 4, 8):
+        return array
+    ints = floats.view('u%d' % floats.dtype.itemsize)
+    bits = min(bits, np.finfo(floats.dtype).nmant)
+    one = np.ones((), dtype=ints.dtype)
+    mask = ~(np.left_shift(one, np.array(bits, dtype=ints.dtype)) - one)
+    trimmed = np.where(np.isfinite(floats), (ints & mask).view(floats.dtype),
+                       floats)
+    return trimmed.view(array.dtype).reshape(array.shape)
+
 cdef int true_count(char *data, int nbytes):
     """Count the number of true values in data (boolean)."""
     cdef int i, count
@@ -287,9 +477,74 @@ cdef int true_count(char *data, int nbytes):
             count += <int> (data[i])
     return count
 
+def compute_stats(object array):
+    """Return the (min, max, nnull) statistics for values in `array`.
+
+    `min` and `max` only take non-null values into account, and `nnull`
+    is the number of NaN (or NaT) values.  If all the values are null,
+    `min` and `max` are null too.
+    """
+    cdef object mn, mx, nulls, valid
+
+    kind = array.dtype.kind
+    if kind in 'Mm':
+        # Work with the underlying integers, where NaT is the minimum
+        ivalues = array.view(np.int64)
+        mn, mx, nnull = compute_stats(ivalues)
+        nnull = int((ivalues == np.iinfo(np.int64).min).sum())
+        if nnull and nnull < array.size:
+            mn = ivalues[ivalues != np.iinfo(np.int64).min].min()
+        bounds = np.array([mn, mx], dtype=np.int64).view(array.dtype)
+        return bounds[0], bounds[1], nnull
+    mn, mx = array.min(), array.max()
+    nnull = 0
+    if kind == 'f' and (np.isnan(mn) or np.isnan(mx)):
+        nulls = np.isnan(array)
+        nnull = int(nulls.sum())
+        if nnull < array.size:
+            valid = array[~nulls]
+            mn, mx = valid.min(), valid.max()
+    return mn, mx, nnull
+
+def run_lengths(object ends):
+    """Return the lengths of the runs that end at `ends`."""
+    return ends - np.concatenate(([0], ends[:-1]))
+
+def pack_objects(object objs):
+    """Serialize the `objs` sequence into a batch of pickles.
+
+    The batch starts with the number of objects and a table of offsets
+    (all int64), so that every object can be unpickled separately.
+    """
+    pickles = [pickle.dumps(obj, pickle.HIGHEST_PROTOCOL) for obj in objs]
+    offsets = np.zeros(len(pickles) + 2, dtype=np.int64)
+    offsets[0] = len(pickles)
+    np.cumsum([len(p) for p in pickles], out=offsets[2:])
+    return offsets.tostring() + b"".join(pickles)
+
+def unpack_offsets(object data):
+    """Return the (offsets, base) for a batch made by `pack_objects()`.
+
+    The pickle for object `i` is in ``data[base+offsets[i]:
+    base+offsets[i+1]]``.
+    """
+    nobjs = np.frombuffer(data, dtype=np.int64, count=1)[0]
+    offsets = np.frombuffer(data, dtype=np.int64, count=nobjs + 1,
+                            offset=8)
+    return offsets, (nobjs + 2) * 8
+
+def unpack_objects(object data):
+    """Return the list of objects in a batch made by `pack_objects()`."""
+    offsets, base = unpack_offsets(data)
+    return [pickle.loads(data[base + offsets[i]:base + offsets[i + 1]])
+            for i in xrange(len(offsets) - 1)]
+
 #-------------------------------------------------------------
 
 
+# The delta chunks keeping their decoded values, oldest first
+_decoded_chunks = deque()
+
 cdef class chunk:
     """
     chunk(array, atom, cparams)
@@ -298,6 +553,17 @@ cdef class chunk:
 
     This class is meant to be used only by the `carray` class.
 
+    Chunks made out of arrays of numerical (or datetime) types keep the
+    (min, max, nnull) statistics of their values in the `stats` attribute
+    (see `compute_stats()`).  It is None for the rest.
+
+    Chunks whose values are all equal are kept as a single value, and
+    chunks made of long runs of equal values are kept as the runs (see the
+    `flags` attribute).  When persisted, these are saved as Blosc buffers
+    with an int64 number of items followed by the value (CONSTANT_CHUNK),
+    or by the int64 end of every run and the values of the runs
+    (RLE_CHUNK).
+
     """
 
     property dtype:
@@ -306,7 +572,7 @@ cdef class chunk:
             return self.atom
 
     def __cinit__(self, object dobject, object atom, object cparams,
-                  object _memory=True, object _compr=False):
+                  object _memory=True, object _compr=False, int _flags=0):
         cdef int itemsize, footprint
         cdef size_t nbytes, cbytes, blocksize
         cdef dtype dtype_
@@ -331,26 +597,55 @@ cdef class chunk:
                 "types larger than %d bytes" % (itemsize, BLOSC_MAX_TYPESIZE))
         self.itemsize = itemsize
         self.dobject = None
+        self.isconstant = 0
+        self.flags = 0
+        self.prefilter = 0
+        self.decoded = None
+        self.true_count = -1
         footprint = 0
 
         if _compr:
-            # Data comes in an already compressed state inside a Python String
-            self.data = PyString_AsString(dobject)
+            # Data comes in an already compressed state inside a Python
+            # String, or inside a NumPy view of a memory mapped file
+            if isinstance(dobject, np.ndarray):
+                self.data = (<ndarray>dobject).data
+            else:
+                self.data = PyString_AsString(dobject)
             # Increment the reference so that data don't go away
             self.dobject = dobject
             # Set size info for the instance
             blosc_cbuffer_sizes(self.data, &nbytes, &cbytes, &blocksize)
+            if _flags:
+                nbytes = self.decode_special(_flags, nbytes)
+                blocksize = self.special_blocksize()
+            else:
+                self.prefilter = prefilter_code(cparams, atom)
         elif dtype_ == 'O':
             # The objects should arrive here already pickled
             data = PyString_AsString(dobject)
             nbytes = PyString_GET_SIZE(dobject)
             cbytes, blocksize = self.compress_data(data, 1, nbytes, cparams)
         else:
+            if cparams.trimbits and self.typekind in b'fc':
+                # Lossy trimming of floats, that the statistics see too
+                dobject = trim_mantissa(dobject, cparams.trimbits)
             # Compress the data object (a NumPy object)
             nbytes, cbytes, blocksize, footprint = self.compress_arrdata(
                 dobject, itemsize, cparams, _memory)
         footprint += 128  # add the (aprox) footprint of this instance in bytes
 
+        # Gather the statistics of the values for the zone maps
+        self.stats = None
+        if (not _compr and atom.base.kind in ZONEMAP_KINDS and
+                len(dobject) > 0):
+            if self.isconstant:
+                # Scale the nulls in the value to the whole chunk
+                mn, mx, nnull = compute_stats(self.constbuf)
+                self.stats = (mn, mx, nnull * cython.cdiv(
+                    nbytes, self.constbuf.nbytes))
+            else:
+                self.stats = compute_stats(dobject)
+
         # Fill instance data
         self.nbytes = nbytes
         self.cbytes = cbytes + footprint
@@ -361,51 +656,136 @@ cdef class chunk:
                           object cparams, object _memory):
         """Compress data in `array` and put it in ``self.data``"""
         cdef size_t nbytes, cbytes, blocksize, footprint
+        cdef npy_intp nitems, nruns
+        cdef ndarray ends
 
         # Compute the total number of bytes in this array
         nbytes = array.itemsize * array.size
+        nitems = len(array)
         cbytes = 0
         footprint = 0
 
-        # Check whether incoming data can be expressed as a constant or not.
-        # Disk-based chunks are not allowed to do this.
-        self.isconstant = 0
-        self.constant = None
-        if _memory and (array.strides[0] == 0
-                        or check_zeros(array.data, nbytes)):
+        if array.dtype.kind == 'b':
+            if array.strides[0] == 0:
+                self.true_count = nitems if array[0] else 0
+            else:
+                self.true_count = true_count(array.data, nbytes)
 
+        # Check whether incoming data can be expressed as a constant or as
+        # runs of constants
+        self.constant = None
+        if array.strides[0] == 0 or check_constant(array.data, nbytes,
+                                                   self.atomsize):
             self.isconstant = 1
-            # Get the NumPy constant.  Avoid this NumPy quirk:
-            # np.array(['1'], dtype='S3').dtype != s[0].dtype
-            if array.dtype.kind != 'S':
-                self.constant = array[0]
-            else:
-                self.constant = np.array(array[0], dtype=array.dtype)
+            self.flags = CONSTANT_CHUNK
+            self.set_constant(array[:1].copy())
             # Add overhead (64 bytes for the overhead of the numpy container)
             footprint += 64 + self.constant.size * self.constant.itemsize
-
-        if self.isconstant:
-            blocksize = 4 * 1024  # use 4 KB as a cache for blocks
-            # Make blocksize a multiple of itemsize
-            if blocksize % itemsize > 0:
-                blocksize = cython.cdiv(blocksize, itemsize) * itemsize
-            # Correct in case we have a large itemsize
-            if blocksize == 0:
-                blocksize = itemsize
+        elif nitems >= 2 * RLE_MIN_RUNLEN:
+            ends = np.empty(nitems // RLE_MIN_RUNLEN,
+                            dtype=np.intp)
+            nruns = find_runs(array.data, nitems, self.atomsize, ends)
+            if nruns > 0:
+                self.flags = RLE_CHUNK
+                self.runends = ends[:nruns].astype(SizeType)
+                self.runvalues = array[ends[:nruns] - 1]
+                footprint += (128 + self.runends.nbytes +
+                              self.runvalues.nbytes)
+
+        if self.flags:
+            blocksize = self.special_blocksize()
+            if not _memory:
+                # Keep the encoded chunk, ready for being persisted
+                data = self.encode_special(nitems)
+                cbytes, _ = self.compress_data(
+                    PyString_AsString(data), 1, len(data), cparams)
         else:
-            if self.typekind == 'b':
-                self.true_count = true_count(array.data, nbytes)
-
-            if array.strides[0] == 0:
-                # The chunk is made of constants.  Regenerate the actual data.
-                array = array.copy()
-
+            self.prefilter = prefilter_code(cparams, self.atom)
+            if self.prefilter:
+                array = encode_prefilter(array, self.prefilter)
             # Compress data
             cbytes, blocksize = self.compress_data(
                 array.data, itemsize, nbytes, cparams)
 
         return (nbytes, cbytes, blocksize, footprint)
 
+    cdef set_constant(self, ndarray value):
+        """Make this a chunk of constants out of the single atom `value`."""
+        self.constbuf = value
+        # Get the NumPy constant.  Avoid this NumPy quirk:
+        # np.array(['1'], dtype='S3').dtype != s[0].dtype
+        if value.dtype.kind != 'S':
+            self.constant = value[0]
+        else:
+            self.constant = np.array(value[0], dtype=value.dtype)
+
+    cdef int special_blocksize(self):
+        """The size of the blocks cached for constant and run chunks."""
+        cdef int blocksize
+
+        blocksize = 4 * 1024  # use 4 KB as a cache for blocks
+        # Make blocksize a multiple of itemsize
+        if blocksize % self.itemsize > 0:
+            blocksize = cython.cdiv(blocksize, self.itemsize) * self.itemsize
+        # Correct in case we have a large itemsize
+        if blocksize == 0:
+            blocksize = self.itemsize
+        return blocksize
+
+    cdef encode_special(self, npy_intp nitems):
+        """Return the bytes for persisting a constant or run chunk."""
+        parts = [np.array([nitems], dtype='<i8').tostring()]
+        if self.flags == CONSTANT_CHUNK:
+            parts.append(self.constbuf.tostring())
+        else:
+            parts.append(self.runends.astype('<i8').tostring())
+            parts.append(np.ascontiguousarray(self.runvalues).tostring())
+        return b"".join(parts)
+
+    cdef size_t decode_special(self, int flags, size_t nbytes):
+        """Decode the persisted form of a constant or run chunk.
+
+        `nbytes` is the size of the encoded form.  The size of the actual
+        data is returned.
+        """
+        cdef ndarray encoded
+        cdef npy_intp nitems, nruns
+        cdef int ret
+
+        encoded = np.empty(nbytes, dtype=np.uint8)
+        ret = blosc_decompress(self.data, encoded.data, nbytes)
+        if ret < 0:
+            raise RuntimeError(
+                "fatal error during Blosc decompression: %d" % ret)
+        nitems = encoded[:8].view('<i8')[0]
+        base = self.atom.base
+        shape = self.atom.shape
+        if flags == CONSTANT_CHUNK:
+            self.isconstant = 1
+            value = encoded[8:8 + self.atomsize].view(base)
+            self.set_constant(value.reshape((1,) + shape).copy())
+        elif flags == RLE_CHUNK:
+            nruns = cython.cdiv(nbytes - 8, 8 + self.atomsize)
+            self.runends = encoded[8:8 + nruns * 8].view('<i8').astype(
+                SizeType)
+            values = encoded[8 + nruns * 8:].view(base)
+            self.runvalues = values.reshape((nruns,) + shape).copy()
+        else:
+            raise ValueError("unknown flags for chunk: %d" % flags)
+        self.flags = flags
+        return nitems * self.atomsize
+
+    def runs(self):
+        """
+        runs()
+
+        Return the (ends, values) of the runs of a run-length chunk, or
+        None for the rest.
+        """
+        if self.flags != RLE_CHUNK:
+            return None
+        return self.runends, self.runvalues
+
     cdef compress_data(self, char *data, size_t itemsize, size_t nbytes,
                        object cparams):
         """Compress data with `cparams` and return metadata."""
@@ -418,13 +798,15 @@ cdef class chunk:
         cname = cparams.cname
         if type(cname) != bytes:
             cname = cname.encode()
+        dest = <char *> malloc(nbytes + BLOSC_MAX_OVERHEAD)
         if blosc_set_compressor(cname) < 0:
+            free(dest)
             raise ValueError(
                 "Compressor '%s' is not available in this build" % cname)
-        dest = <char *> malloc(nbytes + BLOSC_MAX_OVERHEAD)
         ret = blosc_compress(clevel, shuffle, itemsize, nbytes,
                              data, dest, nbytes + BLOSC_MAX_OVERHEAD)
         if ret <= 0:
+            free(dest)
             raise RuntimeError(
                 "fatal error during Blosc compression: %d" % ret)
         # Free the unused data
@@ -440,7 +822,8 @@ cdef class chunk:
         """Get a compressed string object out of this chunk (for persistence)."""
         cdef object string
 
-        assert (not self.isconstant,
+        if self.data == NULL:
+            raise ValueError(
                 "This function can only be used for persistency")
         string = PyString_FromStringAndSize(self.data,
                                             <Py_ssize_t> self.cdbytes)
@@ -472,20 +855,98 @@ cdef class chunk:
 
         if self.isconstant:
             # The chunk is made of constants
+            if blen == 1:
+                memcpy(dest, (<ndarray>self.constbuf).data, bsize)
+                return
             constants = np.ndarray(shape=(blen,), dtype=self.dtype,
                                    buffer=self.constant, strides=(0,)).copy()
             memcpy(dest, constants.data, bsize)
             return
+        if self.flags == RLE_CHUNK:
+            # Expand the runs overlapping [start, stop)
+            self.getruns(start, stop, dest)
+            return
+        if self.prefilter:
+            # Undoing the prefilter requires the whole chunk
+            self.getprefiltered(start, stop, dest)
+            return
 
-        # Fill dest with uncompressed data
-        if bsize == self.nbytes:
-            ret = blosc_decompress(self.data, dest, bsize)
-        else:
-            ret = blosc_getitem(self.data, nstart, nitems, dest)
+        # Fill dest with uncompressed data.  Blosc protects decompressions
+        # with its own lock, so the GIL can be released.
+        with nogil:
+            if bsize == self.nbytes:
+                ret = blosc_decompress(self.data, dest, bsize)
+            else:
+                ret = blosc_getitem(self.data, nstart, nitems, dest)
         if ret < 0:
             raise RuntimeError(
                 "fatal error during Blosc decompression: %d" % ret)
 
+    cdef getruns(self, npy_intp start, npy_intp stop, char *dest):
+        """Expand the runs for the items in [start, stop) into `dest`."""
+        cdef ndarray values
+        cdef npy_intp first
+
+        ends = self.runends
+        first = ends.searchsorted(start, side='right')
+        if stop - start == 1:
+            # A single item
+            values = self.runvalues
+            memcpy(dest, values.data + first * self.atomsize, self.atomsize)
+            return
+        last = ends.searchsorted(stop - 1, side='right') + 1
+        bounds = np.minimum(ends[first:last], stop)
+        lengths = bounds - np.concatenate(([start], bounds[:-1]))
+        values = np.ascontiguousarray(
+            np.repeat(self.runvalues[first:last], lengths, axis=0))
+        memcpy(dest, values.data, (stop - start) * self.atomsize)
+
+    cdef getprefiltered(self, npy_intp start, npy_intp stop, char *dest):
+        """Undo the prefilter of the items in [start, stop) into `dest`.
+
+        The 'for' prefilter only needs the first value of the chunk, so
+        just the asked items are decompressed.  The deltas need all the
+        previous ones, so the whole chunk is decoded, and the values are
+        kept for the next reads (in up to PREFILTER_CACHE_CHUNKS chunks).
+        """
+        cdef ndarray values, base
+        cdef int ret, atomitems
+
+        if self.prefilter == PREFILTER_FOR:
+            atomitems = cython.cdiv(self.atomsize, self.itemsize)
+            base = np.empty(1, dtype=self.atom)
+            values = np.empty(stop - start, dtype=self.atom)
+            with nogil:
+                ret = blosc_getitem(self.data, 0, atomitems, base.data)
+                if ret >= 0:
+                    ret = blosc_getitem(self.data, start * atomitems,
+                                        (stop - start) * atomitems,
+                                        values.data)
+            if ret < 0:
+                raise RuntimeError(
+                    "fatal error during Blosc decompression: %d" % ret)
+            offsets = prefilter_values(values)
+            offsets[1 if start == 0 else 0:] += prefilter_values(base)[0]
+            memcpy(dest, values.data, (stop - start) * self.atomsize)
+            return
+
+        values = self.decoded
+        if values is None:
+            values = np.empty(cython.cdiv(self.nbytes, self.atomsize),
+                              dtype=self.atom)
+            with nogil:
+                ret = blosc_decompress(self.data, values.data, self.nbytes)
+            if ret < 0:
+                raise RuntimeError(
+                    "fatal error during Blosc decompression: %d" % ret)
+            undo_prefilter(values, self.prefilter)
+            self.decoded = values
+            _decoded_chunks.append(self)
+            if len(_decoded_chunks) > PREFILTER_CACHE_CHUNKS:
+                (<chunk>_decoded_chunks.popleft()).decoded = None
+        memcpy(dest, values.data + start * self.atomsize,
+               (stop - start) * self.atomsize)
+
     def __getitem__(self, object key):
         """__getitem__(self, key) -> values."""
         cdef ndarray array
@@ -551,12 +1012,13 @@ cdef class chunk:
 
     def __dealloc__(self):
         """Release C resources before destruction."""
-        if self.dobject:
+        if self.dobject is not None:
             self.dobject = None  # DECREF pointer to data object
         else:
             free(self.data)  # explictly free the data area
 
-cdef create_bloscpack_header(nchunks=None, format_version=FORMAT_VERSION):
+cdef create_bloscpack_header(nchunks=None, format_version=FORMAT_VERSION,
+                             flags=0):
     """ Create the bloscpack header string.
 
     Parameters
@@ -565,6 +1027,8 @@ cdef create_bloscpack_header(nchunks=None, format_version=FORMAT_VERSION):
         the number of chunks, default: None
     format_version : int
         the version format for the compressed file
+    flags : int
+        the flags of the chunk in the file (see `chunk`), default: 0
 
     Returns
     -------
@@ -577,14 +1041,20 @@ cdef create_bloscpack_header(nchunks=None, format_version=FORMAT_VERSION):
     The bloscpack header is 16 bytes as follows:
 
     |-0-|-1-|-2-|-3-|-4-|-5-|-6-|-7-|-8-|-9-|-A-|-B-|-C-|-D-|-E-|-F-|
-    | b   l   p   k | ^ | RESERVED  |           nchunks             |
+    | b   l   p   k | ^ | ^ |RESERVD|           nchunks             |
                    version
+                       flags
 
     The first four are the magic string 'blpk'. The next one is an 8 bit
-    unsigned little-endian integer that encodes the format version. The next
-    three are reserved, and the last eight are a signed  64 bit little endian
+    unsigned little-endian integer that encodes the format version, and
+    the next one another one for the flags of the chunk. The next two are
+    reserved, and the last eight are a signed  64 bit little endian
     integer that encodes the number of chunks
 
+    Files with chunks having flags use `FLAGS_FORMAT_VERSION`, so that
+    readers that do not know about flags do not take them as plain Blosc
+    buffers.
+
     The value of '-1' for 'nchunks' designates an unknown size and can be
     inserted by setting 'nchunks' to None.
 
@@ -596,11 +1066,11 @@ cdef create_bloscpack_header(nchunks=None, format_version=FORMAT_VERSION):
         if the format_version is too large or negative
 
     """
-    if not 0 <= nchunks <= MAX_CHUNKS and nchunks is not None:
+    if nchunks is not None and not 0 <= nchunks <= MAX_CHUNKS:
         raise ValueError(
             "'nchunks' must be in the range 0 <= n <= %d, not '%s'" %
             (MAX_CHUNKS, str(nchunks)))
-    return (MAGIC + struct.pack('<B', format_version) + b'\x00\x00\x00' +
+    return (MAGIC + struct.pack('<BB', format_version, flags) + b'\x00\x00' +
             struct.pack('<q', nchunks if nchunks is not None else -1))
 
 if sys.version_info >= (3, 0):
@@ -609,6 +1079,25 @@ if sys.version_info >= (3, 0):
 else:
     def decode_byte(byte):
         return int(byte.encode('hex'), 16)
+def check_chunk_format(format_version, flags, path):
+    """Check that a chunk in `path` can be read by this version of bcolz.
+
+    Raises
+    ------
+    IOError
+        if the `format_version` or the `flags` of the chunk are unknown
+
+    """
+    if format_version > FLAGS_FORMAT_VERSION:
+        raise IOError(
+            "the chunks in '%s' have format version %d, but this version of "
+            "bcolz only supports up to %d" %
+            (path, format_version, FLAGS_FORMAT_VERSION))
+    if flags not in KNOWN_FLAGS:
+        raise IOError(
+            "the chunks in '%s' have unknown flags (%d); they were probably "
+            "written by a newer version of bcolz" % (path, flags))
+
 def decode_uint32(fourbyte):
     return struct.unpack('<I', fourbyte)[0]
 
@@ -652,8 +1141,188 @@ cdef decode_blosc_header(buffer_):
             'blocksize': decode_uint32(buffer_[8:12]),
             'ctbytes': decode_uint32(buffer_[12:16])}
 
+if hasattr(os, 'pread'):
+    _pread = os.pread
+else:
+    def _pread(fd, nbytes, offset):
+        """Read `nbytes` from the `fd` descriptor starting at `offset`."""
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.read(fd, nbytes)
+
+if hasattr(os, 'replace'):
+    _replace = os.replace
+else:
+    def _replace(src, dst):
+        """Rename `src` into `dst`, overwriting it if it exists."""
+        if sys.platform == 'win32' and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+def parse_meta(sizes, storage):
+    """Get the arguments of `carray.open_carray()` out of the metadata.
+
+    `sizes` and `storage` are the dictionaries in the sizes and storage
+    files of a persistent carray.
+    """
+    shape = sizes['shape']
+    if type(shape) == list:
+        shape = tuple(shape)
+    cbytes = sizes["cbytes"]
+    dtype_ = np.dtype(storage["dtype"])
+    chunklen = storage["chunklen"]
+    cparams = bcolz.cparams(
+        clevel=storage["cparams"]["clevel"],
+        shuffle=storage["cparams"]["shuffle"],
+        prefilter=storage["cparams"].get("prefilter"),
+        trimbits=storage["cparams"].get("trimbits", 0))
+    expectedlen = storage["expectedlen"]
+    dflt = storage["dflt"]
+    # Objects were stored one per chunk before bcolz 0.9
+    objbatches = storage.get("objbatches", False)
+    return (shape, cparams, dtype_, dflt, expectedlen, cbytes, chunklen,
+            objbatches)
+
+
+class chunkcache(object):
+    """
+    chunkcache(maxbytes=None)
+
+    A LRU cache for the compressed chunks of persistent carrays.
+
+    The cache keeps the most recently used chunks while their compressed
+    size fits in `maxbytes`.  A single cache can be shared by any number of
+    carrays (this is the default for all of them), so the memory budget is
+    for the whole process, not per carray.
+
+    Parameters
+    ----------
+    maxbytes : int, optional
+        The maximum number of compressed bytes kept in the cache.  If None,
+        `bcolz.defaults.chunk_cache_size` is used (and changes to it are
+        honored dynamically).
+
+    Notes
+    -----
+    The chunk that was used last is always kept, even if it does not fit
+    in `maxbytes`.
+
+    """
+
+    @property
+    def maxbytes(self):
+        """The budget (in compressed bytes) for the cache."""
+        if self._maxbytes is None:
+            return bcolz.defaults.chunk_cache_size
+        return self._maxbytes
+
+    @maxbytes.setter
+    def maxbytes(self, value):
+        if value is not None and value < 0:
+            raise ValueError("`maxbytes` cannot be negative")
+        self._maxbytes = value
+        with self._lock:
+            self._evict()
+
+    @property
+    def nbytes(self):
+        """The number of compressed bytes kept in the cache."""
+        return self._nbytes
+
+    def __init__(self, maxbytes=None):
+        # Reentrant, because the garbage collector may release a carray
+        # (and hence clear its entries) while the lock is being held
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        if maxbytes is not None and maxbytes < 0:
+            raise ValueError("`maxbytes` cannot be negative")
+        self._maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return "chunkcache(nbytes=%d, maxbytes=%d, nchunks=%d)" % (
+            self._nbytes, self.maxbytes, len(self._entries))
+
+    def get(self, key):
+        """Return the chunk cached for `key` (or None if not there)."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            # Move the entry to the most recently used end
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, chunk_, nbytes):
+        """Cache the `chunk_` taking `nbytes` under `key`."""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._nbytes -= old[1]
+            self._entries[key] = (chunk_, nbytes)
+            self._nbytes += nbytes
+            self._evict()
+
+    def discard(self, key):
+        """Remove the entry for `key`, if present."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._nbytes -= entry[1]
+
+    def clear(self, owner=None):
+        """Remove all the entries, or only the ones for `owner` if passed.
+
+        Keys are (owner, nchunk) tuples.
+        """
+        with self._lock:
+            if owner is None:
+                self._entries.clear()
+                self._nbytes = 0
+                return
+            for key in [k for k in self._entries if k[0] == owner]:
+                self._nbytes -= self._entries.pop(key)[1]
+
+    def _evict(self):
+        maxbytes = self.maxbytes
+        entries = self._entries
+        while self._nbytes > maxbytes and len(entries) > 1:
+            key, entry = entries.popitem(last=False)
+            self._nbytes -= entry[1]
+
+
+# The cache shared by default by all the persistent carrays
+_chunk_cache = chunkcache()
+# Generator of identifiers for the cache entries of every chunks instance
+_cache_owners = itertools.count()
+
 cdef class chunks(object):
-    """Store the different carray chunks in a directory on-disk."""
+    """Store the different carray chunks in a directory on-disk.
+
+    Chunks can be laid out on-disk in two different ways:
+
+      * 'files': every chunk is saved in its own data/__N.blp file
+      * 'segments': chunks are appended to a series of data/__segN.blp
+        files, and a compact index (data/__segindex__) keeps the
+        position of every chunk
+
+    When `bcolz.defaults.mmap` is true at creation time, the chunks read
+    out of segments are NumPy views on memory mapped files rather than
+    in-memory copies.  Every segment is mapped once for all its chunks;
+    files with single chunks are not mapped, as every map keeps a file
+    descriptor open for as long as the chunk is cached.
+
+    The chunks read are kept in a `chunkcache`, which is shared with the
+    rest of persistent carrays unless a different one is set.
+
+    """
     property mode:
         "The mode used to create/open the `mode`."
         def __get__(self):
@@ -673,7 +1342,23 @@ cdef class chunks(object):
         def __get__(self):
             return os.path.join(self.rootdir, DATA_DIR)
 
-    def __cinit__(self, rootdir, metainfo=None, _new=False):
+    property layout:
+        """The on-disk layout of the chunks ('files' or 'segments')."""
+        def __get__(self):
+            return 'segments' if self._segments else 'files'
+
+    property cache:
+        """The `chunkcache` instance where the chunks read are kept."""
+        def __get__(self):
+            return self._cache
+        def __set__(self, value):
+            if not isinstance(value, chunkcache):
+                raise TypeError("`cache` must be a `chunkcache` instance")
+            self._cache.clear(self._cacheid)
+            self._cache = value
+
+    def __cinit__(self, rootdir, metainfo=None, _new=False, layout=None,
+                  objbatches=False):
         cdef ndarray lastchunkarr
         cdef void *decompressed
         cdef void *compressed
@@ -686,40 +1371,135 @@ cdef class chunks(object):
 
         self._rootdir = rootdir
         self.nchunks = 0
-        self.nchunk_cached = -1  # no chunk cached initially
+        self._cache = _chunk_cache
+        self._cacheid = next(_cache_owners)
         self.dtype, self.cparams, self.len, lastchunkarr, self._mode = metainfo
         atomsize = self.dtype.itemsize
         itemsize = self.dtype.base.itemsize
 
-        # For 'O'bject types, the number of chunks is equal to the number of
-        # elements
-        if self.dtype.char == 'O':
-            self.nchunks = self.len
+        # The zone maps are loaded lazily
+        self._zonemaps = [] if _new else None
+        self._zonemaps_dirty = False
+
+        # Set up the layout for new chunks, or detect it for existing ones
+        self._segfiles = {}
+        self._segmaps = {}
+        self._mmap = bcolz.defaults.mmap
+        if _new:
+            self._segments = layout == 'segments'
+            if self._segments:
+                self._create_segments()
+        else:
+            self._segments = os.path.exists(
+                os.path.join(self.datadir, SEGMENT_INDEX_FILE))
 
-        # Initialize last chunk (not valid for 'O'bject dtypes)
-        if not _new and self.dtype.char != 'O':
+        # For 'O'bject types stored one per chunk (as in bcolz < 0.9), the
+        # number of chunks is equal to the number of elements
+        if self.dtype.char == 'O' and not objbatches:
+            self.nchunks = self.len
+        elif not _new:
             self.nchunks = cython.cdiv(self.len, len(lastchunkarr))
+
+        if not _new and self._segments:
+            self._open_segments()
+
+        # Initialize last chunk (objects have to be unpickled)
+        if not _new and self.dtype.char == 'O' and objbatches:
+            leftover = self.len % len(lastchunkarr)
+            if leftover:
+                scomp, flags = self.read_chunk(self.nchunks)
+                chunk_ = chunk(scomp, self.dtype, self.cparams,
+                               _memory=False, _compr=True)
+                lastchunkarr[:leftover] = unpack_objects(chunk_.getudata())
+        elif not _new and self.dtype.char != 'O':
             chunksize = len(lastchunkarr) * atomsize
             lastchunk = lastchunkarr.data
             leftover = (self.len % len(lastchunkarr)) * atomsize
             if leftover:
                 # Fill lastchunk with data on disk
-                scomp = self.read_chunk(self.nchunks)
-                compressed = PyString_AsString(scomp)
-                ret = blosc_decompress(compressed, lastchunk, chunksize)
-                if ret < 0:
-                    raise RuntimeError(
-                        "error decompressing the last chunk (error code: "
-                        "%d)" % ret)
+                scomp, flags = self.read_chunk(self.nchunks)
+                if flags:
+                    # A constant or run-length chunk
+                    chunk_ = chunk(scomp, self.dtype, self.cparams,
+                                   _memory=False, _compr=True, _flags=flags)
+                    lastchunkarr[:cython.cdiv(leftover, atomsize)] = \
+                        chunk_[:]
+                else:
+                    if isinstance(scomp, np.ndarray):
+                        compressed = (<ndarray>scomp).data
+                    else:
+                        compressed = PyString_AsString(scomp)
+                    ret = blosc_decompress(compressed, lastchunk, chunksize)
+                    if ret < 0:
+                        raise RuntimeError(
+                            "error decompressing the last chunk (error "
+                            "code: %d)" % ret)
+                    code = prefilter_code(self.cparams, self.dtype)
+                    if code:
+                        undo_prefilter(
+                            lastchunkarr[:cython.cdiv(leftover, atomsize)],
+                            code)
+
+    def __dealloc__(self):
+        """Release the cached chunks and close the open segment files."""
+        if self._cache is not None:
+            self._cache.clear(self._cacheid)
+        if self._segfiles:
+            for segfile in self._segfiles.values():
+                segfile.close()
+
+    def _segment_path(self, nsegment):
+        """Return the path of the segment file number `nsegment`."""
+        return os.path.join(
+            self.datadir, "%s%d%s" % (SEGMENT_PREFIX, nsegment, EXTENSION))
+
+    def _create_segments(self):
+        """Create an empty segment index."""
+        indexf = os.path.join(self.datadir, SEGMENT_INDEX_FILE)
+        with open(indexf, 'wb'):
+            pass
+        self._index = np.zeros((0, SEGMENT_INDEX_WIDTH), dtype=SizeType)
+        self._nsegment = 0
+        self._segsize = 0
+
+    def _open_segments(self):
+        """Read the segment index and locate the segment for appends."""
+        indexf = os.path.join(self.datadir, SEGMENT_INDEX_FILE)
+        index = np.fromfile(indexf, dtype=SEGMENT_INDEX_DTYPE)
+        index = index.reshape(-1, SEGMENT_INDEX_WIDTH)
+        if len(index) < self.nchunks:
+            raise IOError("segment index in %s is truncated" % indexf)
+        # Entries beyond nchunks come from non-flushed appends, so drop them
+        self._index = index[:self.nchunks].astype(SizeType)
+        for flags in np.unique(self._index[:, 3]):
+            check_chunk_format(FLAGS_FORMAT_VERSION, flags, self.datadir)
+        if self.nchunks > 0:
+            self._nsegment = self._index[:, 0].max()
+        else:
+            self._nsegment = 0
+        segpath = self._segment_path(self._nsegment)
+        if os.path.exists(segpath):
+            self._segsize = os.path.getsize(segpath)
+        else:
+            self._segsize = 0
 
     cdef read_chunk(self, nchunk):
-        """Read a chunk and return it in compressed form."""
-        dname = "__%d%s" % (nchunk, EXTENSION)
-        schunkfile = os.path.join(self.datadir, dname)
+        """Read a chunk and return it in compressed form, with its flags."""
+        if self._segments:
+            if nchunk < self.nchunks:
+                return self._read_segment_chunk(nchunk)
+            # The leftover chunk is kept out of the segments
+            schunkfile = os.path.join(self.datadir, LEFTOVER_FILE)
+        else:
+            dname = "__%d%s" % (nchunk, EXTENSION)
+            schunkfile = os.path.join(self.datadir, dname)
         if not os.path.exists(schunkfile):
             raise ValueError("chunkfile %s not found" % schunkfile)
         with open(schunkfile, 'rb') as schunk:
             bloscpack_header = schunk.read(BLOSCPACK_HEADER_LENGTH)
+            flags = decode_byte(bloscpack_header[5])
+            check_chunk_format(decode_byte(bloscpack_header[4]), flags,
+                               schunkfile)
             blosc_header_raw = schunk.read(BLOSC_HEADER_LENGTH)
             blosc_header = decode_blosc_header(blosc_header_raw)
             ctbytes = blosc_header['ctbytes']
@@ -728,38 +1508,126 @@ cdef class chunks(object):
             # position
             schunk.seek(-BLOSC_HEADER_LENGTH, 1)
             scomp = schunk.read(ctbytes)
-        return scomp
+        return scomp, flags
+
+    cdef _read_segment_chunk(self, nchunk):
+        """Read a chunk out of its segment with a single positional read.
+        The flags of the chunk are returned too."""
+        nsegment, offset, cbytes, flags = self._index[nchunk]
+        if self._mmap:
+            map_ = self._segmaps.get(nsegment)
+            if map_ is None or offset + cbytes > len(map_):
+                # Map the segment again, as it has grown since last time.
+                # Previous maps stay alive while chunks are referencing them.
+                with open(self._segment_path(nsegment), 'rb') as segfh:
+                    map_ = mmap.mmap(segfh.fileno(), 0,
+                                     access=mmap.ACCESS_READ)
+                self._segmaps[nsegment] = map_
+            return np.frombuffer(map_, dtype=np.uint8, count=cbytes,
+                                 offset=offset), flags
+        segfile = self._segfiles.get(nsegment)
+        if segfile is None:
+            # Keep the segment open so that next reads are just a pread()
+            segfile = open(self._segment_path(nsegment), 'rb', 0)
+            self._segfiles[nsegment] = segfile
+        return _pread(segfile.fileno(), cbytes, offset), flags
 
     def __getitem__(self, nchunk):
         cdef void *decompressed
         cdef void *compressed
 
-        if nchunk == self.nchunk_cached:
-            # Hit!
-            return self.chunk_cached
-        else:
-            scomp = self.read_chunk(nchunk)
+        key = (self._cacheid, nchunk)
+        chunk_ = self._cache.get(key)
+        if chunk_ is None:
+            scomp, flags = self.read_chunk(nchunk)
             # Data chunk should be compressed already
             chunk_ = chunk(scomp, self.dtype, self.cparams,
-                           _memory=False, _compr=True)
+                           _memory=False, _compr=True, _flags=flags)
             # Fill cache
-            self.nchunk_cached = nchunk
-            self.chunk_cached = chunk_
+            self._cache.put(key, chunk_, chunk_.cdbytes)
         return chunk_
 
     def __setitem__(self, nchunk, chunk_):
         self._save(nchunk, chunk_)
+        self.set_zonemap(nchunk, chunk_.stats)
 
     def __len__(self):
         return self.nchunks
 
+    property zonemapsfile:
+        """The file keeping the zone maps."""
+        def __get__(self):
+            return os.path.join(self.rootdir, META_DIR, ZONEMAPS_FILE)
+
+    def _load_zonemaps(self):
+        """Read the zone maps from disk (missing entries are None)."""
+        zonemaps = []
+        if os.path.exists(self.zonemapsfile):
+            with open(self.zonemapsfile, 'rb') as zmfh:
+                stats = np.load(zmfh)
+            for entry in stats[:self.nchunks]:
+                if entry['known']:
+                    zonemaps.append((entry['min'], entry['max'],
+                                     int(entry['nnull'])))
+                else:
+                    zonemaps.append(None)
+        zonemaps.extend([None] * (self.nchunks - len(zonemaps)))
+        self._zonemaps = zonemaps
+
+    def zonemap(self, nchunk):
+        """Return the (min, max, nnull) stats of chunk `nchunk` (or None)."""
+        if self._zonemaps is None:
+            self._load_zonemaps()
+        if nchunk < len(self._zonemaps):
+            return self._zonemaps[nchunk]
+        return None
+
+    def set_zonemap(self, nchunk, stats, persist=True):
+        """Set the `stats` for chunk `nchunk`.
+
+        If `persist` is true, the zone maps on disk are invalidated until
+        the next `flush_zonemaps()`.
+        """
+        if self._zonemaps is None:
+            self._load_zonemaps()
+        if persist and not self._zonemaps_dirty:
+            # Never leave outdated stats on disk
+            if os.path.exists(self.zonemapsfile):
+                os.remove(self.zonemapsfile)
+            self._zonemaps_dirty = True
+        zonemaps = self._zonemaps
+        if nchunk >= len(zonemaps):
+            zonemaps.extend([None] * (nchunk + 1 - len(zonemaps)))
+        zonemaps[nchunk] = stats
+
+    def flush_zonemaps(self):
+        """Save the zone maps on disk, if they have been modified."""
+        if not self._zonemaps_dirty:
+            return
+        basedtype = self.dtype.base
+        if basedtype.kind in ZONEMAP_KINDS:
+            stats = np.zeros(self.nchunks, dtype=[
+                ('min', basedtype), ('max', basedtype),
+                ('nnull', SizeType), ('known', np.bool_)])
+            for nchunk, entry in enumerate(self._zonemaps[:self.nchunks]):
+                if entry is not None:
+                    stats[nchunk] = entry + (True,)
+            tmpfile = self.zonemapsfile + '.tmp'
+            with open(tmpfile, 'wb') as zmfh:
+                np.save(zmfh, stats)
+            _replace(tmpfile, self.zonemapsfile)
+        self._zonemaps_dirty = False
+
     def free_cachemem(self):
-        self.nchunk_cached = -1
-        self.chunk_cached = None
+        self._cache.clear(self._cacheid)
 
     def append(self, chunk_):
         """Append an new chunk to the carray."""
-        self._save(self.nchunks, chunk_)
+        if self._segments:
+            self._save_segment(self.nchunks, chunk_)
+        else:
+            self._save(self.nchunks, chunk_)
+        self.set_zonemap(self.nchunks, chunk_.stats)
         self.nchunks += 1
 
     cdef _save(self, nchunk, chunk_):
@@ -769,16 +1637,82 @@ cdef class chunks(object):
             raise IOError(
                 "cannot modify data because mode is '%s'" % self.mode)
 
-        dname = "__%d%s" % (nchunk, EXTENSION)
-        schunkfile = os.path.join(self.datadir, dname)
-        bloscpack_header = create_bloscpack_header(1)
-        with open(schunkfile, 'wb') as schunk:
+        if self._segments:
+            if nchunk < self.nchunks:
+                self._save_segment(nchunk, chunk_)
+                return
+            # This is the leftover chunk, which lives in its own file
+            schunkfile = os.path.join(self.datadir, LEFTOVER_FILE)
+        else:
+            dname = "__%d%s" % (nchunk, EXTENSION)
+            schunkfile = os.path.join(self.datadir, dname)
+        format_version = FORMAT_VERSION
+        if chunk_.flags:
+            format_version = FLAGS_FORMAT_VERSION
+        bloscpack_header = create_bloscpack_header(
+            1, format_version, chunk_.flags)
+        # Write to a temporary file first and then rename it, so that the
+        # contents of a previous version that is memory mapped (maybe in
+        # other processes) are not truncated under its feet
+        tmpfile = schunkfile + '.tmp'
+        with open(tmpfile, 'wb') as schunk:
             schunk.write(bloscpack_header)
             data = chunk_.getdata()
             schunk.write(data)
+        _replace(tmpfile, schunkfile)
+        # Mark the cache as dirty if needed
+        self._cache.discard((self._cacheid, nchunk))
+
+    cdef _save_segment(self, nchunk, chunk_):
+        """Append the `chunk_` to the current segment as chunk #`nchunk`.
+
+        Segments are append-only, so overwriting an existing chunk just
+        makes its index entry point to the new copy.
+        """
+        cdef object index
+
+        if self.mode == "r":
+            raise IOError(
+                "cannot modify data because mode is '%s'" % self.mode)
+
+        data = chunk_.getdata()
+        cbytes = len(data)
+        if (self._segsize > BLOSCPACK_HEADER_LENGTH and
+                self._segsize + cbytes > SEGMENT_SIZE):
+            # The current segment is full.  Go for the next one.
+            self._nsegment += 1
+            segpath = self._segment_path(self._nsegment)
+            if os.path.exists(segpath):
+                self._segsize = os.path.getsize(segpath)
+            else:
+                self._segsize = 0
+        with open(self._segment_path(self._nsegment), 'ab') as segfh:
+            if self._segsize == 0:
+                # The number of chunks in a segment is not known in
+                # advance, and any of them can have flags
+                segfh.write(create_bloscpack_header(
+                    None, FLAGS_FORMAT_VERSION))
+                self._segsize = BLOSCPACK_HEADER_LENGTH
+            segfh.write(data)
+        entry = (self._nsegment, self._segsize, cbytes, chunk_.flags)
+        self._segsize += cbytes
+
+        # Update the index, both in-memory and on-disk
+        index = self._index
+        if nchunk >= len(index):
+            # Grow the in-memory index geometrically
+            index = np.zeros((max(16, 2 * len(index)), SEGMENT_INDEX_WIDTH),
+                             dtype=SizeType)
+            index[:len(self._index)] = self._index
+            self._index = index
+        index[nchunk] = entry
+        indexf = os.path.join(self.datadir, SEGMENT_INDEX_FILE)
+        with open(indexf, 'r+b') as idxfh:
+            idxfh.seek(nchunk * SEGMENT_INDEX_ENTRY)
+            idxfh.write(struct.pack('<%dq' % SEGMENT_INDEX_WIDTH, *entry))
+
         # Mark the cache as dirty if needed
-        if nchunk == self.nchunk_cached:
-            self.nchunk_cached = -1
+        self._cache.discard((self._cacheid, nchunk))
 
     def flush(self, chunk_):
         """Flush the leftover chunk."""
@@ -788,26 +1722,50 @@ cdef class chunks(object):
         """Remove the last chunk and return it."""
         nchunk = self.nchunks - 1
         chunk_ = self.__getitem__(nchunk)
-        dname = "__%d%s" % (nchunk, EXTENSION)
-        schunkfile = os.path.join(self.datadir, dname)
-        if not os.path.exists(schunkfile):
-            raise IOError("chunk filename %s does exist" % schunkfile)
-        os.remove(schunkfile)
-
-        # When poping a chunk, we must be sure that we don't leave anything
-        # behind (i.e. the lastchunk)
-        dname = "__%d%s" % (nchunk + 1, EXTENSION)
-        schunkfile = os.path.join(self.datadir, dname)
-        if os.path.exists(schunkfile):
+        if self._segments:
+            self._pop_segment(nchunk)
+        else:
+            dname = "__%d%s" % (nchunk, EXTENSION)
+            schunkfile = os.path.join(self.datadir, dname)
+            if not os.path.exists(schunkfile):
+                raise IOError("chunk filename %s does exist" % schunkfile)
             os.remove(schunkfile)
 
+            # When poping a chunk, we must be sure that we don't leave
+            # anything behind (i.e. the lastchunk)
+            dname = "__%d%s" % (nchunk + 1, EXTENSION)
+            schunkfile = os.path.join(self.datadir, dname)
+            if os.path.exists(schunkfile):
+                os.remove(schunkfile)
+
+        self._cache.discard((self._cacheid, nchunk))
+        self.set_zonemap(nchunk, None)
         self.nchunks -= 1
         return chunk_
 
+    def _pop_segment(self, nchunk):
+        """Remove chunk #`nchunk` (the last one) from the segments."""
+        nsegment, offset, cbytes, flags = self._index[nchunk]
+        # Reclaim the space if the chunk is at the tail of current segment.
+        # This is not done when the segment could be memory mapped, as
+        # truncating a mapped file makes accesses to the lost pages to crash.
+        if (not self._mmap and nsegment == self._nsegment and
+                offset + cbytes == self._segsize):
+            with open(self._segment_path(nsegment), 'r+b') as segfh:
+                segfh.truncate(offset)
+            self._segsize = offset
+        indexf = os.path.join(self.datadir, SEGMENT_INDEX_FILE)
+        with open(indexf, 'r+b') as idxfh:
+            idxfh.truncate(nchunk * SEGMENT_INDEX_ENTRY)
+        # Do not leave a leftover chunk behind
+        schunkfile = os.path.join(self.datadir, LEFTOVER_FILE)
+        if os.path.exists(schunkfile):
+            os.remove(schunkfile)
+
 cdef class carray:
     """
     carray(array, cparams=None, dtype=None, dflt=None, expectedlen=None,
-    chunklen=None, rootdir=None, mode='a')
+    chunklen=None, rootdir=None, mode='a', layout=None)
 
     A compressed and enlargeable in-memory data container.
 
@@ -856,6 +1814,18 @@ cdef class carray:
           * 'a' for append (possible data inside `rootdir` will not be
           removed).
 
+    layout : str, optional
+        The on-disk layout for the chunks of a *persistent* carray being
+        created.  The values can be:
+
+          * 'files' for saving every chunk in its own file (the default)
+          * 'segments' for appending chunks to a few large segment files
+            that are located through a compact index.  This reduces a lot
+            the number of files (and syscalls) for large carrays.
+
+        The layout of existing carrays is detected automatically when they
+        are opened.
+
     """
 
     property leftovers:
@@ -921,7 +1891,7 @@ cdef class carray:
     property len:
         "The length (leading dimension) of this object."
         def __get__(self):
-            if self._dtype.char == 'O':
+            if self._dtype.char == 'O' and not self._objbatches:
                 return len(self.chunks)
             else:
                 # Important to do the cast in order to get a npy_intp result
@@ -961,6 +1931,29 @@ cdef class carray:
         def __get__(self):
             return np.prod(self.shape)
 
+    property layout:
+        "The on-disk layout of the chunks (None for in-memory carrays)."
+        def __get__(self):
+            if self._rootdir is None:
+                return None
+            return self.chunks.layout
+
+    property chunkcache:
+        """The `chunkcache` where the chunks read from disk are kept.
+
+        It is None for in-memory carrays.  Set it to a different
+        `chunkcache` instance to isolate (or share) the cached chunks of
+        this carray.
+        """
+        def __get__(self):
+            if self._rootdir is None:
+                return None
+            return self.chunks.cache
+        def __set__(self, value):
+            if self._rootdir is None:
+                raise ValueError("in-memory carrays do not use a chunk cache")
+            self.chunks.cache = value
+
     property rootdir:
         "The on-disk directory used for persistency."
         def __get__(self):
@@ -975,20 +1968,28 @@ cdef class carray:
     def __cinit__(self, object array=None, object cparams=None,
                   object dtype=None, object dflt=None,
                   object expectedlen=None, object chunklen=None,
-                  object rootdir=None, object safe=True, object mode="a"):
+                  object rootdir=None, object safe=True, object mode="a",
+                  object layout=None, object _meta=None):
 
         self._rootdir = rootdir
         if mode not in ('r', 'w', 'a'):
             raise ValueError("mode should be 'r', 'w' or 'a'")
         self._mode = mode
         self._safe = safe
+        if layout is not None and layout not in LAYOUTS:
+            raise ValueError("layout should be 'files' or 'segments'")
+        self._layout = layout
 
         if array is not None:
             self.create_carray(array, cparams, dtype, dflt,
                                expectedlen, chunklen, rootdir, mode)
             _new = True
         elif rootdir is not None:
-            meta_info = self.read_meta()
+            if _meta is not None:
+                # The (sizes, storage) metadata has been read already
+                meta_info = parse_meta(*_meta)
+            else:
+                meta_info = self.read_meta()
             self.open_carray(*meta_info)
             _new = False
         else:
@@ -1006,6 +2007,7 @@ cdef class carray:
         self.wheretrue_mode = False
         self.where_mode = False
         self.idxcache = -1  # cache not initialized
+        self._blockcache_size = bcolz.defaults.block_cache_size
 
     cdef _adapt_dtype(self, dtype_, shape):
         """adapt the dtype to one supported in carray.
@@ -1068,6 +2070,8 @@ cdef class carray:
         # Note that objects are a special case. Carray does not support object
         # arrays of more than one dimensions.
         self._dtype = dtype = self._adapt_dtype(dtype, array_.shape)
+        # Objects are stored in batches of `chunklen` pickles
+        self._objbatches = dtype.char == 'O'
 
         # Check that atom size is less than 2 GB
         if dtype.itemsize >= 2 ** 31:
@@ -1128,15 +2132,17 @@ cdef class carray:
             self.mkdirs(rootdir, mode)
             metainfo = (
             dtype, cparams, self.shape[0], lastchunkarr, self._mode)
-            self.chunks = chunks(self._rootdir, metainfo=metainfo, _new=True)
+            self.chunks = chunks(self._rootdir, metainfo=metainfo, _new=True,
+                                 layout=self._layout,
+                                 objbatches=self._objbatches)
             # We can write the metainfo already
             self.write_meta()
 
         # Finally, fill the chunks
         # Object dtype requires special storage
         if array_.dtype.char == 'O':
-            for obj in array_:
-                self.store_obj(obj)
+            self.append_objects(array_)
+            self._cbytes += self._chunksize  # count the space in last chunk
         else:
             self.fill_chunks(array_)
 
@@ -1144,7 +2150,8 @@ cdef class carray:
         self.flush()
 
     def open_carray(self, shape, cparams, dtype, dflt,
-                    expectedlen, cbytes, chunklen, xchunks=None):
+                    expectedlen, cbytes, chunklen, objbatches=False,
+                    xchunks=None):
         """Open an existing array."""
         cdef ndarray lastchunkarr
         cdef object array_, _dflt
@@ -1163,11 +2170,21 @@ cdef class carray:
             self._dtype = dtype = np.dtype((dtype.base, shape[1:]))
 
         self._cparams = cparams
+        self._objbatches = objbatches
         self.atomsize = dtype.itemsize
         self.itemsize = dtype.base.itemsize
         self._chunklen = chunklen
         self._chunksize = chunklen * self.atomsize
-        self._dflt = dflt
+        # The default value comes from JSON, so rebuild it as in create
+        _dflt = np.zeros((), dtype=dtype)
+        if dflt is not None:
+            if dtype.names is not None and type(dflt) is list:
+                dflt = tuple(dflt)
+            if dtype.shape == ():
+                _dflt[()] = dflt
+            else:
+                _dflt[:] = dflt
+        self._dflt = _dflt
         self.expectedlen = expectedlen
 
         # Book memory for last chunk (uncompressed)
@@ -1190,7 +2207,8 @@ cdef class carray:
 
             # Finally, open data directory
             metainfo = (dtype, cparams, shape[0], lastchunkarr, self._mode)
-            self.chunks = chunks(self._rootdir, metainfo=metainfo, _new=False)
+            self.chunks = chunks(self._rootdir, metainfo=metainfo, _new=False,
+                                 objbatches=objbatches)
         else:
             self.chunks, lastchunkarr[:] = xchunks
 
@@ -1217,24 +2235,45 @@ cdef class carray:
         self._nbytes = nbytes
 
         # Compress data in chunks
-        cbytes = 0
         chunklen = self._chunklen
         nchunks = <npy_intp> cython.cdiv(nbytes, self._chunksize)
-        for i from 0 <= i < nchunks:
-            assert i * chunklen < array_.size, "i, nchunks: %d, %d" % (
-            i, nchunks)
-            chunk_ = chunk(array_[i * chunklen:(i + 1) * chunklen],
-                           self._dtype, self._cparams,
-                           _memory=self._rootdir is None)
-            self.chunks.append(chunk_)
-            cbytes += chunk_.cbytes
+        cbytes = self.append_chunks(array_, nchunks)
         self.leftover = leftover = nbytes % self._chunksize
         if leftover:
-            remainder = array_[nchunks * chunklen:]
+            remainder = self.trim_values(array_[nchunks * chunklen:])
             memcpy(self.lastchunk, remainder.data, leftover)
         cbytes += self._chunksize  # count the space in last chunk
         self._cbytes = cbytes
 
+    cdef append_chunks(self, ndarray array_, npy_intp nchunks):
+        """Compress the first `nchunks` chunks in `array_` and append them.
+
+        Returns the compressed bytes of the new chunks.
+        """
+        cdef npy_intp i, chunklen, cbytes
+        cdef chunk chunk_
+
+        chunklen = self._chunklen
+        memory = self._rootdir is None
+        cbytes = 0
+        for i from 0 <= i < nchunks:
+            chunk_ = chunk(array_[i * chunklen:(i + 1) * chunklen],
+                           self._dtype, self._cparams, _memory=memory)
+            self.chunks.append(chunk_)
+            cbytes += chunk_.cbytes
+        return cbytes
+
+    cdef trim_values(self, object array):
+        """Return `array` with its mantissas trimmed as set in cparams.
+
+        Values are trimmed as soon as they enter the carray, so that the
+        ones kept in the last chunk (not compressed yet) are the same
+        than once compressed.
+        """
+        if self._cparams.trimbits and self._dtype.base.kind in 'fc':
+            return trim_mantissa(array, self._cparams.trimbits)
+        return array
+
     def mkdirs(self, object rootdir, object mode):
         """Create the basic directory layout for persistent storage."""
         if os.path.exists(rootdir):
@@ -1256,28 +2295,40 @@ cdef class carray:
         """Write metadata persistently."""
         storagef = os.path.join(self.metadir, STORAGE_FILE)
         with open(storagef, 'wb') as storagefh:
-            dflt_list = self.dflt.tolist()
-            if type(dflt_list) in (datetime.datetime,
-                                   datetime.date, datetime.time):
-                # The datetime cannot be serialized with JSON.  Use a 0 int.
-                dflt_list = 0
-            # In Python 3, the json encoder doesn't accept bytes objects
-            if sys.version_info >= (3, 0):
-                dflt_list = list_bytes_to_str(dflt_list)
-            storagefh.write(json.dumps({
-                # str(self.dtype) produces bytes by default in cython.py3.
-                # Calling .__str__() is a workaround.
-                "dtype": self.dtype.__str__(),
-                "cparams": {
-                    "clevel": self.cparams.clevel,
-                    "shuffle": self.cparams.shuffle,
-                },
-                "chunklen": self._chunklen,
-                "expectedlen": self.expectedlen,
-                "dflt": dflt_list,
-            }, ensure_ascii=True).encode('ascii'))
+            storagefh.write(json.dumps(
+                self._storage_meta(), ensure_ascii=True).encode('ascii'))
             storagefh.write(b"\n")
 
+    def _storage_meta(self):
+        """Return the metadata in the storage file (as a dictionary)."""
+        dflt_list = self.dflt.tolist()
+        if type(dflt_list) in (datetime.datetime,
+                               datetime.date, datetime.time):
+            # The datetime cannot be serialized with JSON.  Use a 0 int.
+            dflt_list = 0
+        # In Python 3, the json encoder doesn't accept bytes objects
+        if sys.version_info >= (3, 0):
+            dflt_list = list_bytes_to_str(dflt_list)
+        meta = {
+            # str(self.dtype) produces bytes by default in cython.py3.
+            # Calling .__str__() is a workaround.
+            "dtype": self.dtype.__str__(),
+            "cparams": {
+                "clevel": self.cparams.clevel,
+                "shuffle": self.cparams.shuffle,
+            },
+            "chunklen": self._chunklen,
+            "expectedlen": self.expectedlen,
+            "dflt": dflt_list,
+        }
+        if self._dtype.char == 'O':
+            meta["objbatches"] = bool(self._objbatches)
+        if self.cparams.prefilter is not None:
+            meta["cparams"]["prefilter"] = self.cparams.prefilter
+        if self.cparams.trimbits:
+            meta["cparams"]["trimbits"] = self.cparams.trimbits
+        return meta
+
     def read_meta(self):
         """Read persistent metadata."""
 
@@ -1286,24 +2337,12 @@ cdef class carray:
         shapef = os.path.join(metadir, SIZES_FILE)
         with open(shapef, 'rb') as shapefh:
             sizes = json.loads(shapefh.read().decode('ascii'))
-        shape = sizes['shape']
-        if type(shape) == list:
-            shape = tuple(shape)
-        nbytes = sizes["nbytes"]
-        cbytes = sizes["cbytes"]
 
         # Then the rest of metadata
         storagef = os.path.join(metadir, STORAGE_FILE)
         with open(storagef, 'rb') as storagefh:
-            data = json.loads(storagefh.read().decode('ascii'))
-        dtype_ = np.dtype(data["dtype"])
-        chunklen = data["chunklen"]
-        cparams = bcolz.cparams(
-            clevel=data["cparams"]["clevel"],
-            shuffle=data["cparams"]["shuffle"])
-        expectedlen = data["expectedlen"]
-        dflt = data["dflt"]
-        return (shape, cparams, dtype_, dflt, expectedlen, cbytes, chunklen)
+            storage = json.loads(storagefh.read().decode('ascii'))
+        return parse_meta(sizes, storage)
 
     def store_obj(self, object arrobj):
         cdef chunk chunk_
@@ -1319,6 +2358,40 @@ cdef class carray:
         self._cbytes += cbytes
         self._nbytes += nbytes
 
+    def append_objects(self, ndarray objs):
+        """Append the `objs` array of objects in batches of `chunklen`."""
+        cdef chunk chunk_
+        cdef npy_intp nobjs, nleft, pos, nitems, chunklen, cbytes
+
+        if objs.ndim != 1:
+            # The elements are the rows of multidimensional arrays
+            rows = np.empty(len(objs), dtype=self._dtype)
+            for pos in range(len(objs)):
+                rows[pos] = objs[pos]
+            objs = rows
+
+        chunklen = self._chunklen
+        lastchunkarr = self.lastchunkarr
+        nobjs = len(objs)
+        nleft = cython.cdiv(self.leftover, self.atomsize)
+        pos, cbytes = 0, 0
+        while pos < nobjs:
+            nitems = min(chunklen - nleft, nobjs - pos)
+            lastchunkarr[nleft:nleft + nitems] = objs[pos:pos + nitems]
+            nleft += nitems
+            pos += nitems
+            if nleft == chunklen:
+                # The batch is complete: pickle and compress it
+                chunk_ = chunk(pack_objects(lastchunkarr), self._dtype,
+                               self._cparams,
+                               _memory=self._rootdir is None)
+                self.chunks.append(chunk_)
+                cbytes += chunk_.cbytes
+                nleft = 0
+        self.leftover = nleft * self.atomsize
+        self._nbytes += nobjs * self.atomsize
+        self._cbytes += cbytes
+
     def append(self, object array):
         """
         append(array)
@@ -1349,7 +2422,7 @@ cdef class carray:
                 raise TypeError("array dtype does not match with self")
 
             # Object dtype requires special storage
-            if arrcpy.dtype.char == 'O':
+            if arrcpy.dtype.char == 'O' and not self._objbatches:
                 self.store_obj(array)
                 return
 
@@ -1361,6 +2434,13 @@ cdef class carray:
                     "array trailing dimensions do not match with self")
         else:
             arrcpy = array
+        arrcpy = self.trim_values(arrcpy)
+
+        if self._objbatches:
+            if arrcpy.ndim == 0:
+                arrcpy = arrcpy.reshape((1,))
+            self.append_objects(arrcpy)
+            return
 
         atomsize = self.atomsize
         itemsize = self.itemsize
@@ -1407,13 +2487,7 @@ cdef class carray:
             # Get a new view skipping the elements that have been already
             # copied
             remainder = arrcpy[cython.cdiv(nbytesfirst, atomsize):]
-            for i from 0 <= i < nchunks:
-                chunk_ = chunk(
-                    remainder[i * chunklen:(i + 1) * chunklen], self._dtype,
-                    self._cparams,
-                    _memory=self._rootdir is None)
-                chunks.append(chunk_)
-                cbytes += chunk_.cbytes
+            cbytes += self.append_chunks(remainder, nchunks)
 
             # Finally, deal with the leftover
             leftover = nbytes % chunksize
@@ -1475,7 +2549,10 @@ cdef class carray:
             leftover2 = (self.len - nitems) % self._chunklen
             leftover = leftover2 * atomsize
 
-            # Remove complete chunks
+            # Remove complete chunks (and invalidate the block cache, as
+            # they could be appended again with different data)
+            if self.idxcache >= 0:
+                self.idxcache = -2
             nchunk2 = lnchunk = <npy_intp> cython.cdiv(
                 self._nbytes, self._chunksize)
             while nchunk2 > nchunk:
@@ -1485,7 +2562,11 @@ cdef class carray:
 
             # Finally, deal with the leftover
             if leftover:
-                self.lastchunkarr[:leftover2] = chunk_[:leftover2]
+                if self._objbatches:
+                    self.lastchunkarr[:leftover2] = unpack_objects(
+                        chunk_.getudata())[:leftover2]
+                else:
+                    self.lastchunkarr[:leftover2] = chunk_[:leftover2]
                 if self._rootdir:
                     # Last chunk is removed automatically by the chunks.pop(
                     # ) call, and
@@ -1605,7 +2686,7 @@ cdef class carray:
         # Create the final container and fill it
         out = carray([], dtype=newdtype, cparams=self.cparams,
                        expectedlen=newlen,
-                       rootdir=rootdir, mode='w')
+                       rootdir=rootdir, mode='w', layout=self.layout)
         if newlen < ilen:
             rsize = isize / newlen
             for i from 0 <= i < newlen:
@@ -1681,7 +2762,8 @@ cdef class carray:
         cview = carray(np.empty(0, dtype=self._dtype))
         # And populate it with metainfo (including chunks)
         meta_info = (self.shape, self.cparams, self.dtype, self.dflt,
-                     self.expectedlen, self.cbytes, self.chunklen)
+                     self.expectedlen, self.cbytes, self.chunklen,
+                     self._objbatches)
         cview.open_carray(*meta_info, xchunks=(self.chunks, self.lastchunkarr))
         return cview
 
@@ -1691,6 +2773,9 @@ cdef class carray:
 
         Return the sum of the array elements.
 
+        The partial sums of the chunks are computed in the pool of threads
+        sized by `set_nthreads()`.
+
         Parameters
         ----------
         dtype : NumPy dtype
@@ -1706,8 +2791,6 @@ cdef class carray:
         out : NumPy scalar with `dtype`
 
         """
-        cdef chunk chunk_
-        cdef npy_intp nchunk, nchunks
         cdef object result
 
         if dtype is None:
@@ -1723,30 +2806,618 @@ cdef class carray:
 
         # Get a container for the result
         result = np.zeros(1, dtype=dtype)[0]
+        # Partial sums are added in chunk order, so that results do not
+        # depend on the number of threads
+        for partial in self._map_chunks(
+                lambda nchunk: self._chunk_sum(nchunk, dtype)):
+            result += partial
+        return result
 
-        nchunks = <npy_intp> cython.cdiv(self._nbytes, self._chunksize)
-        for nchunk from 0 <= nchunk < nchunks:
+    def _chunk_sum(self, npy_intp nchunk, object dtype):
+        """Return the sum of the values in chunk `nchunk`."""
+        cdef chunk chunk_
+
+        if nchunk < cython.cdiv(self._nbytes, self._chunksize):
             chunk_ = self.chunks[nchunk]
             if chunk_.isconstant:
-                result += chunk_.constant * self._chunklen
-            elif self._dtype.type == np.bool_:
-                result += chunk_.true_count
-            else:
-                result += chunk_[:].sum(dtype=dtype)
+                return chunk_.constbuf.sum(dtype=dtype) * self._chunklen
+            elif chunk_.flags == RLE_CHUNK:
+                # Every run contributes its value times its length
+                values = chunk_.runvalues
+                lengths = run_lengths(chunk_.runends).reshape(
+                    (-1,) + (1,) * (values.ndim - 1))
+                return (values.astype(dtype) * lengths).sum(dtype=dtype)
+            elif self._dtype.type == np.bool_ and chunk_.true_count >= 0:
+                return chunk_.true_count
+        return self._chunk_values(nchunk).sum(dtype=dtype)
+
+    def _imap_chunks(self, func):
+        """Iterate over `func(nchunk)` for every chunk, in order.
+
+        The last, partial chunk is included.  When several threads are
+        set in `set_nthreads()`, the chunks are processed by a pool of
+        threads (decompression and NumPy reductions release the GIL).
+        Chunks are processed in batches, so that consumers that stop
+        early do not make every chunk to be processed.
+        """
+        cdef npy_intp nchunks, nbatch, start
+
+        nchunks = <npy_intp> cython.cdiv(self._nbytes, self._chunksize)
         if self.leftover:
-            leftover = self.len - nchunks * self._chunklen
-            result += self.lastchunkarr[:leftover].sum(dtype=dtype)
+            nchunks += 1
+        pool = None
+        if nchunks > 1:
+            pool = _get_pool()
+        if pool is None:
+            for nchunk in range(nchunks):
+                yield func(nchunk)
+            return
+        nbatch = 4 * _nthreads
+        for start in range(0, nchunks, nbatch):
+            for result in pool.map(
+                    func, range(start, min(start + nbatch, nchunks))):
+                yield result
 
-        return result
+    def _map_chunks(self, func):
+        """Return the list of `func(nchunk)` for every chunk.
 
-    def __len__(self):
+        See `_imap_chunks()` for more info.
+        """
+        return list(self._imap_chunks(func))
+
+    def _chunk_values(self, npy_intp nchunk):
+        """Return the values in chunk `nchunk` (the last one can be partial).
+        """
+        if nchunk == cython.cdiv(self._nbytes, self._chunksize):
+            return self.lastchunkarr[:cython.cdiv(self.leftover, self.atomsize)]
+        return self.chunks[nchunk][:]
+
+    def _chunk_size(self, npy_intp nchunk):
+        """Return the number of values in chunk `nchunk`."""
+        cdef npy_intp nitems
+
+        nitems = self._chunklen
+        if nchunk == cython.cdiv(self._nbytes, self._chunksize):
+            nitems = cython.cdiv(self.leftover, self.atomsize)
+        return nitems * np.prod(self._dtype.shape, dtype=SizeType)
+
+    def _chunk_extreme(self, npy_intp nchunk, which):
+        """Return the 'min' or 'max' (`which`) value in chunk `nchunk`."""
+        stats = self.zonemap(nchunk, compute=True)
+        if stats is not None and stats[2] == 0:
+            # No nulls, so the statistics are exact
+            return stats[0] if which == 'min' else stats[1]
+        return getattr(self._chunk_values(nchunk), which)()
+
+    def _chunk_count_nonzero(self, npy_intp nchunk):
+        """Return the number of non-zero values in chunk `nchunk`."""
+        cdef chunk chunk_
+
+        if nchunk < cython.cdiv(self._nbytes, self._chunksize):
+            chunk_ = self.chunks[nchunk]
+            if chunk_.isconstant:
+                return np.count_nonzero(chunk_.constbuf) * self._chunklen
+            if chunk_.flags == RLE_CHUNK:
+                values = chunk_.runvalues
+                nonzeros = np.count_nonzero(
+                    values.reshape((len(values), -1)), axis=1)
+                return int((nonzeros * run_lengths(chunk_.runends)).sum())
+            if chunk_.true_count >= 0:
+                return chunk_.true_count
+            if self._dtype.base.kind in 'iuf':
+                stats = self.zonemap(nchunk)
+                if stats is not None and stats[2] == 0:
+                    if stats[0] > 0 or stats[1] < 0:
+                        return self._chunk_size(nchunk)
+                    if stats[0] == 0 and stats[1] == 0:
+                        return 0
+        return np.count_nonzero(self._chunk_values(nchunk))
+
+    def _chunk_moments(self, npy_intp nchunk, object dtype):
+        """Return the (count, mean, M2) of the values in chunk `nchunk`.
+
+        M2 is the sum of the squared differences with the mean.
+        """
+        cdef chunk chunk_
+
+        weights = None
+        if nchunk < cython.cdiv(self._nbytes, self._chunksize):
+            chunk_ = self.chunks[nchunk]
+            if chunk_.isconstant:
+                values = chunk_.constbuf.ravel()
+                weights = np.empty(len(values), dtype=SizeType)
+                weights[:] = self._chunklen
+            elif chunk_.flags == RLE_CHUNK:
+                values = chunk_.runvalues
+                natoms = values[0].size
+                weights = np.repeat(run_lengths(chunk_.runends), natoms)
+                values = values.ravel()
+        if weights is None:
+            values = self._chunk_values(nchunk).ravel()
+            count = len(values)
+            mean = values.mean(dtype=dtype)
+            deltas = values.astype(dtype, copy=False) - mean
+            if dtype.kind == 'c':
+                deltas = deltas.view(deltas.real.dtype)
+            m2 = np.dot(deltas, deltas)
+        else:
+            count = weights.sum()
+            mean = (values.astype(dtype) * weights).sum(dtype=dtype) / count
+            deltas = values.astype(dtype) - mean
+            m2 = (weights * (deltas * deltas.conjugate()).real).sum()
+        return count, mean, m2
+
+    def _reduce_dtype(self, dtype):
+        """The dtype for computing means and variances."""
+        if dtype is not None:
+            return np.dtype(dtype)
+        dtype = self._dtype.base
+        if dtype.kind in 'biu':
+            return np.dtype(np.float64)
+        if dtype.kind not in 'fc':
+            raise TypeError(
+                "cannot compute the mean of '%s' values" % dtype)
+        return dtype
+
+    def _check_reduce(self, name):
+        """Check that the `name` reduction can be done in this carray."""
+        if self._dtype.base.kind in 'OSUV':
+            raise TypeError(
+                "cannot perform %s with '%s' values" % (name, self.dtype))
+        if self.len == 0:
+            raise ValueError(
+                "zero-size array to reduction operation %s which has no "
+                "identity" % name)
+
+    def min(self):
+        """
+        min()
+
+        Return the minimum of the array elements.
+
+        The statistics of the chunks (see `chunk_stats()`) are used when
+        known, so chunks are only decompressed when needed.  As in NumPy,
+        the result is NaN if any value is NaN.
+
+        Returns
+        -------
+        out : NumPy scalar with the dtype of `self`
+
+        See Also
+        --------
+        max, argmin
+
+        """
+        self._check_reduce('minimum')
+        partials = self._map_chunks(
+            lambda nchunk: self._chunk_extreme(nchunk, 'min'))
+        return np.array(partials, dtype=self._dtype.base).min()
+
+    def max(self):
+        """
+        max()
+
+        Return the maximum of the array elements.
+
+        See `min()` for more info.
+
+        Returns
+        -------
+        out : NumPy scalar with the dtype of `self`
+
+        See Also
+        --------
+        min, argmax
+
+        """
+        self._check_reduce('maximum')
+        partials = self._map_chunks(
+            lambda nchunk: self._chunk_extreme(nchunk, 'max'))
+        return np.array(partials, dtype=self._dtype.base).max()
+
+    def _argextreme(self, which):
+        """Return the flat index of the 'min' or 'max' (`which`) value."""
+        self._check_reduce('arg' + which)
+        partials = self._map_chunks(
+            lambda nchunk: self._chunk_extreme(nchunk, which))
+        partials = np.array(partials, dtype=self._dtype.base)
+        # Only the first chunk with the extreme value is decompressed
+        nchunk = getattr(partials, 'arg' + which)()
+        values = self._chunk_values(nchunk)
+        natoms = np.prod(self._dtype.shape, dtype=SizeType)
+        return (nchunk * self._chunklen * natoms +
+                getattr(values, 'arg' + which)())
+
+    def argmin(self):
+        """
+        argmin()
+
+        Return the index of the (first) minimum value.
+
+        For multidimensional carrays, the index is into the flattened
+        array, as in NumPy.
+
+        Returns
+        -------
+        out : int
+
+        See Also
+        --------
+        min, argmax
+
+        """
+        return self._argextreme('min')
+
+    def argmax(self):
+        """
+        argmax()
+
+        Return the index of the (first) maximum value.
+
+        For multidimensional carrays, the index is into the flattened
+        array, as in NumPy.
+
+        Returns
+        -------
+        out : int
+
+        See Also
+        --------
+        max, argmin
+
+        """
+        return self._argextreme('max')
+
+    def count_nonzero(self):
+        """
+        count_nonzero()
+
+        Return the number of non-zero values.
+
+        Chunks of constants or runs, boolean chunks and chunks whose
+        statistics tell that all their values are zero (or non-zero) are
+        not decompressed.
+
+        Returns
+        -------
+        out : int
+
+        See Also
+        --------
+        any, all
+
+        """
+        if self._dtype.base.kind == 'O':
+            raise TypeError("cannot count the non-zero values of objects")
+        return int(sum(self._map_chunks(self._chunk_count_nonzero)))
+
+    def any(self):
+        """
+        any()
+
+        Return whether any value is non-zero.
+
+        The chunks are visited in order (in batches for the pool of
+        threads), and only until a non-zero value is found.
+
+        Returns
+        -------
+        out : bool
+
+        See Also
+        --------
+        all, count_nonzero
+
+        """
+        if self._dtype.base.kind == 'O':
+            raise TypeError("cannot check the values of objects")
+        for nonzeros in self._imap_chunks(self._chunk_count_nonzero):
+            if nonzeros > 0:
+                return True
+        return False
+
+    def all(self):
+        """
+        all()
+
+        Return whether all the values are non-zero.
+
+        The chunks are visited in order (in batches for the pool of
+        threads), and only until a zero value is found.
+
+        Returns
+        -------
+        out : bool
+
+        See Also
+        --------
+        any, count_nonzero
+
+        """
+        if self._dtype.base.kind == 'O':
+            raise TypeError("cannot check the values of objects")
+        for nchunk, nonzeros in enumerate(
+                self._imap_chunks(self._chunk_count_nonzero)):
+            if nonzeros < self._chunk_size(nchunk):
+                return False
+        return True
+
+    def mean(self, dtype=None):
+        """
+        mean(dtype=None)
+
+        Return the mean of the array elements.
+
+        Parameters
+        ----------
+        dtype : NumPy dtype
+            The type used for computing the mean.  By default it is
+            float64 for integer and boolean carrays, and the dtype of
+            `self` for the rest.
+
+        Returns
+        -------
+        out : NumPy scalar with `dtype`
+
+        See Also
+        --------
+        sum, var, std
+
+        """
+        dtype = self._reduce_dtype(dtype)
+        size = self.len * np.prod(self._dtype.shape, dtype=SizeType)
+        return dtype.type(np.true_divide(self.sum(dtype=dtype), size))
+
+    def var(self, dtype=None, ddof=0):
+        """
+        var(dtype=None, ddof=0)
+
+        Return the variance of the array elements.
+
+        The partial results of every chunk are combined with the
+        pairwise algorithm by Chan et al., which is numerically stable
+        and does not need to keep more than a chunk decompressed.
+
+        Parameters
+        ----------
+        dtype : NumPy dtype
+            The type used for computing the variance (see `mean()`).
+        ddof : int
+            The "delta degrees of freedom": the divisor used is ``N -
+            ddof``, where ``N`` is the number of elements.
+
+        Returns
+        -------
+        out : NumPy scalar with `dtype` (its real counterpart for complex
+        types)
+
+        See Also
+        --------
+        mean, std
+
+        """
+        dtype = self._reduce_dtype(dtype)
+        partials = self._map_chunks(
+            lambda nchunk: self._chunk_moments(nchunk, dtype))
+        count, mean, m2 = 0, dtype.type(0), 0.
+        for count2, mean2, m2b in partials:
+            total = count + count2
+            delta = mean2 - mean
+            mean = mean + delta * (count2 / float(total))
+            m2 = m2 + m2b + ((delta * delta.conjugate()).real *
+                             (count * (count2 / float(total))))
+            count = total
+        realtype = np.zeros(0, dtype=dtype).real.dtype.type
+        return realtype(np.true_divide(m2, max(count - ddof, 0)))
+
+    def std(self, dtype=None, ddof=0):
+        """
+        std(dtype=None, ddof=0)
+
+        Return the standard deviation of the array elements.
+
+        See `var()` for more info.
+
+        Returns
+        -------
+        out : NumPy scalar with `dtype` (its real counterpart for complex
+        types)
+
+        See Also
+        --------
+        mean, var
+
+        """
+        return np.sqrt(self.var(dtype=dtype, ddof=ddof))
+
+    def sort(self, **kwargs):
+        """
+        sort(**kwargs)
+
+        Return a sorted copy of this carray.
+
+        Contrarily to `ndarray.sort()`, this does not sort in-place.  The
+        values are sorted in runs of `bcolz.defaults.sort_memsize` bytes
+        at most, which are kept in a temporary directory and merged
+        afterwards, so this works for carrays that do not fit in memory.
+        As in NumPy, NaN values are sorted to the end.
+
+        Parameters
+        ----------
+        kwargs : list of parameters or dictionary
+            Any parameter supported by the carray constructor, like
+            `rootdir` for storing the result on disk.
+
+        Returns
+        -------
+        out : carray object
+            The sorted carray.
+
+        See Also
+        --------
+        argsort
+
+        """
+        from bcolz.sorting import sort_carray
+        return sort_carray(self, **kwargs)
+
+    def argsort(self, **kwargs):
+        """
+        argsort(**kwargs)
+
+        Return the indices that would sort this carray.
+
+        The sort is stable, and it works for carrays that do not fit in
+        memory.  See `sort()` for more info.
+
+        Parameters
+        ----------
+        kwargs : list of parameters or dictionary
+            Any parameter supported by the carray constructor, like
+            `rootdir` for storing the result on disk.
+
+        Returns
+        -------
+        out : carray object
+            A carray of int64 indices into this carray.
+
+        See Also
+        --------
+        sort
+
+        """
+        from bcolz.sorting import argsort_carray
+        return argsort_carray(self, **kwargs)
+
+    def take(self, indices):
+        """
+        take(indices)
+
+        Return the items at the `indices` positions.
+
+        The indices are grouped by chunk, so that every chunk involved is
+        read just once (and only the Blosc blocks between the first and
+        the last index in it are decompressed).  Then the values are put
+        back in the order of `indices`.  This is what fancy indexing with
+        integer arrays uses.
+
+        Parameters
+        ----------
+        indices : array_like of ints
+            The positions of the items to get.  Negative positions count
+            from the end.
+
+        Returns
+        -------
+        out : NumPy ndarray
+            The items, with the shape of `indices`.
+
+        See Also
+        --------
+        __getitem__
+
+        """
+        cdef npy_intp chunklen, nchunks, nchunk, i, n, first, last
+        cdef npy_intp *cids_
+        cdef npy_intp *offsets_
+        cdef npy_intp *order_
+        cdef ndarray starts, order, sidx, cids, offsets
+
+        indices = np.asarray(indices)
+        shape = indices.shape
+        if indices.dtype.kind not in 'iu':
+            if indices.size > 0:
+                raise IndexError("arrays used as indices must be integer")
+            indices = indices.astype(np.intp)
+        indices = indices.ravel().astype(np.intp)
+        n = len(indices)
+        out = np.empty(n, dtype=self._dtype)
+        if n > 0:
+            indices = np.where(indices < 0, indices + self.len, indices)
+            if indices.min() < 0 or indices.max() >= self.len:
+                raise IndexError("index out of range")
+
+        if n == 0:
+            pass
+        elif self.dtype.char == 'O':
+            for i in range(n):
+                out[i] = self[indices[i]]
+        else:
+            chunklen = self._chunklen
+            nchunks = cython.cdiv(self._nbytes, self._chunksize)
+            chunkids = indices // chunklen
+            if (chunkids[1:] >= chunkids[:-1]).all():
+                order = None
+                sidx = indices
+            else:
+                # Group the indices by chunk with a counting sort, which is
+                # much faster than a general sort
+                cids = chunkids
+                offsets = np.zeros(nchunks + 2, dtype=np.intp)
+                np.cumsum(np.bincount(cids, minlength=nchunks + 1),
+                          out=offsets[1:])
+                order = np.empty(n, dtype=np.intp)
+                cids_ = <npy_intp *> cids.data
+                offsets_ = <npy_intp *> offsets.data
+                order_ = <npy_intp *> order.data
+                for i in range(n):
+                    order_[offsets_[cids_[i]]] = i
+                    offsets_[cids_[i]] += 1
+                sidx = indices[order]
+                chunkids = chunkids[order]
+            starts = np.concatenate((
+                [0], np.flatnonzero(chunkids[1:] != chunkids[:-1]) + 1, [n]))
+            values = out if order is None else np.empty(n, dtype=self._dtype)
+            for i in range(len(starts) - 1):
+                pos = sidx[starts[i]:starts[i + 1]]
+                nchunk = chunkids[starts[i]]
+                pos = pos - nchunk * chunklen
+                first, last = pos.min(), pos.max() + 1
+                if nchunk == nchunks:
+                    block = self.lastchunkarr[first:last]
+                else:
+                    block = self.chunks[nchunk][first:last]
+                values[starts[i]:starts[i + 1]] = block[pos - first]
+            if order is not None:
+                out[order] = values
+        return out.reshape(shape + out.shape[1:])
+
+    def __len__(self):
         return self.len
 
     def __sizeof__(self):
         return self._cbytes
 
+    cdef _init_blockcache(self, npy_intp blocklen):
+        """(Re-)initialize the block cache for blocks of `blocklen` items."""
+        cdef npy_intp nslots, blockbytes
+
+        blockbytes = blocklen * self.atomsize
+        if (self.blockcache is None or self.blockcachelen != blocklen or
+                self.idxcache == -1):
+            # Make room for as many blocks as fit in the budget, in sets of
+            # BLOCKCACHE_WAYS blocks (but always for one block at least)
+            nslots = max(1, cython.cdiv(self._blockcache_size, blockbytes))
+            if nslots >= BLOCKCACHE_WAYS:
+                nslots -= nslots % BLOCKCACHE_WAYS
+                self.blockways = BLOCKCACHE_WAYS
+            else:
+                self.blockways = nslots
+            self.blockcache = np.empty(shape=(nslots, blocklen),
+                                       dtype=self._dtype)
+            self.datacache = self.blockcache.data
+            self.blocktags = np.empty(nslots, dtype=np.intp)
+            self.blockticks = np.empty(nslots, dtype=np.intp)
+            self.blockcachelen = blocklen
+            self.nblockslots = nslots
+        # Mark all the slots as empty
+        self.blocktags.fill(-1)
+        self.blockticks.fill(0)
+        self.blocktick = 0
+        self.idxcache = 0
+
     cdef int getitem_cache(self, npy_intp pos, char *dest):
-        """Get a single item and put it in `dest`.  It caches a complete block.
+        """Get a single item and put it in `dest`.  It caches complete blocks.
 
         It returns 1 if asked `pos` can be copied to `dest`.  Else,
         this returns
@@ -1757,12 +3428,20 @@ cdef class carray:
         that
         can be decompressed.  This saves both time and memory.
 
+        The cache keeps several blocks (up to `blockcache_size` bytes) in a
+        set-associative way: every block can only live in one of the sets of
+        BLOCKCACHE_WAYS slots, and the least recently used slot in the set
+        is replaced on misses.
+
         IMPORTANT: Any update operation (e.g. __setitem__) *must* disable this
         cache by setting self.idxcache = -2.
         """
-        cdef int ret, atomsize, blocksize, offset
-        cdef int idxcache, posinbytes, blocklen
-        cdef npy_intp nchunk, nchunks, chunklen
+        cdef int atomsize, blocksize
+        cdef npy_intp blocklen, blockbytes, posinbytes, offset
+        cdef npy_intp nchunk, nchunks, chunklen, idxcache
+        cdef npy_intp nsets, first, slot, victim
+        cdef npy_intp *tags
+        cdef npy_intp *ticks
         cdef chunk chunk_
 
         atomsize = self.atomsize
@@ -1776,51 +3455,217 @@ cdef class carray:
             memcpy(dest, self.lastchunk + posinbytes, atomsize)
             return 1
 
-        # Locate the *block* inside the chunk
         chunk_ = self.chunks[nchunk]
+        if chunk_.flags:
+            # Constant and run-length chunks need no decompression
+            offset = pos % chunklen
+            chunk_._getitem(offset, offset + 1, dest)
+            return 1
+
+        # Locate the *block* inside the chunk
         blocksize = chunk_.blocksize
         blocklen = <npy_intp> cython.cdiv(blocksize, atomsize)
 
-        if ((atomsize > blocksize) or ((pos + blocklen) > chunklen)):
+        if atomsize > blocksize:
             # This request cannot be resolved here
             return 0
+        # The start of the block, relative to the chunk
+        offset = <npy_intp> cython.cdiv(pos % chunklen, blocklen) * blocklen
+        if offset + blocklen > chunklen:
+            # The block is not complete; resolve this elsewhere
+            return 0
 
-        # Check whether the cache block has to be initialized
-        if self.idxcache < 0:
-            self.blockcache = np.empty(shape=(blocklen,), dtype=self._dtype)
-            self.datacache = self.blockcache.data
-            # We don't want this to contribute to cbytes counter!
-            # if self.idxcache == -1:
-            #   # Absolute first time.  Add the cache size to cbytes counter.
-            #   self._cbytes += chunksize
-
-        # Check if block is cached
-        idxcache = <npy_intp> cython.cdiv(pos, blocklen) * blocklen
-        if idxcache == self.idxcache:
-            # Hit!
-            posinbytes = (pos % blocklen) * atomsize
-            memcpy(dest, self.datacache + posinbytes, atomsize)
-            return 1
-
-        # No luck. Read a complete block.
-        offset = idxcache % chunklen
-        chunk_._getitem(offset, offset + blocklen, self.datacache)
+        # Check whether the cache has to be initialized
+        if self.idxcache < 0 or blocklen != self.blockcachelen:
+            self._init_blockcache(blocklen)
+
+        # Look for the block in its set
+        blockbytes = blocklen * atomsize
+        idxcache = nchunk * chunklen + offset
+        posinbytes = (pos - idxcache) * atomsize
+        nsets = <npy_intp> cython.cdiv(self.nblockslots, self.blockways)
+        first = (<npy_intp> cython.cdiv(idxcache, blocklen) % nsets) * \
+            self.blockways
+        tags = <npy_intp *> self.blocktags.data
+        ticks = <npy_intp *> self.blockticks.data
+        self.blocktick += 1
+        victim = first
+        for slot in range(first, first + self.blockways):
+            if tags[slot] == idxcache:
+                # Hit!
+                ticks[slot] = self.blocktick
+                self.blockhits += 1
+                memcpy(dest, self.datacache + slot * blockbytes + posinbytes,
+                       atomsize)
+                return 1
+            if ticks[slot] < ticks[victim]:
+                victim = slot
+
+        # No luck. Read a complete block in the least recently used slot.
+        self.blockmisses += 1
+        chunk_._getitem(offset, offset + blocklen,
+                        self.datacache + victim * blockbytes)
+        tags[victim] = idxcache
+        ticks[victim] = self.blocktick
         # Copy the interesting bits to dest
-        posinbytes = (pos % blocklen) * atomsize
-        memcpy(dest, self.datacache + posinbytes, atomsize)
-        # Update the cache index
-        self.idxcache = idxcache
+        memcpy(dest, self.datacache + victim * blockbytes + posinbytes,
+               atomsize)
         return 1
 
+    property blockcache_size:
+        """The maximum number of bytes used to cache decompressed blocks.
+
+        The blocks are used for speeding up the retrieval of single items.
+        At least one block is always cached, even if this is smaller than
+        a block.
+        """
+        def __get__(self):
+            return self._blockcache_size
+        def __set__(self, value):
+            if not isinstance(value, _inttypes) or value < 0:
+                raise ValueError(
+                    "`blockcache_size` must be a non-negative int")
+            self._blockcache_size = value
+            # Re-allocate the cache on next use
+            self.idxcache = -1
+            self.blockcache = None
+
+    property blockcache_stats:
+        """A dict with statistics about the cache of decompressed blocks.
+
+        The entries are 'hits' and 'misses' (number of lookups for single
+        items that were served from cache or not), 'nblocks' (the number of
+        blocks that fit in cache) and 'nbytes' (the memory used by them).
+        """
+        def __get__(self):
+            if self.blockcache is None:
+                nblocks = nbytes = 0
+            else:
+                nblocks = self.nblockslots
+                nbytes = self.blockcache.nbytes
+            return {'hits': self.blockhits, 'misses': self.blockmisses,
+                    'nblocks': nblocks, 'nbytes': nbytes}
+
+    def zonemap(self, nchunk, compute=False):
+        """
+        zonemap(nchunk, compute=False)
+
+        Return the (min, max, nnull) statistics for chunk `nchunk`.
+
+        The last (partial) chunk is also supported.  If the statistics
+        are not known (e.g. for chunks written by previous versions of
+        bcolz), None is returned, unless `compute` is true; in this case
+        they are computed (and kept in memory).
+
+        See Also
+        --------
+        chunk_stats
+
+        """
+        cdef npy_intp nchunks
+
+        nchunks = <npy_intp> cython.cdiv(self._nbytes, self._chunksize)
+        if nchunk < 0 or nchunk > nchunks or (
+                nchunk == nchunks and not self.leftover):
+            raise IndexError("chunk number out of range")
+        if self._dtype.base.kind not in ZONEMAP_KINDS:
+            return None
+        if nchunk == nchunks:
+            return compute_stats(self.lastchunkarr[
+                :cython.cdiv(self.leftover, self.atomsize)])
+        if type(self.chunks) is list:
+            stats = self.chunks[nchunk].stats
+        else:
+            stats = self.chunks.zonemap(nchunk)
+        if stats is None and compute:
+            stats = compute_stats(self.chunks[nchunk][:])
+            if type(self.chunks) is not list:
+                self.chunks.set_zonemap(nchunk, stats, persist=False)
+        return stats
+
+    def chunk_stats(self):
+        """
+        chunk_stats()
+
+        Return the statistics of the values in every chunk.
+
+        The statistics are kept for carrays of numerical and datetime
+        types (and saved in the meta directory for persistent ones).
+
+        Returns
+        -------
+        out : structured NumPy array
+            An array with an entry per chunk (the last partial chunk
+            included) with the 'min' and 'max' values, 'nnull' (the
+            number of NaN/NaT values) and 'count' (the number of
+            values) fields.  'min' and 'max' do not take nulls into
+            account.
+
+        See Also
+        --------
+        zonemap
+
+        """
+        cdef npy_intp nchunk, nchunks
+
+        basedtype = self._dtype.base
+        if basedtype.kind not in ZONEMAP_KINDS:
+            raise TypeError(
+                "statistics are not supported for '%s' dtype" % basedtype)
+        nchunks = <npy_intp> cython.cdiv(self._nbytes, self._chunksize)
+        if self.leftover:
+            nchunks += 1
+        stats = np.zeros(nchunks, dtype=[
+            ('min', basedtype), ('max', basedtype),
+            ('nnull', SizeType), ('count', SizeType)])
+        natoms = np.prod(self._dtype.shape, dtype=SizeType)
+        for nchunk from 0 <= nchunk < nchunks:
+            mn, mx, nnull = self.zonemap(nchunk, compute=True)
+            if nchunk == nchunks - 1 and self.leftover:
+                count = cython.cdiv(self.leftover, self.atomsize) * natoms
+            else:
+                count = self._chunklen * natoms
+            stats[nchunk] = (mn, mx, nnull, count)
+        return stats
+
     def free_cachemem(self):
         if type(self.chunks) is not list:
             self.chunks.free_cachemem()
         self.idxcache = -1
         self.blockcache = None
+        self.blocktags = None
+        self.blockticks = None
+        self.objcache = None
 
     def getitem_object(self, start, stop=None, step=None):
         """Retrieve elements of type object."""
-        import pickle
+        if self._objbatches:
+            if stop is None and step is None:
+                return self._getobject(start)
+            # Unpickle the objects batch by batch
+            chunklen = self._chunklen
+            objs = np.empty(get_len_of_range(start, stop, step),
+                            dtype=self._dtype)
+            nwrow = 0
+            for nchunk in xrange(start // chunklen,
+                                 (stop - 1) // chunklen + 1):
+                startb, stopb, blen = clip_chunk(nchunk, chunklen, start,
+                                                 stop, step)
+                if blen == 0:
+                    continue
+                if nchunk == len(self.chunks):
+                    objs[nwrow:nwrow + blen] = (
+                        self.lastchunkarr[startb:stopb:step])
+                else:
+                    data = self.chunks[nchunk].getudata()
+                    offsets, base = unpack_offsets(data)
+                    for pos in xrange(startb, stopb, step):
+                        objs[nwrow] = pickle.loads(
+                            data[base + offsets[pos]:base + offsets[pos + 1]])
+                        nwrow += 1
+                    continue
+                nwrow += blen
+            return objs
 
         if stop is None and step is None:
             # Integer
@@ -1832,6 +3677,22 @@ cdef class carray:
         objs = [self.getitem_object(i) for i in xrange(start, stop, step)]
         return np.array(objs, dtype=self._dtype)
 
+    def _getobject(self, npy_intp nrow):
+        """Return the object in row `nrow` (of a carray of batches)."""
+        cdef npy_intp nchunk, pos
+
+        nchunk = cython.cdiv(nrow, self._chunklen)
+        pos = nrow % self._chunklen
+        if nchunk == len(self.chunks):
+            return self.lastchunkarr[pos]
+        # Keep the last batch decompressed for subsequent reads
+        if self.objcache is None or self.objcache[0] != nchunk:
+            data = self.chunks[nchunk].getudata()
+            offsets, base = unpack_offsets(data)
+            self.objcache = (nchunk, data, offsets, base)
+        _, data, offsets, base = self.objcache
+        return pickle.loads(data[base + offsets[pos]:base + offsets[pos + 1]])
+
     def __getitem__(self, object key):
         """
         x.__getitem__(key) <==> x[key]
@@ -1930,7 +3791,7 @@ cdef class carray:
                                    count=count)
             elif np.issubsctype(key, np.int_):
                 # An integer array
-                return np.array([self[i] for i in key], dtype=self._dtype.base)
+                return self.take(key)
             else:
                 raise IndexError(
                     "arrays used as indices must be integer (or boolean)")
@@ -1969,6 +3830,7 @@ cdef class carray:
         nchunks = <npy_intp> cython.cdiv(self._nbytes, self._chunksize)
         if self.leftover > 0:
             nchunks += 1
+        reads = []
         for nchunk from 0 <= nchunk < nchunks:
             # Compute start & stop for each block
             startb, stopb, blen = clip_chunk(nchunk, chunklen, start, stop,
@@ -1979,12 +3841,33 @@ cdef class carray:
             if nchunk == nchunks - 1 and self.leftover:
                 arr[nwrow:nwrow + blen] = self.lastchunkarr[startb:stopb:step]
             else:
-                arr[nwrow:nwrow + blen] = self.chunks[nchunk][
-                                          startb:stopb:step]
+                reads.append((nchunk, startb, stopb, step, nwrow, blen))
             nwrow += blen
+        self.read_chunks(arr, reads)
 
         return arr
 
+    cdef read_chunks(self, ndarray out, object reads):
+        """Decompress chunks into `out` as described in `reads`.
+
+        Every read is a (nchunk, startb, stopb, step, nwrow, blen) tuple.
+        """
+        for read in reads:
+            self.read_chunk(out, read)
+
+    cdef read_chunk(self, ndarray out, object read):
+        """Decompress a chunk into `out` (see `read_chunks()`)."""
+        cdef chunk chunk_
+        cdef npy_intp nchunk, startb, stopb, step, nwrow, blen
+
+        nchunk, startb, stopb, step, nwrow, blen = read
+        chunk_ = self.chunks[nchunk]
+        if step == 1:
+            # Decompress straight into the output
+            chunk_._getitem(startb, stopb, out.data + nwrow * self.atomsize)
+        else:
+            out[nwrow:nwrow + blen] = chunk_[startb:stopb:step]
+
     def __setitem__(self, object key, object value):
         """
         x.__setitem__(key, value) <==> x[key] = value
@@ -2017,6 +3900,9 @@ cdef class carray:
         if self.mode == "r":
             raise IOError(
                 "cannot modify data because mode is '%s'" % self.mode)
+        if self._dtype.char == 'O':
+            raise NotImplementedError(
+                "modifying carrays of objects is not supported")
 
         # We are going to modify data.  Mark block cache as dirty.
         if self.idxcache >= 0:
@@ -2113,6 +3999,7 @@ cdef class carray:
             return
         value = utils.to_ndarray(value, self._dtype, arrlen=vlen,
                 safe=self._safe)
+        value = self.trim_values(value)
 
         # Fill it from data in chunks
         nwrow = 0
@@ -2158,10 +4045,15 @@ cdef class carray:
         cdef chunk chunk_
 
         # Check that we are inside limits
-        nrows = <npy_intp> cython.cdiv(self._nbytes, self.atomsize)
+        nrows = self.len
         if (start + blen) > nrows:
             blen = nrows - start
 
+        if self._dtype.char == 'O':
+            # Objects have to be unpickled
+            out[:blen] = self[start:start + blen]
+            return
+
         # Fill `out` from data in chunks
         nwrow = 0
         stop = start + blen
@@ -2206,6 +4098,7 @@ cdef class carray:
         vlen = boolarr.sum()  # number of true values in bool array
         value = utils.to_ndarray(value, self._dtype, arrlen=vlen,
                 safe=self._safe)
+        value = self.trim_values(value)
 
         # Fill it from data in chunks
         nwrow = 0
@@ -2258,6 +4151,10 @@ cdef class carray:
         self.stop = <npy_intp> cython.cdiv(self._nbytes, self.atomsize)
         self.step = 1
         self.iter_exhausted = False
+        self.prefetch = 0
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+            self.prefetcher = None
 
     def __iter__(self):
 
@@ -2281,11 +4178,20 @@ cdef class carray:
         else:
             self.nrowsinbuf = self._chunklen
 
+        if self.sss_mode and self.prefetch > 0:
+            # Read the buffers in background, using a different view so
+            # that this one can be released while the reader is alive
+            self.prefetcher = utils.prefetcher(
+                self.view()._readahead(self.nrowsread, self.stop,
+                                       self.nrowsinbuf),
+                self.prefetch)
+
         return self
 
-    def iter(self, start=0, stop=None, step=1, limit=None, skip=0, _next=False):
+    def iter(self, start=0, stop=None, step=1, limit=None, skip=0,
+             prefetch=0, _next=False):
         """
-        iter(start=0, stop=None, step=1, limit=None, skip=0)
+        iter(start=0, stop=None, step=1, limit=None, skip=0, prefetch=0)
 
         Iterator with `start`, `stop` and `step` bounds.
 
@@ -2303,6 +4209,11 @@ cdef class carray:
             everything.
         skip : int
             An initial number of elements to skip.  The default is 0.
+        prefetch : int
+            The number of chunks to be read (and decompressed) in advance
+            by a background thread.  This allows to overlap I/O with the
+            processing of the values returned.  The default is 0 (no
+            prefetching).
 
         Returns
         -------
@@ -2320,9 +4231,9 @@ cdef class carray:
             cview = self
         else:
             cview = self.view()
-        return cview._init_iter(start, stop, step, limit, skip)
+        return cview._init_iter(start, stop, step, limit, skip, prefetch)
 
-    def _init_iter(self, start, stop, step, limit, skip):
+    def _init_iter(self, start, stop, step, limit, skip, prefetch=0):
         self.reset_iter_sentinels()
         self.sss_mode = True
         self.start, self.stop, self.step = \
@@ -2330,8 +4241,22 @@ cdef class carray:
         if limit is not None:
             self.limit = limit + skip
         self.skip = skip
+        self.prefetch = prefetch
         return iter(self)
 
+    def _readahead(self, npy_intp start, npy_intp stop, npy_intp blen):
+        """Yield (nrow, buffer) tuples with data from `start` to `stop`.
+
+        Every buffer holds (up to) `blen` items starting at `nrow`.
+        """
+        cdef npy_intp nrow
+        cdef ndarray buf
+
+        for nrow in range(start, stop, blen):
+            buf = np.empty(min(blen, self.len - nrow), dtype=self._dtype)
+            self._getrange(nrow, len(buf), buf)
+            yield nrow, buf
+
     def wheretrue(self, limit=None, skip=0):
         """
         wheretrue(limit=None, skip=0)
@@ -2461,8 +4386,11 @@ cdef class carray:
                                      self.nrowsread:self.nrowsread + self.nrowsinbuf]
 
                 # Read a data chunk
-                self.iobuf = self[
-                             self.nrowsread:self.nrowsread + self.nrowsinbuf]
+                if self.prefetcher is not None:
+                    self.iobuf = self.next_prefetched(self.nrowsread)
+                else:
+                    self.iobuf = self[
+                        self.nrowsread:self.nrowsread + self.nrowsinbuf]
                 self.nrowsread += self.nrowsinbuf
 
                 # Check if we can skip this buffer
@@ -2511,9 +4439,20 @@ cdef class carray:
             # Release buffers
             self.iobuf = np.empty(0, dtype=self._dtype)
             self.where_buf = np.empty(0, dtype=np.bool_)
+            if self.prefetcher is not None:
+                self.prefetcher.close()
+                self.prefetcher = None
             self.iter_exhausted = True
             raise StopIteration  # end of iteration
 
+    cdef next_prefetched(self, npy_intp nrow):
+        """Get the buffer starting at `nrow` out of the prefetcher."""
+        while True:
+            bufrow, buf = next(self.prefetcher)
+            # Buffers that were skipped by the iterator are just discarded
+            if bufrow == nrow:
+                return buf
+
     cdef int check_zeros(self, object barr):
         """Check for zeros.  Return 1 if all zeros, else return 0."""
         cdef int bsize
@@ -2542,17 +4481,18 @@ cdef class carray:
 
     def _update_disk_sizes(self):
         """Update the sizes on-disk."""
-        sizes = dict()
         if self._rootdir:
-            sizes['shape'] = self.shape
-            sizes['nbytes'] = self.nbytes
-            sizes['cbytes'] = self.cbytes
             rowsf = os.path.join(self.metadir, SIZES_FILE)
             with open(rowsf, 'wb') as rowsfh:
-                rowsfh.write(
-                    json.dumps(sizes, ensure_ascii=True).encode('ascii'))
+                rowsfh.write(json.dumps(
+                    self._sizes_meta(), ensure_ascii=True).encode('ascii'))
                 rowsfh.write(b'\n')
 
+    def _sizes_meta(self):
+        """Return the metadata in the sizes file (as a dictionary)."""
+        return {'shape': self.shape, 'nbytes': self.nbytes,
+                'cbytes': self.cbytes}
+
     def flush(self):
         """Flush data in internal buffers to disk.
 
@@ -2570,12 +4510,20 @@ cdef class carray:
 
         if self.leftover:
             leftover_atoms = cython.cdiv(self.leftover, self.atomsize)
-            chunk_ = chunk(self.lastchunkarr[:leftover_atoms], self.dtype,
-                           self.cparams,
-                           _memory=self._rootdir is None)
+            if self._objbatches:
+                chunk_ = chunk(pack_objects(self.lastchunkarr[:leftover_atoms]),
+                               self.dtype, self.cparams,
+                               _memory=self._rootdir is None)
+            else:
+                chunk_ = chunk(self.lastchunkarr[:leftover_atoms],
+                               self._dtype, self.cparams,
+                               _memory=self._rootdir is None)
             # Flush this chunk to disk
             self.chunks.flush(chunk_)
 
+        # Save the statistics of the chunks
+        self.chunks.flush_zonemaps()
+
         # Finally, update the sizes metadata on-disk
         self._update_disk_sizes()
 
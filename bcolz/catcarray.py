@@ -0,0 +1,438 @@
+########################################################################
+#
+#       License: BSD
+#       Created: October 18, 2026
+#
+########################################################################
+
+from __future__ import absolute_import
+
+import os
+import shutil
+
+import numpy as np
+import bcolz
+from bcolz import attrs
+from bcolz.strcarray import strcarray
+from .py2help import imap, unicode
+
+# The directories for the codes and the categories of a catcarray
+CODES_DIR = 'codes'
+CATEGORIES_DIR = 'categories'
+
+# The types for the codes, depending on the number of categories
+_CODETYPES = (np.int8, np.int16, np.int32)
+
+
+def is_catcarray(rootdir):
+    """Whether `rootdir` hosts a catcarray."""
+    return os.path.isdir(os.path.join(rootdir, CATEGORIES_DIR))
+
+
+def _ismissing(value):
+    """Whether `value` is a missing value (None or NaN)."""
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def _codetype(ncategories):
+    """The smallest type for the codes of `ncategories` categories."""
+    for codetype in _CODETYPES:
+        if ncategories <= np.iinfo(codetype).max:
+            return np.dtype(codetype)
+    raise ValueError("too many categories")
+
+
+class catcarray(strcarray):
+    """
+    catcarray(array=None, categories=None, kind=None, cparams=None,
+    expectedlen=None, chunklen=None, rootdir=None, mode='a', layout=None)
+
+    A compressed and enlargeable container for categorical strings.
+
+    Every distinct string (a *category*) is stored only once, in a
+    vlcarray, and the values are kept as small integer codes into the
+    categories in a carray.  The codes take 1, 2 or 4 bytes, depending on
+    the number of categories, and -1 is used for missing values (None or
+    NaN).  New categories are added as new values are appended.
+
+    A catcarray can be used as a column of a ctable.  Comparisons for
+    equality (``==``, ``!=``) and membership (``in``, ``not in``) between
+    a catcarray and string constants in `eval()` and `ctable.where()` are
+    done on the codes, without decoding them.
+
+    Parameters
+    ----------
+    array : a sequence of strings
+        This is taken as the input to create the catcarray.
+    categories : a sequence of strings, optional
+        The initial categories, in the order of their codes.  The values
+        in `array` not found here are added as new categories.
+    kind : 'S' or 'U', optional
+        Whether the categories are bytes ('S') or unicode ('U') strings.
+        If None, it is inferred from `categories` or `array`.
+    cparams : instance of the `cparams` class, optional
+        Parameters to the internal Blosc compressor.
+    expectedlen : int, optional
+        A guess on the expected number of values in this object.
+    chunklen : int, optional
+        The number of codes that fit into a chunk.
+    rootdir : str, optional
+        The directory where all the data and metadata will be stored.  If
+        specified, the catcarray object will be disk-based and persistent.
+    mode : str, optional
+        The mode that a *persistent* catcarray should be created/opened.
+        The values are the same than for `carray`.
+    layout : str, optional
+        The on-disk layout for the chunks of a *persistent* catcarray being
+        created.  The values are the same than for `carray`.
+
+    See Also
+    --------
+    catcarray.fromcodes
+
+    """
+
+    _STORAGE_KEY = 'categorical'
+
+    # Properties
+    # ``````````
+
+    @property
+    def categories(self):
+        "The list of categories (the code of each one is its position)."
+        return list(self._categories)
+
+    def __init__(self, array=None, categories=None, kind=None, cparams=None,
+                 expectedlen=None, chunklen=None, rootdir=None, mode='a',
+                 layout=None):
+        self._check_args(mode, kind)
+        self.rootdir = rootdir
+        self.mode = mode
+
+        if array is not None:
+            self._create(array, categories, kind, cparams, expectedlen,
+                         chunklen, layout)
+            _new = True
+        elif rootdir is not None:
+            self._open()
+            _new = False
+        else:
+            raise ValueError(
+                "You need at least to pass an array or/and a rootdir")
+
+        # Attach the attrs to this object
+        self.attrs = attrs.attrs(self.rootdir, self.mode, _new=_new)
+
+    def _create(self, array, categories, kind, cparams, expectedlen,
+                chunklen, layout):
+        """Create a new catcarray."""
+        if categories is None:
+            categories = []
+        if len(set(categories)) != len(categories):
+            raise ValueError("`categories` cannot have duplicates")
+        if kind is None:
+            kind = self._infer_kind(categories)
+            if kind is None:
+                kind = self._infer_kind(array)
+            if kind is None:
+                kind = 'U'
+        if expectedlen is None:
+            expectedlen = len(array)
+        self._create_rootdir()
+        self._catarray = bcolz.vlcarray(
+            [], kind=kind, rootdir=self._subdir(CATEGORIES_DIR))
+        self._categories, self._index, self._lookup = [], {}, None
+        self._addcategories(categories)
+        self.codes = bcolz.carray(
+            np.empty(0, dtype=_codetype(len(self._categories))),
+            cparams=cparams, expectedlen=expectedlen, chunklen=chunklen,
+            rootdir=self._subdir(CODES_DIR), layout=layout)
+        self.append(array)
+        self.flush()
+
+    def _open(self):
+        """Open an existing catcarray."""
+        if not os.path.isdir(self.rootdir):
+            raise IOError("root directory does not exist")
+        self._catarray = bcolz.vlcarray(
+            rootdir=self._subdir(CATEGORIES_DIR), mode=self.mode)
+        self.codes = bcolz.carray(rootdir=self._subdir(CODES_DIR),
+                                  mode=self.mode)
+        self._categories = self._catarray[:].tolist()
+        self._index = dict((value, code) for code, value
+                           in enumerate(self._categories))
+        self._lookup = None
+        if self.mode == 'w':
+            # The carrays have been emptied
+            self.flush()
+
+    @staticmethod
+    def fromcodes(codes, categories, **kwargs):
+        """
+        fromcodes(codes, categories, **kwargs)
+
+        Return a catcarray out of integer `codes` into `categories`.
+        Missing values are represented by a -1 code.  `kwargs` are the
+        parameters supported by the catcarray constructor.
+
+        This is useful for avoiding the encoding of data that is already
+        categorical, like a `pandas.Categorical` object.
+        """
+        codes = np.asarray(codes)
+        if codes.dtype.kind not in 'iu':
+            raise ValueError("`codes` must be of integer type")
+        if len(codes) and (codes.min() < -1 or
+                           codes.max() >= len(categories)):
+            raise ValueError("`codes` out of the range of `categories`")
+        kwargs.setdefault('expectedlen', len(codes))
+        ccat = catcarray([], categories=categories, **kwargs)
+        ccat.codes.append(codes.astype(ccat.codes.dtype))
+        ccat.flush()
+        return ccat
+
+    @staticmethod
+    def _infer_kind(array):
+        """Infer the kind of strings in `array` (None if no strings)."""
+        if isinstance(array, bytes):
+            return 'S'
+        if isinstance(array, unicode):
+            return 'U'
+        dtype = getattr(array, 'dtype', None)
+        if dtype is not None and dtype.kind in ('S', 'U'):
+            return dtype.kind
+        for value in array:
+            if isinstance(value, bytes):
+                return 'S'
+            if isinstance(value, unicode):
+                return 'U'
+        return None
+
+    def _addcategories(self, values):
+        """Add the strings in `values` (if new) to the categories."""
+        strtype = bytes if self.kind == 'S' else unicode
+        new = []
+        for value in values:
+            if value in self._index:
+                continue
+            if not isinstance(value, strtype):
+                raise TypeError(
+                    "catcarray of kind '%s' cannot store %r" %
+                    (self.kind, value))
+            self._index[value] = len(self._categories)
+            self._categories.append(value)
+            new.append(value)
+        if new:
+            self._catarray.append(new)
+            self._lookup = None
+
+    @property
+    def kind(self):
+        "Whether the categories are bytes ('S') or unicode ('U') strings."
+        return self._catarray.kind
+
+    def _encode(self, array):
+        """Return the codes for the values in `array`.
+
+        The values that are not categories yet are added as new ones.
+        """
+        if (array is None or isinstance(array, (bytes, unicode)) or
+                np.ndim(array) == 0):
+            array = [array]
+        if isinstance(array, np.ndarray) and array.dtype.kind in ('S', 'U'):
+            # Let NumPy find the distinct values
+            uniques, inverse = np.unique(array, return_inverse=True)
+        else:
+            seen = {}
+            inverse = np.fromiter(
+                (seen.setdefault(value, len(seen)) for value in array),
+                dtype=np.int64)
+            uniques = [None] * len(seen)
+            for value, pos in seen.items():
+                uniques[pos] = value
+        present = [value for value in uniques if not _ismissing(value)]
+        self._addcategories(present)
+        ucodes = np.array([-1 if _ismissing(value) else self._index[value]
+                           for value in uniques], dtype=np.int64)
+        codetype = _codetype(len(self._categories))
+        if codetype.itemsize > self.codes.dtype.itemsize:
+            self._widen(codetype)
+        return ucodes[inverse].astype(self.codes.dtype)
+
+    def _widen(self, codetype):
+        """Convert the codes into the larger `codetype`."""
+        codes = self.codes
+        kwargs = dict(cparams=codes.cparams, chunklen=codes.chunklen,
+                      expectedlen=len(codes))
+        if self.rootdir is not None:
+            codesdir = self._subdir(CODES_DIR)
+            tmpdir = codesdir + '.tmp'
+            kwargs['rootdir'] = tmpdir
+        wide = bcolz.carray(np.empty(0, dtype=codetype), **kwargs)
+        for block in bcolz.iterblocks(codes):
+            wide.append(block.astype(codetype))
+        wide.flush()
+        if self.rootdir is not None:
+            shutil.rmtree(codesdir)
+            os.rename(tmpdir, codesdir)
+            wide = bcolz.carray(rootdir=codesdir, mode=self.mode)
+        self.codes = wide
+
+    def _decoder(self):
+        """Return an array for mapping codes (-1 included) into values."""
+        if self._lookup is None:
+            lookup = np.empty(len(self._categories) + 1, dtype=np.object_)
+            lookup[:-1] = self._categories
+            lookup[-1] = None  # the value for the -1 code
+            self._lookup = lookup
+        return self._lookup
+
+    def getcode(self, value):
+        """
+        getcode(value)
+
+        Return the code for `value`, -1 for missing values or None if
+        `value` is not a category.
+        """
+        if _ismissing(value):
+            return -1
+        # Allow looking up unicode in bytes categories and vice versa
+        if self.kind == 'U' and isinstance(value, bytes):
+            value = value.decode('utf-8')
+        elif self.kind == 'S' and isinstance(value, unicode):
+            value = value.encode('utf-8')
+        return self._index.get(value)
+
+    def isin(self, values):
+        """
+        isin(values)
+
+        Return a boolean carray that is true for the values of this
+        object that are in `values`.  The comparison is done on the
+        codes.
+        """
+        if isinstance(values, (bytes, unicode)):
+            values = [values]
+        mask = np.zeros(len(self._categories) + 1, dtype=np.bool_)
+        for value in values:
+            code = self.getcode(value)
+            if code is not None:
+                mask[code] = True
+        out = bcolz.carray(np.empty(0, dtype=np.bool_), expectedlen=self.len)
+        for block in bcolz.iterblocks(self.codes):
+            out.append(mask[block])
+        out.flush()
+        return out
+
+    def _containers(self):
+        """Return the inner containers of this object."""
+        return self.codes, self._catarray
+
+    def __setitem__(self, key, value):
+        raise NotImplementedError(
+            "modifying the values of a catcarray is not supported")
+
+    def __getitem__(self, key):
+        """
+        x.__getitem__(key) <==> x[key]
+
+        Returns values based on `key`.  All the keys supported by
+        ``carray.__getitem__()`` can be used.  The outcome for all but
+        integers is an array of objects.
+        """
+        # The -1 code of missing values maps into the last entry
+        return self._decoder()[self.codes[key]]
+
+    # This is a private function that is specific for `eval`
+    def _getrange(self, start, blen, out):
+        """Put the values in [start:start+blen] into `out`."""
+        blen = min(blen, self.len - start)
+        codes = np.empty(blen, dtype=self.codes.dtype)
+        self.codes._getrange(start, blen, codes)
+        out[:blen] = self._decoder()[codes]
+
+    def iter(self, start=0, stop=None, step=1, limit=None, skip=0,
+             prefetch=0):
+        """
+        iter(start=0, stop=None, step=1, limit=None, skip=0, prefetch=0)
+
+        Iterator with `start`, `stop` and `step` bounds.  See
+        `carray.iter()` for the meaning of the parameters.
+        """
+        codes = self.codes.iter(start, stop, step, limit=limit, skip=skip,
+                                prefetch=prefetch)
+        return imap(self._decoder().__getitem__, codes)
+
+    def where(self, boolarr, limit=None, skip=0):
+        """
+        where(boolarr, limit=None, skip=0)
+
+        Iterator that returns values of this object where `boolarr` is
+        true.  See `carray.where()` for the meaning of the parameters.
+        """
+        codes = self.codes.where(boolarr, limit=limit, skip=skip)
+        return imap(self._decoder().__getitem__, codes)
+
+    def append(self, array):
+        """
+        append(array)
+
+        Append the strings in `array` (or a single string) to this
+        instance.  The strings that are not categories yet are added as
+        new ones.
+        """
+        codes = self._encode(array)
+        if len(codes) == 0:
+            return
+        self.codes.append(codes)
+
+    def trim(self, nitems):
+        """
+        trim(nitems)
+
+        Remove the trailing `nitems` from this instance.  The categories
+        are kept.
+        """
+        self.codes.trim(nitems)
+        self._update_disk_sizes()
+
+    def resize(self, nitems):
+        """
+        resize(nitems)
+
+        Resize the instance to have `nitems`.  New items are missing
+        values.
+        """
+        if nitems < self.len:
+            self.trim(self.len - nitems)
+        elif nitems > self.len:
+            self.codes.append(
+                np.repeat(self.codes.dtype.type(-1), nitems - self.len))
+            self.flush()
+
+    def copy(self, **kwargs):
+        """
+        copy(**kwargs)
+
+        Return a copy of this object.  `kwargs` are the parameters
+        supported by the catcarray constructor.
+        """
+        kwargs.setdefault('expectedlen', self.len)
+        kwargs.setdefault('cparams', self.cparams)
+        kwargs.setdefault('kind', self.kind)
+        ccopy = catcarray([], categories=self._categories, **kwargs)
+        for block in bcolz.iterblocks(self.codes):
+            ccopy.codes.append(block.astype(ccopy.codes.dtype))
+        ccopy.flush()
+        return ccopy
+
+    def _repr_args(self):
+        """Return the arguments shown in the first line of the repr."""
+        return "%s, '%s', categories: %d" % (self.shape, self.kind,
+                                             len(self._categories))
+
+
+# Local Variables:
+# mode: python
+# tab-width: 4
+# fill-column: 78
+# End:
@@ -12,10 +12,11 @@
 from __future__ import absolute_import
 
 import sys
+import ast
 import math
 import numpy as np
 import bcolz
-from bcolz.py2help import xrange
+from bcolz.py2help import unicode, xrange
 
 if bcolz.numexpr_here:
     from numexpr.expressions import functions as numexpr_functions
@@ -123,6 +124,10 @@ def eval(expression, vm=None, out_flavor=None, user_dict={}, **kwargs):
     depth = kwargs.pop('depth', 2)
     vars = _getvars(expression, user_dict, depth, vm=vm)
 
+    # Comparisons on categorical columns are done on their codes
+    if any(isinstance(var, bcolz.catcarray) for var in vars.values()):
+        expression, vars, vm = _categorical(expression, vars, vm)
+
     # Gather info about sizes and lengths
     typesize, vlen = 0, 1
     for name in vars:
@@ -150,6 +155,12 @@ def eval(expression, vm=None, out_flavor=None, user_dict={}, **kwargs):
         else:
             return bcolz.numexpr.evaluate(expression, local_dict=vars)
 
+    # Boolean expressions on carrays may skip chunks by using their stats
+    plan = _plan(expression, vars, vlen)
+    if plan is not None:
+        return _eval_pruned(expression, vars, vlen, typesize, vm, out_flavor,
+                            plan, **kwargs)
+
     return _eval_blocks(expression, vars, vlen, typesize, vm, out_flavor,
                         **kwargs)
 
@@ -255,3 +266,409 @@ def _eval_blocks(expression, vars, vlen, typesize, vm, out_flavor,
     if scalar:
         return result[()]
     return result
+
+
+# The outcomes of checking a predicate against the stats of a chunk
+NONE, SOME, ALL = 0, 1, 2
+
+# Comparisons with the variable on the left side, and their mirrors
+_CMPOPS = {ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=',
+           ast.Eq: '==', ast.NotEq: '!='}
+_MIRROR = {'<': '>', '<=': '>=', '>': '<', '>=': '<=', '==': '==',
+           '!=': '!='}
+
+
+def _check_stats(op, value, stats, count):
+    """Check `column op value` against the `stats` of a chunk.
+
+    `stats` is a (min, max, nnull) tuple and `count` the number of values
+    in the chunk.  Returns NONE, SOME or ALL depending on the rows of the
+    chunk that can fulfill the comparison.
+    """
+    mn, mx, nnull = stats
+    if nnull == count:
+        # Comparisons with NaN are always false, except for !=
+        return ALL if op == '!=' else NONE
+    if nnull and not isinstance(mn, (np.floating, float)):
+        # NaT comparisons depend on the NumPy version
+        return SOME
+    if op == '>':
+        none, all_ = mx <= value, mn > value
+    elif op == '>=':
+        none, all_ = mx < value, mn >= value
+    elif op == '<':
+        none, all_ = mn >= value, mx < value
+    elif op == '<=':
+        none, all_ = mn > value, mx <= value
+    elif op == '==':
+        none, all_ = value < mn or value > mx, mn == mx == value
+    else:
+        # NaN != value is true, so it does not prevent ALL
+        return (ALL if value < mn or value > mx else
+                NONE if mn == mx == value and not nnull else SOME)
+    if none:
+        return NONE
+    if all_ and not nnull:
+        return ALL
+    return SOME
+
+
+class _leaf(object):
+    """A comparison between a carray and a constant."""
+
+    def __init__(self, var, op, value):
+        self.var, self.op, self.value = var, op, value
+        self.chunklen = var.chunklen
+        self.states = {}
+
+    def check(self, start, stop):
+        """Check the rows in [start, stop) against the chunk stats."""
+        var, chunklen = self.var, self.chunklen
+        state = None
+        for nchunk in xrange(start // chunklen, (stop - 1) // chunklen + 1):
+            cstate = self.states.get(nchunk)
+            if cstate is None:
+                stats = var.zonemap(nchunk)
+                if stats is None:
+                    cstate = SOME
+                else:
+                    count = min(chunklen, len(var) - nchunk * chunklen)
+                    try:
+                        cstate = _check_stats(self.op, self.value, stats,
+                                              count)
+                    except (TypeError, ValueError):
+                        cstate = SOME
+                self.states[nchunk] = cstate
+            if state is None:
+                state = cstate
+            elif state != cstate:
+                return SOME
+        return state
+
+
+class _unknown(object):
+    """A predicate that cannot be checked with stats."""
+    chunklen = None
+
+    def check(self, start, stop):
+        return SOME
+
+
+class _combine(object):
+    """The combination of predicates with '&', '|' or '~'."""
+
+    def __init__(self, op, preds):
+        self.op, self.preds = op, preds
+        chunklens = [p.chunklen for p in preds if p.chunklen is not None]
+        self.chunklen = min(chunklens) if chunklens else None
+
+    def check(self, start, stop):
+        states = [pred.check(start, stop) for pred in self.preds]
+        if self.op == '~':
+            return ALL - states[0]
+        elif self.op == '&':
+            return min(states)
+        else:
+            return max(states)
+
+
+def _constant(node, vars):
+    """Return the scalar value for `node` (or None if not a scalar)."""
+    if isinstance(node, ast.Num):
+        return node.n
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        value = _constant(node.operand, vars)
+        return -value if value is not None else None
+    if isinstance(node, ast.Name):
+        value = vars.get(node.id)
+        if (isinstance(value, (int, float, np.number, np.datetime64,
+                               np.timedelta64)) and
+                not isinstance(value, bool)):
+            return value
+    return None
+
+
+def _column(node, vars, vlen):
+    """Return the carray for `node` (or None if not a plain carray)."""
+    if isinstance(node, ast.Name):
+        var = vars.get(node.id)
+        if (isinstance(var, bcolz.carray) and var.ndim == 1 and
+                len(var) == vlen and var.dtype.kind in 'biufMm'):
+            return var
+    return None
+
+
+def _compare(left, op, right, vars, vlen):
+    """Build the predicate for `left op right`."""
+    var, value = _column(left, vars, vlen), _constant(right, vars)
+    if var is None or value is None:
+        var, value = _column(right, vars, vlen), _constant(left, vars)
+        op = _MIRROR[op]
+    if var is None or value is None:
+        return _unknown()
+    return _leaf(var, op, value)
+
+
+def _build(node, vars, vlen):
+    """Build the predicate for `node` (None if not a boolean expression)."""
+    if isinstance(node, ast.Compare):
+        operands = [node.left] + node.comparators
+        preds = []
+        for left, op, right in zip(operands, node.ops, operands[1:]):
+            if type(op) not in _CMPOPS:
+                return None
+            preds.append(_compare(left, _CMPOPS[type(op)], right, vars, vlen))
+        return preds[0] if len(preds) == 1 else _combine('&', preds)
+    if isinstance(node, ast.BinOp) and type(node.op) in (ast.BitAnd,
+                                                          ast.BitOr):
+        preds = [_build(node.left, vars, vlen),
+                 _build(node.right, vars, vlen)]
+        if None in preds:
+            return None
+        return _combine('&' if isinstance(node.op, ast.BitAnd) else '|',
+                        preds)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert):
+        pred = _build(node.operand, vars, vlen)
+        return _combine('~', [pred]) if pred is not None else None
+    return None
+
+
+def _plan(expression, vars, vlen):
+    """Plan the evaluation of `expression` by chunks.
+
+    For boolean expressions made of comparisons between carrays and
+    constants (combined with '&', '|' or '~'), this returns a predicate
+    whose `check(start, stop)` method tells whether NONE, SOME or ALL of
+    the rows in [start, stop) can fulfill the expression, without reading
+    them.  Else, None is returned.
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError:
+        return None
+    pred = _build(tree.body, vars, vlen)
+    if pred is None or pred.chunklen is None:
+        # No chunks to skip
+        return None
+    return pred
+
+
+def _eval_pruned(expression, vars, vlen, typesize, vm, out_flavor, plan,
+                 **kwargs):
+    """Perform the evaluation of a boolean expression skipping chunks.
+
+    Only the runs of rows for which `plan` cannot decide the outcome are
+    actually read and evaluated.
+    """
+    chunklen = plan.chunklen
+    # Use blocks that are multiple of the chunklen
+    bsize = max(chunklen, (2 ** 22 // typesize) // chunklen * chunklen)
+    result = None
+    for i in xrange(0, vlen, bsize):
+        stop = min(i + bsize, vlen)
+        res_block = np.empty(stop - i, dtype=np.bool_)
+        # Group consecutive chunks with the same outcome in runs
+        runs = []
+        for start in xrange(i, stop, chunklen):
+            state = plan.check(start, min(start + chunklen, stop))
+            if runs and runs[-1][2] == state:
+                runs[-1][1] = min(start + chunklen, stop)
+            else:
+                runs.append([start, min(start + chunklen, stop), state])
+        for start, end, state in runs:
+            if state != SOME:
+                res_block[start - i:end - i] = (state == ALL)
+                continue
+            vars_ = {}
+            for name, var in vars.items():
+                if hasattr(var, "__len__"):
+                    vars_[name] = var[start:end]
+                else:
+                    vars_[name] = var
+            if vm == "numexpr":
+                try:
+                    res = bcolz.numexpr.evaluate(expression,
+                                                 local_dict=vars_)
+                except ValueError:
+                    vm = "python"
+            if vm == "python":
+                res = _eval(expression, vars_)
+            res_block[start - i:end - i] = res
+
+        if result is None:
+            if out_flavor == "carray":
+                nrows = kwargs.pop('expectedlen', vlen)
+                result = bcolz.carray(res_block, expectedlen=nrows, **kwargs)
+            else:
+                result = np.empty(vlen, dtype=np.bool_)
+                result[:stop] = res_block
+        elif out_flavor == "carray":
+            result.append(res_block)
+        else:
+            result[i:stop] = res_block
+
+    if isinstance(result, bcolz.carray):
+        result.flush()
+    return result
+
+
+# Operators for rebuilding the source of expressions
+_BINOPS = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/',
+           ast.FloorDiv: '//', ast.Mod: '%', ast.Pow: '**', ast.BitAnd: '&',
+           ast.BitOr: '|', ast.BitXor: '^', ast.LShift: '<<',
+           ast.RShift: '>>'}
+_UNARYOPS = {ast.USub: '-', ast.UAdd: '+', ast.Invert: '~',
+             ast.Not: 'not '}
+_ALLCMPOPS = {ast.In: 'in', ast.NotIn: 'not in', ast.Is: 'is',
+              ast.IsNot: 'is not'}
+_ALLCMPOPS.update(_CMPOPS)
+_STRNODES = (ast.Str, getattr(ast, 'Bytes', ast.Str))
+
+
+def _strconst(node, vars):
+    """Return the string value for `node` (or None if not a string)."""
+    if isinstance(node, ast.Name):
+        value = vars.get(node.id)
+    elif isinstance(node, _STRNODES):
+        value = node.s
+    else:
+        return None
+    return value if isinstance(value, (bytes, unicode)) else None
+
+
+def _strseq(node, vars):
+    """Return the strings in the sequence `node` (or None if not there)."""
+    if isinstance(node, ast.Name):
+        values = vars.get(node.id)
+        if not isinstance(values, (list, tuple, set, frozenset)):
+            return None
+    elif isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+        values = [_strconst(elt, vars) for elt in node.elts]
+    else:
+        return None
+    if not all(isinstance(value, (bytes, unicode)) for value in values):
+        return None
+    return values
+
+
+def _catcompare(left, op, right, vars, cats):
+    """Return the source for `left op right` done on the codes of a
+    catcarray (or None if this is not a comparison with strings)."""
+    if isinstance(op, (ast.Eq, ast.NotEq)):
+        var, value = left, _strconst(right, vars)
+        if not (isinstance(var, ast.Name) and var.id in cats and
+                value is not None):
+            var, value = right, _strconst(left, vars)
+        if not (isinstance(var, ast.Name) and var.id in cats and
+                value is not None):
+            return None
+        values = [value]
+    elif isinstance(op, (ast.In, ast.NotIn)):
+        var, values = left, _strseq(right, vars)
+        if not (isinstance(var, ast.Name) and var.id in cats and
+                values is not None):
+            return None
+    else:
+        return None
+    codes = set(cats[var.id].getcode(value) for value in values)
+    codes.discard(None)
+    if not codes:
+        # A code that is never used
+        codes = [-2]
+    if isinstance(op, (ast.Eq, ast.In)):
+        cmpop, join = '==', ' | '
+    else:
+        cmpop, join = '!=', ' & '
+    return "(%s)" % join.join("(%s %s %d)" % (var.id, cmpop, code)
+                              for code in sorted(codes))
+
+
+def _catsource(node, vars, cats, used):
+    """Return the source for `node`.
+
+    The comparisons of the catcarrays in `cats` with strings are done on
+    their codes.  The names of catcarrays used in other ways are added to
+    `used`.  ValueError is raised for unsupported syntax.
+    """
+    def source(node):
+        return _catsource(node, vars, cats, used)
+
+    if isinstance(node, ast.Name):
+        if node.id in cats:
+            used.add(node.id)
+        return node.id
+    if isinstance(node, ast.Compare):
+        if len(node.ops) == 1:
+            src = _catcompare(node.left, node.ops[0], node.comparators[0],
+                              vars, cats)
+            if src is not None:
+                return src
+        parts = [source(node.left)]
+        for op, right in zip(node.ops, node.comparators):
+            parts += [_ALLCMPOPS[type(op)], source(right)]
+        return "(%s)" % " ".join(parts)
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINOPS:
+        return "(%s %s %s)" % (source(node.left), _BINOPS[type(node.op)],
+                               source(node.right))
+    if isinstance(node, ast.UnaryOp):
+        return "(%s%s)" % (_UNARYOPS[type(node.op)], source(node.operand))
+    if isinstance(node, ast.BoolOp):
+        join = " and " if isinstance(node.op, ast.And) else " or "
+        return "(%s)" % join.join(source(value) for value in node.values)
+    if isinstance(node, ast.Call):
+        if any(kw.arg is None for kw in node.keywords):
+            raise ValueError("unsupported syntax")
+        args = [source(arg) for arg in node.args]
+        args += ["%s=%s" % (kw.arg, source(kw.value))
+                 for kw in node.keywords]
+        return "%s(%s)" % (source(node.func), ", ".join(args))
+    if isinstance(node, ast.Attribute):
+        return "%s.%s" % (source(node.value), node.attr)
+    if isinstance(node, (ast.Tuple, ast.List)):
+        elts = "".join(source(elt) + ", " for elt in node.elts)
+        if isinstance(node, ast.List):
+            return "[%s]" % elts
+        return "(%s)" % elts
+    if isinstance(node, ast.Num):
+        return repr(node.n)
+    if isinstance(node, _STRNODES):
+        return repr(node.s)
+    if type(node).__name__ in ('NameConstant', 'Constant'):
+        return repr(node.value)
+    raise ValueError("unsupported syntax")
+
+
+def _categorical(expression, vars, vm):
+    """Rewrite `expression` for doing comparisons on catcarrays by codes.
+
+    Equality and membership comparisons between catcarrays and strings
+    become comparisons between their codes and integers.  Returns the
+    new (expression, vars, vm).  If a catcarray is used in other ways,
+    its decoded values are used instead (with the 'python' vm).
+    """
+    cats = dict((name, var) for name, var in vars.items()
+                if isinstance(var, bcolz.catcarray))
+    vars = dict(vars)
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+        used = set()
+        source = _catsource(tree.body, vars, cats, used)
+        if used:
+            # Do not rewrite the comparisons on the decoded catcarrays
+            for name in used:
+                del cats[name]
+            source = _catsource(tree.body, vars, cats, set())
+        # Forget the vars that were only used for the comparisons
+        names = compile(source, '<string>', 'eval').co_names
+        vars = dict((name, var) for name, var in vars.items()
+                    if name in names)
+        expression = source
+    except (SyntaxError, KeyError, ValueError):
+        used = set(cats)
+        cats = {}
+    for name in used:
+        vars[name] = vars[name][:]
+        vm = "python"
+    for name, var in cats.items():
+        vars[name] = var.codes
+    return expression, vars, vm
@@ -11,6 +11,12 @@ from __future__ import absolute_import
 import numpy as np
 import bcolz
 from bcolz import utils, attrs, array2string
+from bcolz.carray_ext import META_DIR, SIZES_FILE, STORAGE_FILE, _replace
+from bcolz.groupby import groupby as _groupby
+from bcolz.sorting import sort_ctable as _sort_ctable
+from bcolz.indexes import (
+    INDEXES_DIR, INDEX_KINDS, open_index, parse as _parse_index,
+    match as _match_index, bitmap_mask as _bitmap_mask)
 import itertools
 from collections import namedtuple
 import json
@@ -25,13 +31,24 @@ ROOTDIRS = '__rootdirs__'
 
 
 class cols(object):
-    """Class for accessing the columns on the ctable object."""
+    """Class for accessing the columns on the ctable object.
+
+    For persistent ctables, the columns are opened lazily on first
+    access.  The `ROOTDIRS` manifest keeps the metadata of every column
+    (types, chunklen, cparams, sizes...), so that the ctable can be
+    opened by reading just this file.  The columns are not checked up
+    front: when a column is first opened its own sizes file is read, so
+    that a column modified behind the back of the ctable (e.g. appended
+    to directly) gets its actual sizes.
+    """
 
     def __init__(self, rootdir, mode):
         self.rootdir = rootdir
         self.mode = mode
         self.names = []
         self._cols = {}
+        # (sizes, storage) metadata of the columns that are not opened yet
+        self._meta = {}
 
     def read_meta_and_open(self):
         """Read the meta-information and initialize structures."""
@@ -41,22 +58,89 @@ class cols(object):
             data = json.loads(rfile.read().decode('ascii'))
         # JSON returns unicode, but we want plain bytes for Python 2.x
         self.names = [str(name) for name in data['names']]
-        # Initialize the cols by instantiating the carrays
+        # The columns will be opened when accessed for the first time
+        columns = data.get('columns', {})
         for name in self.names:
-            dir_ = os.path.join(self.rootdir, name)
-            self._cols[name] = bcolz.carray(rootdir=dir_, mode=self.mode)
+            meta = columns.get(name)
+            if meta is not None:
+                self._meta[name] = (meta['sizes'], meta['storage'])
+            else:
+                # Manifest from previous versions: use the column meta
+                self._meta[name] = (self._read_column_meta(name, SIZES_FILE),
+                                    self._read_column_meta(name, STORAGE_FILE))
+
+    def _read_column_meta(self, name, metafile):
+        """Read the `metafile` (sizes or storage) of column `name`."""
+        metadir = os.path.join(self.rootdir, name, META_DIR)
+        with open(os.path.join(metadir, metafile), 'rb') as metafh:
+            return json.loads(metafh.read().decode('ascii'))
+
+    def _open(self, name):
+        """Open the carray (or vlcarray, catcarray) for column `name`."""
+        dir_ = os.path.join(self.rootdir, name)
+        sizes, storage = self._meta.pop(name)
+        if 'vlen' in storage:
+            col = bcolz.vlcarray(rootdir=dir_, mode=self.mode)
+        elif 'categorical' in storage:
+            col = bcolz.catcarray(rootdir=dir_, mode=self.mode)
+        else:
+            # The sizes in the manifest may be stale if the column has been
+            # modified directly, so prefer the ones of the column
+            try:
+                sizes = self._read_column_meta(name, SIZES_FILE)
+            except (IOError, OSError):
+                pass
+            col = bcolz.carray(rootdir=dir_, mode=self.mode,
+                               _meta=(sizes, storage))
+        self._cols[name] = col
+        return col
+
+    def coltype(self, name):
+        """Return the (dtype, shape) of column `name` without opening it."""
+        if name in self._meta:
+            sizes, storage = self._meta[name]
+            return np.dtype(storage['dtype']), tuple(sizes['shape'])
+        col = self._cols[name]
+        return col.dtype, col.shape
+
+    def colsizes(self, name):
+        """Return the (nbytes, cbytes) of column `name` without opening it.
+        """
+        if name in self._meta:
+            sizes = self._meta[name][0]
+            return sizes['nbytes'], sizes['cbytes']
+        col = self._cols[name]
+        return col.nbytes, col.cbytes
+
+    def opened(self):
+        """Return the (name, carray) pairs of the columns already opened."""
+        return [(name, self._cols[name]) for name in self.names
+                if name in self._cols]
 
     def update_meta(self):
         """Update metainfo about directories on-disk."""
-        if not self.rootdir:
+        if not self.rootdir or self.mode == 'r':
             return
-        data = {'names': self.names}
+        columns = {}
+        for name in self.names:
+            if name in self._meta:
+                sizes, storage = self._meta[name]
+            else:
+                col = self._cols[name]
+                sizes, storage = col._sizes_meta(), col._storage_meta()
+            columns[name] = {'sizes': sizes, 'storage': storage}
+        data = {'names': self.names, 'columns': columns}
+        # Write the manifest atomically, so that it is never seen half done
         rootsfile = os.path.join(self.rootdir, ROOTDIRS)
-        with open(rootsfile, 'wb') as rfile:
+        tmpfile = rootsfile + '.tmp'
+        with open(tmpfile, 'wb') as rfile:
             rfile.write(json.dumps(data).encode('ascii'))
             rfile.write(b"\n")
+        _replace(tmpfile, rootsfile)
 
     def __getitem__(self, name):
+        if name in self._meta:
+            return self._open(name)
         return self._cols[name]
 
     def __setitem__(self, name, carray):
@@ -65,7 +149,10 @@ class cols(object):
         self.update_meta()
 
     def __iter__(self):
-        return iter(self._cols)
+        return iter(self.names)
+
+    def __contains__(self, name):
+        return name in self._cols or name in self._meta
 
     def __len__(self):
         return len(self.names)
@@ -79,21 +166,22 @@ class cols(object):
     def pop(self, name):
         """Return the named column and remove it."""
         pos = self.names.index(name)
+        col = self[name]
         name = self.names.pop(pos)
-        col = self._cols.pop(name)
+        del self._cols[name]
         self.update_meta()
         return col
 
     def __str__(self):
         fullrepr = ""
         for name in self.names:
-            fullrepr += "%s : %s" % (name, str(self._cols[name]))
+            fullrepr += "%s : %s" % (name, str(self[name]))
         return fullrepr
 
     def __repr__(self):
         fullrepr = ""
         for name in self.names:
-            fullrepr += "%s : %s\n" % (name, repr(self._cols[name]))
+            fullrepr += "%s : %s\n" % (name, repr(self[name]))
         return fullrepr
 
 
@@ -145,10 +233,10 @@ class ctable(object):
         names, cols = self.names, self.cols
         l = []
         for name in names:
-            col = cols[name]
+            dtype, shape = cols.coltype(name)
             # Need to account for multidimensional columns
-            t = (name, col.dtype) if col.ndim == 1 else \
-                (name, (col.dtype, col.shape[1:]))
+            t = (name, dtype) if len(shape) == 1 else \
+                (name, (dtype, shape[1:]))
             l.append(t)
         return np.dtype(l)
 
@@ -225,6 +313,9 @@ class ctable(object):
         # Cache a structured array of len 1 for ctable[int] acceleration
         self._arr1 = np.empty(shape=(1,), dtype=self.dtype)
 
+        # The indexes are opened on first use
+        self._indexes = None
+
     def create_ctable(self, columns, names, **kwargs):
         """Create a ctable anew."""
 
@@ -254,8 +345,8 @@ class ctable(object):
         # Guess the kind of columns input
         calist, nalist, ratype = False, False, False
         if type(columns) in (tuple, list):
-            calist = [type(v) for v in columns] == \
-                     [bcolz.carray for v in columns]
+            calist = all(type(v) in (bcolz.carray, bcolz.vlcarray,
+                                     bcolz.catcarray) for v in columns)
             nalist = [type(v) for v in columns] == \
                      [np.ndarray for v in columns]
         elif isinstance(columns, np.ndarray):
@@ -272,7 +363,9 @@ class ctable(object):
             if self.rootdir:
                 # Put every carray under each own `name` subdirectory
                 kwargs['rootdir'] = os.path.join(self.rootdir, name)
-            if calist:
+            if calist or (not ratype and
+                           isinstance(columns[i], (bcolz.vlcarray,
+                                                   bcolz.catcarray))):
                 column = columns[i]
                 if self.rootdir:
                     # Store this in destination
@@ -308,8 +401,8 @@ class ctable(object):
         # Open the ctable by reading the metadata
         self.cols.read_meta_and_open()
 
-        # Get the length out of the first column
-        self.len = len(self.cols[self.names[0]])
+        # Get the length out of the first column (without opening it)
+        self.len = self.cols.coltype(self.names[0])[1][0]
 
     def mkdir_rootdir(self, rootdir, mode):
         """Create the `self.rootdir` directory safely."""
@@ -368,7 +461,8 @@ class ctable(object):
                 column = cols[name]
             # Append the values to column
             self.cols[name].append(column)
-            if sclist and not hasattr(column, '__len__'):
+            if sclist and (not hasattr(column, '__len__') or
+                           isinstance(column, _strtypes + (bytes,))):
                 clen2 = 1
             else:
                 clen2 = len(column)
@@ -394,6 +488,9 @@ class ctable(object):
         for name in self.names:
             self.cols[name].trim(nitems)
         self.len -= nitems
+        # The columns have flushed their sizes already
+        self.cols.update_meta()
+        self._check_indexes()
 
     def resize(self, nitems):
         """Resize the instance to have `nitems`.
@@ -410,6 +507,9 @@ class ctable(object):
         for name in self.names:
             self.cols[name].resize(nitems)
         self.len = nitems
+        # The columns have flushed their sizes already
+        self.cols.update_meta()
+        self._check_indexes()
 
     def addcol(self, newcol, name=None, pos=None, move=False, **kwargs):
         """Add a new `newcol` object as column.
@@ -477,11 +577,15 @@ class ctable(object):
                 newcol.rootdir = col_rootdir
             else:  # copy the the carray
                 newcol = newcol.copy(rootdir=col_rootdir)
+        elif isinstance(newcol, (bcolz.vlcarray, bcolz.catcarray)):
+            if self.rootdir is not None:
+                newcol = newcol.copy(rootdir=col_rootdir)
         elif isinstance(newcol, (np.ndarray, bcolz.carray)):
             newcol = bcolz.carray(newcol, **kwargs)
         elif type(newcol) in (list, tuple):
             newcol = bcolz.carray(newcol, **kwargs)
-        elif type(newcol) != bcolz.carray:
+        elif type(newcol) not in (bcolz.carray, bcolz.vlcarray,
+                                  bcolz.catcarray):
             raise ValueError(
                 """`newcol` type not supported""")
 
@@ -534,7 +638,9 @@ class ctable(object):
                 raise ValueError("`pos` must be >= 0 and <= len(self.cols)")
             name = self.names[pos]
 
-        # Remove the column
+        # Remove the column (and its index)
+        if name in self.indexes:
+            self.drop_index(name)
         col = self.cols.pop(name)
 
         if not keep:
@@ -580,13 +686,20 @@ class ctable(object):
         return ccopy
 
     @staticmethod
-    def fromdataframe(df, **kwargs):
+    def fromdataframe(df, strings='fixed', **kwargs):
         """Return a ctable object out of a pandas dataframe.
 
         Parameters
         ----------
         df : DataFrame
             A pandas dataframe.
+        strings : 'fixed' or 'vl'
+            How the columns of the 'object' dtype made of strings are
+            stored.  With 'fixed' (the default) they are converted into
+            fixed-width 'S'tring carrays.  With 'vl' they are converted
+            into vlcarray columns, which do not pad the strings, but
+            cannot be used in `eval()`/`where()` expressions nor be
+            modified.
         kwargs : list of parameters or dictionary
             Any parameter supported by the ctable constructor.
 
@@ -597,8 +710,11 @@ class ctable(object):
 
         Notes
         -----
-        The 'object' dtype will be converted into a 'S'tring type, if possible.
-        This allows for much better storage savings in bcolz.
+        The 'object' dtype will be converted into a 'S'tring type (or a
+        vlcarray, see `strings`), if possible.  This allows for much better
+        storage savings in bcolz.  Columns with missing values (None, NaN)
+        are kept as 'object'.  Categorical columns with string categories
+        are converted into catcarray columns, reusing their codes.
 
         See Also
         --------
@@ -609,6 +725,8 @@ class ctable(object):
             import pandas as pd
         else:
             raise ValueError("you need pandas to use this functionality")
+        if strings not in ('fixed', 'vl'):
+            raise ValueError("`strings` should be 'fixed' or 'vl'")
 
         # Use the names in kwargs, or if not there, the names in dataframe
         if 'names' in kwargs:
@@ -617,33 +735,49 @@ class ctable(object):
             names = list(df.columns.values)
 
         # Build the list of columns as in-memory numpy arrays and carrays
-        # (when doing the conversion object -> string)
+        # or vlcarrays (when doing the conversion object -> string)
         cols = []
         # Remove a possible rootdir argument to prevent copies going to disk
         ckwargs = kwargs.copy()
         if 'rootdir' in ckwargs:
             del ckwargs['rootdir']
+        vkwargs = dict((key, val) for key, val in ckwargs.items()
+                       if key in ('cparams', 'chunklen', 'expectedlen'))
+        try:
+            infer_dtype = pd.api.types.infer_dtype
+        except AttributeError:
+            infer_dtype = pd.lib.infer_dtype
         for key in names:
             vals = df[key].values  # just a view as a numpy array
-            if vals.dtype == np.object:
-                inferred_type = pd.lib.infer_dtype(vals)
-                # Next code could be made to work if
-                # pd.lib.max_len_string_array(vals) below would work
-                # with unicode in Python 2
-                # if inferred_type == 'unicode':
-                #     maxitemsize = pd.lib.max_len_string_array(vals)
-                #     print "maxitemsize:", maxitesize
-                #     # Convert the view into a carray of Unicode strings
-                #     col = bcolz.carray(vals,
-                #                        dtype='U%d' % maxitemsize, **ckwargs)
-                # elif inferred_type == 'string':
-                if inferred_type == 'string':
-                    maxitemsize = pd.lib.max_len_string_array(vals)
-                    # Convert the view into a carray of regular strings
-                    col = bcolz.carray(vals, dtype='S%d' %
-                                       maxitemsize, **ckwargs)
+            if hasattr(vals, 'categories') and hasattr(vals, 'codes'):
+                # A pandas.Categorical
+                categories = list(vals.categories)
+                if infer_dtype(categories) in ('string', 'unicode',
+                                               'bytes'):
+                    cols.append(bcolz.catcarray.fromcodes(
+                        vals.codes, categories, **vkwargs))
                 else:
-                    col = vals
+                    cols.append(np.asarray(vals))
+            elif vals.dtype == np.object:
+                inferred_type = infer_dtype(vals)
+                col = vals
+                # Missing values (None, NaN) cannot be kept as strings,
+                # so the columns having them are kept as object carrays
+                if (inferred_type not in ('string', 'unicode', 'bytes') or
+                        pd.isnull(vals).any()):
+                    pass
+                elif strings == 'vl':
+                    # Convert the view into a vlcarray of strings
+                    col = bcolz.vlcarray(vals, **vkwargs)
+                elif inferred_type == 'string':
+                    maxitemsize = max(len(val) for val in vals)
+                    # Convert the view into a carray of regular strings
+                    # (non-ASCII unicode strings are kept as objects)
+                    try:
+                        col = bcolz.carray(vals, dtype='S%d' %
+                                           maxitemsize, **ckwargs)
+                    except ValueError:
+                        pass
                 cols.append(col)
             else:
                 cols.append(vals)
@@ -735,10 +869,18 @@ class ctable(object):
         else:
             raise ValueError("you need pandas to use this functionality")
 
+        def values(key):
+            col = self.cols[key]
+            if isinstance(col, bcolz.catcarray):
+                # Reuse the codes, without decoding them
+                return pd.Categorical.from_codes(col.codes[:],
+                                                 col.categories)
+            return col[:]
+
         # Use a generator here to minimize the number of column copies
         # existing simultaneously in-memory
         df = pd.DataFrame.from_items(
-            ((key, self[key][:]) for key in self.names),
+            ((key, values(key)) for key in self.names),
             columns=columns, orient=orient)
         return df
 
@@ -796,7 +938,8 @@ class ctable(object):
     def __sizeof__(self):
         return self.cbytes
 
-    def where(self, expression, outcols=None, limit=None, skip=0):
+    def where(self, expression, outcols=None, limit=None, skip=0,
+              as_array=False):
         """Iterate over rows where `expression` is true.
 
         Parameters
@@ -814,45 +957,50 @@ class ctable(object):
             everything.
         skip : int
             An initial number of elements to skip.  The default is 0.
+        as_array : bool
+            If true, the rows are returned in a NumPy structured array
+            instead, which is gathered a block at a time without building
+            a Python object per row.
 
         Returns
         -------
-        out : iterable
+        out : iterable or NumPy structured array
             This iterable returns rows as NumPy structured types (i.e. they
             support being mapped either by position or by name).
 
         See Also
         --------
-        iter
+        iter, whereblocks
 
         """
 
-        # Check input
-        if type(expression) is str:
-            # That must be an expression
-            boolarr = self.eval(expression)
-        elif hasattr(expression, "dtype") and expression.dtype.kind == 'b':
-            boolarr = expression
-        else:
-            raise ValueError(
-                "only boolean expressions or arrays are supported")
+        positions, boolarr = self._where_selection(expression)
+        outcols = self._where_outcols(outcols)
 
-        # Check outcols
-        if outcols is None:
-            outcols = self.names
-        else:
-            if type(outcols) not in (list, tuple, str):
-                raise ValueError("only list/str is supported for outcols")
-            # Check name validity
-            nt = namedtuple('_nt', outcols, verbose=False)
-            outcols = list(nt._fields)
-            if set(outcols) - set(self.names+['nrow__']) != set():
-                raise ValueError("not all outcols are real column names")
+        if as_array:
+            dtype = self._where_dtype(outcols)
+            blocks = list(self._iterwhere(
+                positions, boolarr, outcols, self._where_blen(), limit, skip))
+            if not blocks:
+                return np.empty(0, dtype=dtype)
+            return np.concatenate(blocks)
+
+        if positions is not None:
+            stop = None if limit is None else skip + limit
+            positions = positions[skip:stop]
 
         # Get iterators for selected columns
         icols, dtypes = [], []
         for name in outcols:
-            if name == "nrow__":
+            if positions is not None:
+                if name == "nrow__":
+                    icols.append(iter(positions))
+                    dtypes.append((name, np.int_))
+                else:
+                    col = self.cols[name]
+                    icols.append(iter(col[positions]))
+                    dtypes.append((name, col.dtype))
+            elif name == "nrow__":
                 icols.append(boolarr.wheretrue(limit=limit, skip=skip))
                 dtypes.append((name, np.int_))
             else:
@@ -862,6 +1010,108 @@ class ctable(object):
         dtype = np.dtype(dtypes)
         return self._iter(icols, dtype)
 
+    def _where_selection(self, expression):
+        """Return the (positions, boolarr) selection for `expression`.
+
+        One of them is None: `positions` are the selected rows when the
+        indexes can resolve `expression`, and `boolarr` is a boolean
+        carray or array otherwise.
+        """
+        positions = boolarr = None
+        if type(expression) is str:
+            # That must be an expression; try to resolve it with indexes
+            positions = self._index_positions(expression)
+            if positions is None:
+                boolarr = self._index_mask(expression)
+                if boolarr is None:
+                    # Variables are looked up in the caller of `where()`
+                    # or `whereblocks()`
+                    boolarr = self.eval(expression, depth=5)
+        elif hasattr(expression, "dtype") and expression.dtype.kind == 'b':
+            boolarr = expression
+        else:
+            raise ValueError(
+                "only boolean expressions or arrays are supported")
+        return positions, boolarr
+
+    def _where_outcols(self, outcols):
+        """Check the `outcols` for a query and return them as a list."""
+        if outcols is None:
+            return self.names
+        if type(outcols) not in (list, tuple, str):
+            raise ValueError("only list/str is supported for outcols")
+        # Check name validity
+        nt = namedtuple('_nt', outcols, verbose=False)
+        outcols = list(nt._fields)
+        if set(outcols) - set(self.names+['nrow__']) != set():
+            raise ValueError("not all outcols are real column names")
+        return outcols
+
+    def _where_dtype(self, outcols):
+        """The dtype of the rows with the `outcols` of a query."""
+        dtype = self.dtype
+        return np.dtype([(name, np.int_) if name == "nrow__"
+                         else (name, dtype[name]) for name in outcols])
+
+    def _where_blen(self):
+        """The default length of the blocks for queries."""
+        return min(self.cols[name].chunklen for name in self.names)
+
+    def _iterwhere(self, positions, boolarr, outcols, blen, limit, skip):
+        """Yield the `outcols` of the rows selected by `positions` or
+        `boolarr` as structured arrays, gathering them from blocks of
+        `blen` rows at a time.
+
+        The values are selected with NumPy boolean (or integer) indexing
+        on every block, and blocks of `boolarr` without true values are
+        skipped.
+        """
+        dtype = self._where_dtype(outcols)
+        cols = dict((name, self.cols[name]) for name in outcols
+                    if name != "nrow__")
+
+        if positions is not None:
+            stop = None if limit is None else skip + limit
+            positions = positions[skip:stop]
+            for i in xrange(0, len(positions), blen):
+                rows = positions[i:i + blen]
+                block = np.empty(len(rows), dtype=dtype)
+                for name in outcols:
+                    if name == "nrow__":
+                        block[name] = rows
+                    else:
+                        block[name] = cols[name][rows]
+                yield block
+            return
+
+        for start in xrange(0, self.len, blen):
+            if limit is not None and limit <= 0:
+                break
+            stop = min(start + blen, self.len)
+            mask = boolarr[start:stop]
+            nselected = np.count_nonzero(mask)
+            if nselected <= skip:
+                skip -= nselected
+                continue
+            if skip > 0 or (limit is not None and nselected - skip > limit):
+                # Select only the rows between `skip` and `limit`
+                climit = None if limit is None else skip + limit
+                mask = np.flatnonzero(mask)[skip:climit]
+                nselected = len(mask)
+                skip = 0
+            if limit is not None:
+                limit -= nselected
+            block = np.empty(nselected, dtype=dtype)
+            for name in outcols:
+                if name == "nrow__":
+                    if mask.dtype.kind == 'b':
+                        block[name] = np.flatnonzero(mask) + start
+                    else:
+                        block[name] = mask + start
+                else:
+                    block[name] = cols[name][start:stop][mask]
+            yield block
+
     def whereblocks(self, expression, blen=None, outfields=None, limit=None,
                     skip=0):
         """Iterate over the rows that fullfill the `expression` condition on
@@ -878,7 +1128,8 @@ class ctable(object):
         outfields : list of strings or string
             The list of column names that you want to get back in results.
             Alternatively, it can be specified as a string such as 'f0 f1' or
-            'f0, f1'.
+            'f0, f1'.  If the special name 'nrow__' is present, the number
+            of row will be included in output.
         limit : int
             A maximum number of elements to return.  The default is return
             everything.
@@ -900,35 +1151,39 @@ class ctable(object):
 
         if blen is None:
             # Get the minimum chunklen for every field
-            blen = min(self[col].chunklen for col in self.cols)
-        if outfields is None:
-            dtype = self.dtype
-        else:
+            blen = self._where_blen()
+        if outfields is not None:
             if not isinstance(outfields, (list, tuple)):
                 raise ValueError("only a sequence is supported for outfields")
-            # Get the dtype for the outfields set
-            try:
-                dtype = [(name, self[name].dtype) for name in outfields]
-            except IndexError:
+            if set(outfields) - set(self.names + ['nrow__']):
                 raise ValueError(
                     "Some names in `outfields` are not real fields")
-
-        buf = np.empty(blen, dtype=dtype)
-        nrow = 0
-        for row in self.where(expression, outfields, limit, skip):
-            buf[nrow] = row
-            nrow += 1
-            if nrow == blen:
-                yield buf
-                buf = np.empty(blen, dtype=dtype)
-                nrow = 0
-        yield buf[:nrow]
+        positions, boolarr = self._where_selection(expression)
+        outfields = self._where_outcols(outfields)
+
+        # Regroup the selected rows in blocks of `blen` rows
+        pending, npending = [], 0
+        for block in self._iterwhere(
+                positions, boolarr, outfields, blen, limit, skip):
+            pending.append(block)
+            npending += len(block)
+            if npending < blen:
+                continue
+            buf = np.concatenate(pending)
+            nfull = len(buf) - len(buf) % blen
+            for i in xrange(0, nfull, blen):
+                yield buf[i:i + blen]
+            pending, npending = [buf[nfull:]], len(buf) - nfull
+        if pending:
+            yield np.concatenate(pending)
+        else:
+            yield np.empty(0, dtype=self._where_dtype(outfields))
 
     def __iter__(self):
         return self.iter(0, self.len, 1)
 
     def iter(self, start=0, stop=None, step=1, outcols=None,
-             limit=None, skip=0):
+             limit=None, skip=0, prefetch=0):
         """Iterator with `start`, `stop` and `step` bounds.
 
         Parameters
@@ -951,6 +1206,9 @@ class ctable(object):
             everything.
         skip : int
             An initial number of elements to skip.  The default is 0.
+        prefetch : int
+            The number of chunks per column to be read in advance by
+            background threads.  The default is 0 (no prefetching).
 
         Returns
         -------
@@ -991,7 +1249,8 @@ class ctable(object):
             else:
                 col = self.cols[name]
                 icols.append(
-                    col.iter(start, stop, step, limit=limit, skip=skip))
+                    col.iter(start, stop, step, limit=limit, skip=skip,
+                             prefetch=prefetch))
                 dtypes.append((name, col.dtype))
         dtype = np.dtype(dtypes)
         return self._iter(icols, dtype)
@@ -1019,6 +1278,15 @@ class ctable(object):
 
         return result
 
+    def _take(self, positions):
+        """Return the rows in the `positions` array as a structured array.
+        """
+
+        ra = np.empty(len(positions), dtype=self.dtype)
+        for name in self.names:
+            ra[name] = self.cols[name][positions]
+        return ra
+
     def __getitem__(self, key):
         """Returns values based on `key`.
 
@@ -1080,14 +1348,21 @@ class ctable(object):
                 return self._where(key)
             elif np.issubsctype(key, np.int_):
                 # An integer array
-                return np.array([self[i] for i in key], dtype=self.dtype)
+                return self._take(key)
             else:
                 raise IndexError(
                     "arrays used as indices must be integer (or boolean)")
         # Column name or expression
         elif isinstance(key, _strtypes):
             if key not in self.names:
-                # key is not a column name, try to evaluate
+                # key is not a column name, try with the indexes first
+                positions = self._index_positions(key)
+                if positions is not None:
+                    return self._take(positions)
+                arr = self._index_mask(key)
+                if arr is not None:
+                    return self._where(arr)
+                # ...or evaluate it
                 arr = self.eval(key, depth=4)
                 if arr.dtype.type != np.bool_:
                     raise IndexError(
@@ -1149,10 +1424,14 @@ class ctable(object):
                     for name in self.names:
                         self.cols[name][nrow] = value[name][rowval]
                     rowval += 1
+            for index in self.indexes.values():
+                index.mark_stale()
             return
         # Then, modify the rows
         for name in self.names:
             self.cols[name][key] = value[name]
+        for index in self.indexes.values():
+            index.mark_stale()
         return
 
     def eval(self, expression, **kwargs):
@@ -1195,8 +1474,465 @@ class ctable(object):
         you risk losing part of your modifications.
 
         """
-        for name in self.names:
-            self.cols[name].flush()
+        # Columns that have not been opened do not need a flush
+        for name, col in self.cols.opened():
+            col.flush()
+        self.cols.update_meta()
+
+    def chunk_stats(self, name):
+        """
+        chunk_stats(name)
+
+        Return the statistics of the values in every chunk of column `name`.
+
+        See Also
+        --------
+        carray.chunk_stats
+
+        """
+        return self.cols[name].chunk_stats()
+
+    def _reduce(self, method, outcols, **kwargs):
+        """Apply the `method` reduction to the `outcols` columns."""
+        if outcols is None:
+            outcols = self.names
+        else:
+            if type(outcols) not in (list, tuple, str):
+                raise ValueError("only list/str is supported for outcols")
+            # Check name validity
+            nt = namedtuple('_nt', outcols, verbose=False)
+            outcols = list(nt._fields)
+            if set(outcols) - set(self.names) != set():
+                raise ValueError("not all outcols are real column names")
+        results = []
+        for name in outcols:
+            col = self.cols[name]
+            if not hasattr(col, method):
+                raise TypeError(
+                    "column '%s' does not support %s()" % (name, method))
+            results.append(getattr(col, method)(**kwargs))
+        dtype = np.dtype([(name, np.asarray(result).dtype)
+                          for name, result in zip(outcols, results)])
+        return np.array(tuple(results), dtype=dtype)[()]
+
+    def sum(self, outcols=None):
+        """
+        sum(outcols=None)
+
+        Return the sum of the values in every column.
+
+        Parameters
+        ----------
+        outcols : list of strings or string
+            The list of column names to reduce.  Alternatively, it can be
+            specified as a string such as 'f0 f1' or 'f0, f1'.  If None,
+            all the columns are reduced.
+
+        Returns
+        -------
+        out : NumPy structured scalar
+            A row with a field per column.
+
+        See Also
+        --------
+        carray.sum
+
+        """
+        return self._reduce('sum', outcols)
+
+    def min(self, outcols=None):
+        """
+        min(outcols=None)
+
+        Return the minimum of the values in every column.
+
+        See `sum()` for the parameters and the result.
+
+        See Also
+        --------
+        carray.min
+
+        """
+        return self._reduce('min', outcols)
+
+    def max(self, outcols=None):
+        """
+        max(outcols=None)
+
+        Return the maximum of the values in every column.
+
+        See `sum()` for the parameters and the result.
+
+        See Also
+        --------
+        carray.max
+
+        """
+        return self._reduce('max', outcols)
+
+    def argmin(self, outcols=None):
+        """
+        argmin(outcols=None)
+
+        Return the row of the (first) minimum value in every column.
+
+        See `sum()` for the parameters and the result.
+
+        See Also
+        --------
+        carray.argmin
+
+        """
+        return self._reduce('argmin', outcols)
+
+    def argmax(self, outcols=None):
+        """
+        argmax(outcols=None)
+
+        Return the row of the (first) maximum value in every column.
+
+        See `sum()` for the parameters and the result.
+
+        See Also
+        --------
+        carray.argmax
+
+        """
+        return self._reduce('argmax', outcols)
+
+    def mean(self, outcols=None, dtype=None):
+        """
+        mean(outcols=None, dtype=None)
+
+        Return the mean of the values in every column.
+
+        See `sum()` for the parameters and the result, and `carray.mean()`
+        for `dtype`.
+
+        See Also
+        --------
+        carray.mean
+
+        """
+        return self._reduce('mean', outcols, dtype=dtype)
+
+    def var(self, outcols=None, dtype=None, ddof=0):
+        """
+        var(outcols=None, dtype=None, ddof=0)
+
+        Return the variance of the values in every column.
+
+        See `sum()` for the parameters and the result, and `carray.var()`
+        for `dtype` and `ddof`.
+
+        See Also
+        --------
+        carray.var
+
+        """
+        return self._reduce('var', outcols, dtype=dtype, ddof=ddof)
+
+    def std(self, outcols=None, dtype=None, ddof=0):
+        """
+        std(outcols=None, dtype=None, ddof=0)
+
+        Return the standard deviation of the values in every column.
+
+        See `sum()` for the parameters and the result, and `carray.var()`
+        for `dtype` and `ddof`.
+
+        See Also
+        --------
+        carray.std
+
+        """
+        return self._reduce('std', outcols, dtype=dtype, ddof=ddof)
+
+    def any(self, outcols=None):
+        """
+        any(outcols=None)
+
+        Return whether any value is non-zero in every column.
+
+        See `sum()` for the parameters and the result.
+
+        See Also
+        --------
+        carray.any
+
+        """
+        return self._reduce('any', outcols)
+
+    def all(self, outcols=None):
+        """
+        all(outcols=None)
+
+        Return whether all the values are non-zero in every column.
+
+        See `sum()` for the parameters and the result.
+
+        See Also
+        --------
+        carray.all
+
+        """
+        return self._reduce('all', outcols)
+
+    def count_nonzero(self, outcols=None):
+        """
+        count_nonzero(outcols=None)
+
+        Return the number of non-zero values in every column.
+
+        See `sum()` for the parameters and the result.
+
+        See Also
+        --------
+        carray.count_nonzero
+
+        """
+        return self._reduce('count_nonzero', outcols)
+
+    def groupby(self, keys, aggs, blen=None, **kwargs):
+        """
+        groupby(keys, aggs, blen=None, **kwargs)
+
+        Group the rows by the values in the `keys` columns and aggregate
+        other columns for every group.
+
+        The table is read in blocks and every block is reduced into
+        partial aggregates per group, which are merged as they
+        accumulate.  When the partial aggregates take more memory than
+        `bcolz.defaults.groupby_memsize`, they are hash-partitioned by
+        key and spilled to a temporary directory on disk, and every
+        partition is merged separately at the end (in blocks, and being
+        partitioned again if it is still too large).  So, the number of
+        groups is not limited by the available memory.
+
+        Parameters
+        ----------
+        keys : list of strings or string
+            The names of the columns to group by.  Alternatively, it can
+            be specified as a string such as 'f0 f1' or 'f0, f1'.  Rows
+            with a null key (NaN, NaT or a missing category) are skipped.
+        aggs : list of tuples
+            The aggregations, as (column, op) or (column, op, outname)
+            tuples.  `op` can be 'sum', 'count', 'min', 'max' or 'mean'
+            and the default `outname` is 'column_op'.  Like in pandas,
+            NaN and NaT values are not taken into account.
+        blen : int
+            The length of the blocks to read.  If not specified, the
+            minimum chunklen of the columns involved is used.
+        kwargs : list of parameters or dictionary
+            Any parameter supported by the ctable constructor, like
+            `rootdir` for storing the result on disk.
+
+        Returns
+        -------
+        out : a ctable object
+            A ctable with a row per group, with the `keys` columns
+            followed by the aggregated ones.  The rows are sorted by key
+            (categorical keys in the order of their categories), except
+            if the partial aggregates have been spilled to disk: then
+            they are sorted only within every partition.
+
+        See Also
+        --------
+        sum, min, max, mean
+
+        """
+        return _groupby(self, keys, aggs, blen=blen, **kwargs)
+
+    def sort_by(self, keys, **kwargs):
+        """
+        sort_by(keys, **kwargs)
+
+        Return a copy of this ctable with the rows sorted by `keys`.
+
+        The rows are sorted in runs of `bcolz.defaults.sort_memsize`
+        bytes at most, which are kept in a temporary directory and
+        merged afterwards, so this works for ctables that do not fit in
+        memory.  The sort is stable.
+
+        Parameters
+        ----------
+        keys : list of strings or string
+            The names of the columns to sort by, the first one being the
+            most significant.  Alternatively, it can be specified as a
+            string such as 'f0 f1' or 'f0, f1'.  As in NumPy, NaN values
+            are sorted to the end.  Categorical columns are sorted by
+            their codes, i.e. in the order of their categories.
+        kwargs : list of parameters or dictionary
+            Any parameter supported by the ctable constructor, like
+            `rootdir` for storing the result on disk.
+
+        Returns
+        -------
+        out : a ctable object
+            The sorted ctable.
+
+        See Also
+        --------
+        carray.sort, carray.argsort
+
+        """
+        return _sort_ctable(self, keys, **kwargs)
+
+    @property
+    def indexes(self):
+        "The indexes of the columns (a dictionary keyed by column name)."
+        if self._indexes is None:
+            self._indexes = {}
+            indexdir = None
+            if self.rootdir is not None:
+                indexdir = os.path.join(self.rootdir, INDEXES_DIR)
+            if indexdir is not None and os.path.isdir(indexdir):
+                for name in os.listdir(indexdir):
+                    if name in self.names:
+                        self._indexes[name] = open_index(
+                            os.path.join(indexdir, name), self.mode)
+        return self._indexes
+
+    def create_index(self, name, kind='sorted'):
+        """
+        create_index(name, kind='sorted')
+
+        Create an index for the column `name` to speed up queries.
+
+        Queries via `where()` (and hence `whereblocks()`) and
+        `__getitem__()` with expressions made of comparisons (==, <, <=,
+        >, >=) between the indexed columns and literals, possibly and-ed
+        (&) with other conditions, look up the matching rows in the
+        indexes instead of evaluating the expression on every row.
+        Expressions combining comparisons on columns with bitmap indexes
+        via &, | and ~ are resolved with the bitmaps alone.  An existing
+        index for the column is rebuilt.
+
+        The rows appended after creating the index are scanned at query
+        time.  Modifying the table via `__setitem__()` (or shrinking it)
+        leaves the indexes stale, and then they are not used until they
+        are created again.  Changes made directly on the columns are not
+        tracked, so the index should be re-created after them.
+
+        Parameters
+        ----------
+        name : str
+            The name of the column to index.
+        kind : str
+            The kind of index.  'sorted' keeps the values of the column
+            in sorted order along with their row positions, which suits
+            both point and range queries.  'bitmap' keeps a compressed
+            boolean carray for every distinct value of the column, which
+            suits columns with few distinct values (a ValueError is
+            raised if there are more than 1000).
+
+        Returns
+        -------
+        out : index object
+            The new index, which is stored in the `__indexes__`
+            directory of persistent ctables.
+
+        See Also
+        --------
+        drop_index, indexes
+
+        """
+        if name not in self.names:
+            raise ValueError("column '%s' not found" % name)
+        if kind not in INDEX_KINDS:
+            raise ValueError("index kind '%s' not supported; choose one of "
+                             "%s" % (kind, sorted(INDEX_KINDS)))
+        col = self.cols[name]
+        if (type(col) is not bcolz.carray or len(col.shape) > 1 or
+                col.dtype.kind not in 'biufSUmM'):
+            raise TypeError("column '%s' (dtype '%s') cannot be indexed" %
+                            (name, col.dtype))
+        if name in self.indexes:
+            self.drop_index(name)
+        rootdir = None
+        if self.rootdir is not None:
+            rootdir = os.path.join(self.rootdir, INDEXES_DIR, name)
+        index = INDEX_KINDS[kind](col, rootdir=rootdir)
+        self.indexes[name] = index
+        return index
+
+    def drop_index(self, name):
+        """
+        drop_index(name)
+
+        Remove the index of the column `name`.
+
+        See Also
+        --------
+        create_index
+
+        """
+        if name not in self.indexes:
+            raise ValueError("column '%s' is not indexed" % name)
+        self.indexes.pop(name).purge()
+
+    def _check_indexes(self):
+        """Mark as stale the indexes covering rows that have been removed."""
+        for index in self.indexes.values():
+            if index.nrows > self.len:
+                index.mark_stale()
+
+    def _index_positions(self, expression):
+        """Return the rows where `expression` is true, in order, or None if
+        the indexes cannot resolve it."""
+        indexes = dict((name, index) for name, index in self.indexes.items()
+                       if not index.stale)
+        if not indexes:
+            return None
+        comparisons, exact, names = _parse_index(expression)
+        if not names.issubset(self.names):
+            # Variables from the user frame are not supported
+            return None
+        # Group the conditions on every indexed column
+        conditions = {}
+        for name, op, value in comparisons:
+            conditions.setdefault(name, []).append((op, value))
+        positions, unused = None, {}
+        for name, conds in conditions.items():
+            rows = None
+            if name in indexes:
+                rows = indexes[name].query(self.cols[name], conds)
+            if rows is None:
+                unused[name] = conds
+            elif positions is None:
+                positions = rows
+            else:
+                positions = np.intersect1d(positions, rows, assume_unique=True)
+        if positions is None:
+            return None
+        if not exact:
+            unused = dict((name, None) for name in names)
+        if any(type(self.cols[name]) is not bcolz.carray for name in unused):
+            return None
+        if len(positions) > 0 and unused:
+            arrays = dict((name, self.cols[name][positions])
+                          for name in unused)
+            if exact:
+                # Check the remaining comparisons on the candidate rows
+                mask = np.ones(len(positions), dtype=np.bool_)
+                for name, conds in unused.items():
+                    mask &= _match_index(arrays[name], conds)
+            else:
+                # Evaluate the whole expression on the candidate rows
+                mask = bcolz.eval(expression, user_dict=arrays,
+                                  out_flavor='numpy')
+            positions = positions[mask]
+        return positions
+
+    def _index_mask(self, expression):
+        """Return a boolean carray with the rows where `expression` is
+        true, or None if the bitmap indexes cannot resolve it."""
+        bitmaps = dict((name, (index, self.cols[name]))
+                       for name, index in self.indexes.items()
+                       if index.kind == 'bitmap' and not index.stale)
+        if not bitmaps:
+            return None
+        return _bitmap_mask(expression, bitmaps, self.len)
 
     def free_cachemem(self):
         """Get rid of internal caches to free memory.
@@ -1206,8 +1942,8 @@ class ctable(object):
         cache data blocks/chunks.
 
         """
-        for name in self.names:
-            self.cols[name].free_cachemem()
+        for name, col in self.cols.opened():
+            col.free_cachemem()
 
     def _get_stats(self):
         """Get some stats (nbytes, cbytes and ratio) about this object.
@@ -1224,9 +1960,9 @@ class ctable(object):
         nbytes, cbytes = 0, 0
         names, cols = self.names, self.cols
         for name in names:
-            column = cols[name]
-            nbytes += column.nbytes
-            cbytes += column.cbytes
+            cnbytes, ccbytes = cols.colsizes(name)
+            nbytes += cnbytes
+            cbytes += ccbytes
         cratio = nbytes / float(cbytes)
         return (nbytes, cbytes, cratio)
 
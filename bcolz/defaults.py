@@ -12,6 +12,7 @@
 from __future__ import absolute_import
 
 import bcolz
+from bcolz.py2help import _inttypes
 
 
 class Defaults(object):
@@ -70,6 +71,56 @@ class Defaults(object):
         self.check_choices('eval_out_flavor', value)
         self.__eval_out_flavor = value
 
+    @property
+    def mmap(self):
+        return self.__mmap
+
+    @mmap.setter
+    def mmap(self, value):
+        if not isinstance(value, bool):
+            raise ValueError("`mmap` must be a boolean")
+        self.__mmap = value
+
+    @property
+    def chunk_cache_size(self):
+        return self.__chunk_cache_size
+
+    @chunk_cache_size.setter
+    def chunk_cache_size(self, value):
+        if not isinstance(value, _inttypes) or value < 0:
+            raise ValueError("`chunk_cache_size` must be a non-negative int")
+        self.__chunk_cache_size = value
+
+    @property
+    def block_cache_size(self):
+        return self.__block_cache_size
+
+    @block_cache_size.setter
+    def block_cache_size(self, value):
+        if not isinstance(value, _inttypes) or value < 0:
+            raise ValueError("`block_cache_size` must be a non-negative int")
+        self.__block_cache_size = value
+
+    @property
+    def groupby_memsize(self):
+        return self.__groupby_memsize
+
+    @groupby_memsize.setter
+    def groupby_memsize(self, value):
+        if not isinstance(value, _inttypes) or value < 1:
+            raise ValueError("`groupby_memsize` must be a positive int")
+        self.__groupby_memsize = value
+
+    @property
+    def sort_memsize(self):
+        return self.__sort_memsize
+
+    @sort_memsize.setter
+    def sort_memsize(self, value):
+        if not isinstance(value, _inttypes) or value < 1:
+            raise ValueError("`sort_memsize` must be a positive int")
+        self.__sort_memsize = value
+
     @property
     def cparams(self):
         return self.__cparams
@@ -102,3 +153,43 @@ defaults.cparams = {'clevel': 5, 'shuffle': True, 'cname': 'blosclz'}
 The defaults for parameters used in compression.  You can change
 them more comfortably by using the `cparams.setdefaults()` method.
 """
+
+defaults.mmap = False
+"""
+Whether the chunks of persistent carrays are read through memory maps
+(so that the compressed data is not copied and the page cache is
+shared between processes) or not.  Only carrays with the 'segments'
+layout are mapped.  The value is taken into account when the carrays
+are opened.  Default is False.
+"""
+
+defaults.chunk_cache_size = 64 * 2 ** 20
+"""
+The maximum amount of compressed bytes that are kept in the chunk cache
+shared by persistent carrays.  The most recently used chunks are kept.
+Default is 64 MB.
+"""
+
+defaults.block_cache_size = 2 ** 20
+"""
+The maximum amount of memory that every carray uses for caching the
+decompressed blocks used for retrieving single items.  It is taken into
+account when the carray is created or opened.  Default is 1 MB.
+"""
+
+defaults.groupby_memsize = 64 * 2**20
+"""
+The maximum amount of memory that `ctable.groupby()` uses for keeping
+the partial aggregates of the groups.  Beyond it, the partial aggregates
+are hash-partitioned into a temporary directory on disk, and the
+partitions that are still too large are partitioned again.  Default is
+64 MB.
+"""
+
+defaults.sort_memsize = 64 * 2**20
+"""
+The maximum amount of memory for the rows being sorted or merged in
+`carray.sort()`, `carray.argsort()` and `ctable.sort_by()`.  Larger
+objects are sorted in runs that are merged from a temporary directory
+on disk.  Default is 64 MB.
+"""
@@ -26,6 +26,7 @@ cdef extern from "string.h":
     char *strdup(char *s)
     void *memcpy(void *dest, void *src, size_t n)
     void *memset(void *s, int c, size_t n)
+    int memcmp(void *s1, void *s2, size_t n)
 
 cdef extern from "time.h":
     ctypedef int time_t
@@ -0,0 +1,381 @@
+########################################################################
+#
+#       License: BSD
+#       Created: October 18, 2026
+#
+########################################################################
+
+"""Out-of-core grouping and aggregation of ctable columns.
+"""
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import bcolz
+from bcolz.py2help import xrange, _strtypes
+
+
+# The supported aggregations
+AGGREGATIONS = ('sum', 'count', 'min', 'max', 'mean')
+
+# The number of partitions for the partial aggregates spilled to disk
+SPILL_NPARTS = 16
+# The maximum number of times that a partition is re-partitioned
+SPILL_MAXLEVEL = 8
+
+# The multiplier for mixing the hashes of the keys (golden ratio)
+_HASH_MULT = np.uint64(0x9E3779B97F4A7C15)
+
+# The replacement of NaT when looking for the minimum of datetimes
+_NAT_MIN = np.iinfo(np.int64).max
+
+
+def _read(col, start, stop):
+    """Read the values of `col` in [start, stop) (codes for catcarrays)."""
+    if isinstance(col, bcolz.catcarray):
+        return col.codes[start:stop]
+    return col[start:stop]
+
+
+def _isnull(col, values):
+    """Return a mask for the null values of `col`, or None if there are
+    not any."""
+    if isinstance(col, bcolz.catcarray):
+        return values < 0
+    kind = values.dtype.kind
+    if kind in 'fc':
+        return np.isnan(values)
+    elif kind in 'mM':
+        return values.view(np.int64) == np.iinfo(np.int64).min
+    return None
+
+
+class _aggregator(object):
+    """Compute the (partial) aggregates of the rows of a ctable.
+
+    The partial aggregates are kept in structured arrays of 'states',
+    with fields 'k0', 'k1'... for the keys and 'a0', 'a1'... (plus 'n0',
+    'n1'... for the counts of means) for the aggregations.
+    """
+
+    def __init__(self, table, keys, aggs):
+        if isinstance(keys, _strtypes):
+            keys = keys.replace(',', ' ').split()
+        keys = list(keys)
+        if len(keys) == 0:
+            raise ValueError("`keys` cannot be empty")
+        for name in keys:
+            self._check_column(table, name)
+        self.keys = keys
+        self.keycols = [table[name] for name in keys]
+
+        fields = []
+        for i, col in enumerate(self.keycols):
+            if isinstance(col, bcolz.catcarray):
+                fields.append(('k%d' % i, col.codes.dtype))
+            else:
+                fields.append(('k%d' % i, col.dtype))
+        self.aggs, self.outdtypes, self.reducers = [], [], []
+        for i, agg in enumerate(aggs):
+            if isinstance(agg, _strtypes) or len(agg) not in (2, 3):
+                raise ValueError(
+                    "`aggs` items must be (column, op[, outname]) tuples")
+            name, op = agg[:2]
+            outname = agg[2] if len(agg) == 3 else "%s_%s" % (name, op)
+            self._check_column(table, name)
+            if op not in AGGREGATIONS:
+                raise ValueError(
+                    "aggregation '%s' not supported; choose one of %s" %
+                    (op, AGGREGATIONS))
+            col = table[name]
+            dtype = col.dtype
+            if op != 'count':
+                kinds = 'biufc' if op in ('sum', 'mean') else 'biufmM'
+                if (isinstance(col, (bcolz.vlcarray, bcolz.catcarray)) or
+                        dtype.kind not in kinds):
+                    raise TypeError(
+                        "cannot compute the %s of column '%s' (dtype '%s')"
+                        % (op, name, dtype))
+            fname = 'a%d' % i
+            if op == 'count':
+                fields.append((fname, np.int64))
+                outdtype = np.dtype(np.int64)
+                self.reducers.append((fname, np.add))
+            elif op == 'sum':
+                outdtype = np.zeros(1, dtype=dtype).sum().dtype
+                fields.append((fname, outdtype))
+                self.reducers.append((fname, np.add))
+            elif op == 'mean':
+                outdtype = np.dtype(
+                    np.complex128 if dtype.kind == 'c' else np.float64)
+                fields.append((fname, outdtype))
+                fields.append(('n%d' % i, np.int64))
+                self.reducers.append((fname, np.add))
+                self.reducers.append(('n%d' % i, np.add))
+            else:
+                outdtype = dtype
+                if dtype.kind in 'mM':
+                    # Reduce datetimes as integers so as to skip NaT
+                    fields.append((fname, np.int64))
+                else:
+                    fields.append((fname, dtype))
+                if dtype.kind in 'fc':
+                    ufunc = np.fmin if op == 'min' else np.fmax
+                else:
+                    ufunc = np.minimum if op == 'min' else np.maximum
+                self.reducers.append((fname, ufunc))
+            self.aggs.append((name, op, outname))
+            self.outdtypes.append(outdtype)
+        if len(self.aggs) == 0:
+            raise ValueError("`aggs` cannot be empty")
+        self.valcols = dict((name, table[name]) for name, op, _ in self.aggs
+                            if op != 'count' or name not in keys)
+        self.dtype = np.dtype(fields)
+        self.keyfields = ['k%d' % i for i in xrange(len(keys))]
+
+    @staticmethod
+    def _check_column(table, name):
+        if name not in table.names:
+            raise ValueError("column '%s' not found" % name)
+        if len(table[name].shape) > 1:
+            raise TypeError("column '%s' is not unidimensional" % name)
+
+    @property
+    def names(self):
+        "The names of the output columns."
+        return self.keys + [outname for _, _, outname in self.aggs]
+
+    def empty(self):
+        """Return an empty array of states."""
+        return np.empty(0, dtype=self.dtype)
+
+    def rowstates(self, start, stop):
+        """Return the states for every row in [start, stop)."""
+        keys = [_read(col, start, stop) for col in self.keycols]
+        # Rows with null keys do not belong to any group
+        valid = None
+        for col, values in zip(self.keycols, keys):
+            isnull = _isnull(col, values)
+            if isnull is not None and isnull.any():
+                valid = ~isnull if valid is None else valid & ~isnull
+        if valid is not None:
+            keys = [values[valid] for values in keys]
+        state = np.empty(len(keys[0]), dtype=self.dtype)
+        for fname, values in zip(self.keyfields, keys):
+            state[fname] = values
+        values = {}
+        for name, col in self.valcols.items():
+            vals = _read(col, start, stop)
+            if valid is not None:
+                vals = vals[valid]
+            values[name] = (vals, _isnull(col, vals))
+        for i, (name, op, _) in enumerate(self.aggs):
+            fname = 'a%d' % i
+            if op == 'count':
+                if name in values and values[name][1] is not None:
+                    state[fname] = ~values[name][1]
+                else:
+                    state[fname] = 1
+                continue
+            vals, isnull = values[name]
+            if op in ('sum', 'mean'):
+                if isnull is not None:
+                    vals = np.where(isnull, 0, vals)
+                state[fname] = vals
+                if op == 'mean':
+                    state['n%d' % i] = 1 if isnull is None else ~isnull
+            elif vals.dtype.kind in 'mM':
+                vals = vals.view(np.int64)
+                if op == 'min' and isnull is not None:
+                    vals = np.where(isnull, _NAT_MIN, vals)
+                state[fname] = vals
+            else:
+                state[fname] = vals
+        return state
+
+    def combine(self, state):
+        """Merge the states with the same keys, sorted by key."""
+        if len(state) < 2:
+            return state
+        keys = [state[fname] for fname in self.keyfields]
+        order = np.lexsort(keys[::-1])
+        keys = [k[order] for k in keys]
+        bounds = keys[0][1:] != keys[0][:-1]
+        for k in keys[1:]:
+            bounds |= k[1:] != k[:-1]
+        starts = np.concatenate(([0], np.flatnonzero(bounds) + 1))
+        result = np.empty(len(starts), dtype=self.dtype)
+        for fname, k in zip(self.keyfields, keys):
+            result[fname] = k[starts]
+        for fname, ufunc in self.reducers:
+            result[fname] = ufunc.reduceat(state[fname][order], starts)
+        return result
+
+    def partition(self, state, nparts, seed=0):
+        """Return the partition (out of `nparts`) for every state.
+
+        Different `seed` values give independent partitionings.
+        """
+        h = np.empty(len(state), dtype=np.uint64)
+        h.fill(seed)
+        for fname in self.keyfields:
+            k = state[fname]
+            kind = k.dtype.kind
+            if kind in 'biumM':
+                u = k.astype(np.int64).view(np.uint64)
+            elif kind == 'f':
+                # Adding 0. turns -0. into 0., so that both land together
+                u = (k.astype(np.float64) + 0.).view(np.uint64)
+            else:
+                u = np.array([hash(x) for x in k.tolist()],
+                             dtype=np.int64).view(np.uint64)
+            h = (h ^ u) * _HASH_MULT
+        return (h >> np.uint64(32)) % np.uint64(nparts)
+
+    def outcolumns(self):
+        """Return the (empty) columns for the output ctable."""
+        cols = []
+        for col in self.keycols:
+            if isinstance(col, bcolz.catcarray):
+                cols.append(bcolz.catcarray(
+                    [], categories=col.categories, kind=col.kind))
+            elif isinstance(col, bcolz.vlcarray):
+                cols.append(bcolz.vlcarray([], kind=col.kind))
+            else:
+                cols.append(np.empty(0, dtype=col.dtype))
+        for dtype in self.outdtypes:
+            cols.append(np.empty(0, dtype=dtype))
+        return cols
+
+    def finalize(self, state):
+        """Return the output columns for the groups in `state`."""
+        cols = []
+        for fname, col in zip(self.keyfields, self.keycols):
+            values = state[fname]
+            if isinstance(col, bcolz.catcarray):
+                values = np.array(col.categories, dtype=object)[values]
+            cols.append(values)
+        for i, (name, op, _) in enumerate(self.aggs):
+            values = state['a%d' % i]
+            dtype = self.outdtypes[i]
+            if op == 'mean':
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    values = values / state['n%d' % i]
+            elif dtype.kind in 'mM':
+                if op == 'min':
+                    values = np.where(values == _NAT_MIN,
+                                      np.iinfo(np.int64).min, values)
+                values = values.view(dtype)
+            cols.append(np.ascontiguousarray(values, dtype=dtype))
+        return cols
+
+
+class _spill(object):
+    """Hash-partitioned partial aggregates, kept in ctables on disk.
+
+    Every `level` of re-partitioning uses its own hash seed, so that the
+    states of a partition spread over the partitions of the next level.
+    """
+
+    def __init__(self, aggregator, nparts, level=0):
+        self.aggregator = aggregator
+        self.nparts = nparts
+        self.level = level
+        self.tmpdir = tempfile.mkdtemp(prefix='bcolz-groupby-')
+        self.parts = [None] * nparts
+
+    def write(self, state):
+        parts = self.aggregator.partition(state, self.nparts, self.level)
+        for i in xrange(self.nparts):
+            pstate = state[parts == i]
+            if len(pstate) == 0:
+                continue
+            if self.parts[i] is None:
+                self.parts[i] = bcolz.ctable(
+                    pstate, rootdir=os.path.join(self.tmpdir, 'part%d' % i))
+                # The partitions are flushed just once, before being read
+                self.parts[i].auto_flush = False
+            else:
+                self.parts[i].append(pstate)
+
+    def read(self, blen):
+        """Yield the states in every partition, in blocks of `blen`."""
+        for part in self.parts:
+            if part is not None:
+                part.flush()
+                yield (part[start:start + blen]
+                       for start in xrange(0, len(part), blen))
+
+    def remove(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+def _aggregate(aggregator, states, maxstates, result, level=0):
+    """Combine the blocks of `states` and append the groups to `result`.
+
+    At most `maxstates` states are kept in memory; beyond that, the
+    partial aggregates are spilled to disk, and every partition is
+    aggregated in turn (being re-partitioned when still too large).
+    """
+    spill = None
+    try:
+        pending, npending = [], 0
+        for state in states:
+            state = aggregator.combine(state)
+            pending.append(state)
+            npending += len(state)
+            if npending <= maxstates:
+                continue
+            state = aggregator.combine(np.concatenate(pending))
+            pending, npending = [state], len(state)
+            if npending > maxstates // 2 and level < SPILL_MAXLEVEL:
+                # Too many groups: flush the partial aggregates to disk
+                if spill is None:
+                    spill = _spill(aggregator, SPILL_NPARTS, level)
+                spill.write(state)
+                pending, npending = [], 0
+        state = aggregator.combine(
+            np.concatenate(pending) if pending else aggregator.empty())
+
+        if spill is None:
+            result.append(aggregator.finalize(state))
+        else:
+            spill.write(state)
+            for pstates in spill.read(maxstates):
+                _aggregate(aggregator, pstates, maxstates, result, level + 1)
+    finally:
+        if spill is not None:
+            spill.remove()
+
+
+def groupby(table, keys, aggs, blen=None, **kwargs):
+    """Group the rows of `table` by `keys` and compute `aggs`.
+
+    See `ctable.groupby()` for the description of the parameters.
+    """
+
+    aggregator = _aggregator(table, keys, aggs)
+    if blen is None:
+        blen = min(table[name].chunklen
+                   for name in aggregator.keys + list(aggregator.valcols))
+    maxstates = max(
+        bcolz.defaults.groupby_memsize // aggregator.dtype.itemsize, 1)
+
+    states = (aggregator.rowstates(start, min(start + blen, len(table)))
+              for start in xrange(0, len(table), blen))
+    result = bcolz.ctable(aggregator.outcolumns(), aggregator.names,
+                          **kwargs)
+    _aggregate(aggregator, states, maxstates, result)
+    result.flush()
+    return result
+
+
+# Local Variables:
+# mode: python
+# tab-width: 4
+# fill-column: 78
+# End:
@@ -0,0 +1,575 @@
+########################################################################
+#
+#       License: BSD
+#       Created: October 18, 2026
+#
+########################################################################
+
+"""Secondary indexes for ctable columns.
+"""
+
+from __future__ import absolute_import
+
+import ast
+import json
+import operator
+import os
+import shutil
+
+import numpy as np
+import bcolz
+from bcolz.sorting import extsort
+from bcolz.py2help import xrange, unicode
+
+
+# The directory (under the ctable rootdir) keeping the indexes
+INDEXES_DIR = '__indexes__'
+
+# The metadata file of every index
+INDEX_FILE = '__index__'
+
+# The maximum fraction of the rows that a lookup can match for using an
+# index rather than scanning
+MAX_SELECTIVITY = 0.1
+
+# The maximum number of distinct values for bitmap indexes
+MAX_CARDINALITY = 1000
+
+# The chunklen of the bitmaps (the same for all of them, so that their
+# chunks can be combined one by one)
+BITMAP_CHUNKLEN = 2**16
+
+# The comparison operators that indexes can resolve
+OPERATORS = {
+    ast.Eq: '==', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>='}
+_OPFUNCS = {
+    '==': operator.eq, '<': operator.lt, '<=': operator.le,
+    '>': operator.gt, '>=': operator.ge}
+# The operator to use when the operands are swapped (e.g. '3 < x')
+_SWAPPED = {'==': '==', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+
+
+def _isnull(values):
+    """Return a mask for the NaN/NaT values, or None if there are not any.
+    """
+    kind = values.dtype.kind
+    if kind == 'f':
+        return np.isnan(values)
+    elif kind in 'mM':
+        return values.view(np.int64) == np.iinfo(np.int64).min
+    return None
+
+
+def _coerce(value, dtype):
+    """Convert the literal `value` for comparing it with `dtype` values."""
+    if dtype.kind == 'S' and isinstance(value, unicode):
+        value = value.encode('utf-8')
+    elif dtype.kind == 'U' and isinstance(value, bytes):
+        value = value.decode('utf-8')
+    elif dtype.kind in 'mM':
+        value = np.array(value, dtype=dtype)
+    return np.asarray(value)
+
+
+def match(values, conditions):
+    """Return a mask for the `values` where all the (op, value)
+    `conditions` hold."""
+    mask = np.ones(len(values), dtype=np.bool_)
+    for op, value in conditions:
+        mask &= _OPFUNCS[op](values, _coerce(value, values.dtype))
+    return mask
+
+
+def scan(col, conditions, start, stop):
+    """Return the rows in [start, stop) of `col` where all the (op, value)
+    `conditions` hold."""
+    positions = [np.empty(0, dtype=np.int64)]
+    for i in xrange(start, stop, col.chunklen):
+        values = col[i:min(i + col.chunklen, stop)]
+        positions.append(np.flatnonzero(match(values, conditions)) + i)
+    return np.concatenate(positions)
+
+
+class _index(object):
+    """The common machinery for the different kinds of indexes."""
+
+    @property
+    def nrows(self):
+        "The number of rows of the column covered by the index."
+        return self._nrows
+
+    @property
+    def stale(self):
+        "Whether the indexed rows have been modified after indexing them."
+        return self._stale
+
+    def __init__(self, col=None, rootdir=None, mode='a'):
+        self.rootdir = rootdir
+        self.mode = mode
+        if col is not None:
+            if self.rootdir is not None:
+                if os.path.exists(self.rootdir):
+                    shutil.rmtree(self.rootdir)
+                os.makedirs(self.rootdir)
+            self._nrows, self._stale = len(col), False
+            self._create(col)
+            self._write_meta()
+        else:
+            with open(self._path(INDEX_FILE), 'rb') as metafh:
+                meta = json.loads(metafh.read().decode('ascii'))
+            self._nrows, self._stale = meta['nrows'], meta['stale']
+            self._open()
+
+    def _path(self, name):
+        if self.rootdir is None:
+            return None
+        return os.path.join(self.rootdir, name)
+
+    def _write_meta(self):
+        if self.rootdir is None or self.mode == 'r':
+            return
+        meta = {'kind': self.kind, 'nrows': self._nrows,
+                'stale': self._stale}
+        with open(self._path(INDEX_FILE), 'wb') as metafh:
+            metafh.write(json.dumps(meta).encode('ascii'))
+            metafh.write(b"\n")
+
+    def mark_stale(self):
+        """Flag the index as out of date, so that queries do not use it."""
+        if not self._stale:
+            self._stale = True
+            self._write_meta()
+
+    def purge(self):
+        """Remove the underlying data for on-disk indexes."""
+        if self.rootdir:
+            shutil.rmtree(self.rootdir)
+
+    def query(self, col, conditions):
+        """Return the rows where all the (op, value) `conditions` hold for
+        `col`, in order, or None if the index is not selective enough.
+
+        The rows appended to `col` after building the index are scanned.
+        """
+        positions = self.lookup(conditions)
+        if positions is not None and len(col) > self._nrows:
+            positions = np.concatenate((positions, scan(
+                col, conditions, self._nrows, len(col))))
+        return positions
+
+
+class sortedindex(_index):
+    """
+    sortedindex(col=None, rootdir=None, mode='a')
+
+    An index with the values of a column in sorted order, along with
+    their row positions.
+
+    Lookups locate the values with a binary search over the first value
+    of every chunk (the 'fences', which are kept in memory) and then in
+    the one chunk involved, so a point query decompresses a couple of
+    chunks at most.
+
+    Parameters
+    ----------
+    col : carray
+        The column to index.  If None, the index is opened from `rootdir`.
+    rootdir : str, optional
+        The directory where the index is stored.
+    mode : str, optional
+        The mode for opening the index.
+
+    """
+
+    kind = 'sorted'
+
+    def _create(self, col):
+        nrows = len(col)
+        self.values = bcolz.carray(
+            np.empty(0, dtype=col.dtype), expectedlen=nrows,
+            rootdir=self._path('values'), mode='w')
+        self.positions = bcolz.carray(
+            np.empty(0, dtype=np.int64), expectedlen=nrows,
+            rootdir=self._path('positions'), mode='w')
+        chunklen = self.values.chunklen
+        fences = []
+        dtype = np.dtype([('v', col.dtype), ('p', np.int64)])
+
+        def read(start, stop):
+            rows = np.empty(stop - start, dtype=dtype)
+            rows['v'] = col[start:stop]
+            rows['p'] = np.arange(start, stop)
+            return rows
+
+        def emit(rows):
+            # Keep the first value of every chunk of `values`
+            first = -len(self.values) % chunklen
+            fences.append(rows['v'][first::chunklen])
+            self.values.append(rows['v'])
+            self.positions.append(rows['p'])
+
+        extsort(nrows, read, lambda rows: rows['v'], emit, dtype.itemsize)
+        self.values.flush()
+        self.positions.flush()
+        self._fences = np.concatenate(
+            fences or [np.empty(0, dtype=col.dtype)])
+        if self.rootdir is not None:
+            bcolz.carray(self._fences, rootdir=self._path('fences'),
+                         mode='w')
+
+    def _open(self):
+        self.values = bcolz.carray(rootdir=self._path('values'),
+                                   mode=self.mode)
+        self.positions = bcolz.carray(rootdir=self._path('positions'),
+                                      mode=self.mode)
+        self._fences = bcolz.carray(rootdir=self._path('fences'),
+                                    mode=self.mode)[:]
+
+    def _searchsorted(self, value, side):
+        """Like `np.searchsorted(self.values, value, side)`."""
+        nchunk = np.searchsorted(self._fences, value, side=side) - 1
+        if nchunk < 0:
+            return 0
+        chunklen = self.values.chunklen
+        start = nchunk * chunklen
+        chunk = self.values[start:start + chunklen]
+        return start + np.searchsorted(chunk, value, side=side)
+
+    def lookup(self, conditions):
+        """Return the indexed rows where all the (op, value) `conditions`
+        hold, in order.
+
+        If they match more than `MAX_SELECTIVITY` of the rows, None is
+        returned, as scanning the column is cheaper then.
+        """
+        lo, hi = 0, len(self.values)
+        for op, value in conditions:
+            value = _coerce(value, self.values.dtype)
+            if op in ('==', '>='):
+                lo = max(lo, self._searchsorted(value, 'left'))
+            elif op == '>':
+                lo = max(lo, self._searchsorted(value, 'right'))
+            if op in ('==', '<='):
+                hi = min(hi, self._searchsorted(value, 'right'))
+            elif op == '<':
+                hi = min(hi, self._searchsorted(value, 'left'))
+        if hi <= lo:
+            return np.empty(0, dtype=np.int64)
+        if hi - lo > MAX_SELECTIVITY * len(self.values):
+            return None
+        positions = self.positions[lo:hi]
+        # NaN and NaT are sorted to an end, but never satisfy comparisons
+        ends = np.array([self.values[lo], self.values[hi - 1]])
+        isnull = _isnull(ends)
+        if isnull is not None and isnull.any():
+            positions = positions[~_isnull(self.values[lo:hi])]
+        return np.sort(positions)
+
+
+class bitmapindex(_index):
+    """
+    bitmapindex(col=None, rootdir=None, mode='a')
+
+    An index with a compressed boolean carray (a bitmap) for every
+    distinct value of a column.
+
+    This suits columns with few distinct values (up to
+    `MAX_CARDINALITY`).  The bitmaps of the values satisfying a
+    comparison are or-ed, and the results of several comparisons can be
+    combined with and/or/not, block by block.  Bitmap chunks without any
+    true value are stored as constants, so they are skipped without
+    being decompressed.
+
+    Parameters
+    ----------
+    col : carray
+        The column to index.  If None, the index is opened from `rootdir`.
+    rootdir : str, optional
+        The directory where the index is stored.
+    mode : str, optional
+        The mode for opening the index.
+
+    """
+
+    kind = 'bitmap'
+
+    def _create(self, col):
+        nrows = len(col)
+        # Collect the distinct (non-null) values first
+        values = np.empty(0, dtype=col.dtype)
+        for i in xrange(0, nrows, col.chunklen):
+            block = col[i:i + col.chunklen]
+            isnull = _isnull(block)
+            if isnull is not None:
+                block = block[~isnull]
+            values = np.union1d(values, block)
+            if len(values) > MAX_CARDINALITY:
+                self.purge()
+                raise ValueError(
+                    "the column has more than %d distinct values; use a "
+                    "'sorted' index instead" % MAX_CARDINALITY)
+        self.values = values
+        self.counts = np.zeros(len(values), dtype=np.int64)
+        if self.rootdir is not None:
+            os.mkdir(self._path('bitmaps'))
+        self._bitmaps = [
+            bcolz.carray(np.empty(0, dtype=np.bool_), expectedlen=nrows,
+                         chunklen=BITMAP_CHUNKLEN,
+                         rootdir=self._bitmap_path(k), mode='w')
+            for k in xrange(len(values))]
+        if len(values) > 0:
+            for i in xrange(0, nrows, BITMAP_CHUNKLEN):
+                block = col[i:i + BITMAP_CHUNKLEN]
+                codes = np.searchsorted(values, block)
+                codes[codes == len(values)] = 0
+                # Null values do not get any bitmap
+                codes[values[codes] != block] = -1
+                blockcounts = np.bincount(codes[codes >= 0],
+                                          minlength=len(values))
+                self.counts += blockcounts
+                for k, bitmap in enumerate(self._bitmaps):
+                    if blockcounts[k] == 0:
+                        bitmap.append(np.zeros(len(block), dtype=np.bool_))
+                    else:
+                        bitmap.append(codes == k)
+        for bitmap in self._bitmaps:
+            bitmap.flush()
+        if self.rootdir is not None:
+            bcolz.carray(self.values, rootdir=self._path('values'),
+                         mode='w')
+            bcolz.carray(self.counts, rootdir=self._path('counts'),
+                         mode='w')
+
+    def _open(self):
+        self.values = bcolz.carray(rootdir=self._path('values'),
+                                   mode=self.mode)[:]
+        self.counts = bcolz.carray(rootdir=self._path('counts'),
+                                   mode=self.mode)[:]
+        # The bitmaps are opened on first use
+        self._bitmaps = [None] * len(self.values)
+
+    def _bitmap_path(self, k):
+        return self._path(os.path.join('bitmaps', str(k)))
+
+    def bitmap(self, k):
+        """Return the bitmap for the `k`-th distinct value."""
+        if self._bitmaps[k] is None:
+            self._bitmaps[k] = bcolz.carray(rootdir=self._bitmap_path(k),
+                                            mode=self.mode)
+        return self._bitmaps[k]
+
+    def block(self, col, conditions, start, stop):
+        """Return a mask for the rows in [start, stop) of `col` where all
+        the (op, value) `conditions` hold, or None if they hold nowhere.
+
+        The rows appended to `col` after building the index are scanned.
+        """
+        mask = None
+        istop = min(stop, self._nrows)
+        if start < istop:
+            aligned = start % BITMAP_CHUNKLEN == 0
+            for k in np.flatnonzero(match(self.values, conditions)):
+                bitmap = self.bitmap(k)
+                if aligned and bitmap._chunk_count_nonzero(
+                        start // BITMAP_CHUNKLEN) == 0:
+                    continue
+                if mask is None:
+                    mask = np.zeros(stop - start, dtype=np.bool_)
+                mask[:istop - start] |= bitmap[start:istop]
+        if stop > self._nrows:
+            tstart = max(start, self._nrows)
+            tail = match(col[tstart:stop], conditions)
+            if tail.any():
+                if mask is None:
+                    mask = np.zeros(stop - start, dtype=np.bool_)
+                mask[tstart - start:] |= tail
+        return mask
+
+    def lookup(self, conditions):
+        """Return the indexed rows where all the (op, value) `conditions`
+        hold, in order.
+
+        If they match more than `MAX_SELECTIVITY` of the rows, None is
+        returned, as scanning the column is cheaper then.
+        """
+        nmatches = self.counts[match(self.values, conditions)].sum()
+        if nmatches > MAX_SELECTIVITY * self._nrows:
+            return None
+        positions = [np.empty(0, dtype=np.int64)]
+        if nmatches > 0:
+            for start in xrange(0, self._nrows, BITMAP_CHUNKLEN):
+                stop = min(start + BITMAP_CHUNKLEN, self._nrows)
+                mask = self.block(None, conditions, start, stop)
+                if mask is not None:
+                    positions.append(np.flatnonzero(mask) + start)
+        return np.concatenate(positions)
+
+
+# The classes for every kind of index
+INDEX_KINDS = {'sorted': sortedindex, 'bitmap': bitmapindex}
+
+
+def open_index(rootdir, mode='a'):
+    """Open the index stored in `rootdir`."""
+    with open(os.path.join(rootdir, INDEX_FILE), 'rb') as metafh:
+        kind = json.loads(metafh.read().decode('ascii'))['kind']
+    return INDEX_KINDS[kind](rootdir=rootdir, mode=mode)
+
+
+def _comparisons(node):
+    """Return the (name, op, value) comparisons in the `node` comparison.
+
+    Only comparisons between a name and literals are supported (including
+    chained ones like '3 < x <= 5').  Otherwise, None is returned.
+    """
+    operands = [node.left] + list(node.comparators)
+    ops = [OPERATORS.get(type(op)) for op in node.ops]
+    if None in ops:
+        return None
+    names = [i for i, operand in enumerate(operands)
+             if isinstance(operand, ast.Name)]
+    if len(names) != 1:
+        return None
+    nname = names[0]
+    name = operands[nname].id
+    result = []
+    try:
+        for i, op in enumerate(ops):
+            if i == nname:
+                # name op literal
+                value = ast.literal_eval(operands[i + 1])
+                result.append((name, op, value))
+            elif i + 1 == nname:
+                # literal op name
+                value = ast.literal_eval(operands[i])
+                result.append((name, _SWAPPED[op], value))
+            else:
+                return None
+    except ValueError:
+        return None
+    return result
+
+
+def parse(expression):
+    """Split `expression` into the comparisons that indexes can resolve.
+
+    Returns a tuple (comparisons, exact, names) where `comparisons` is a
+    list of (name, op, value) terms that are and-ed in `expression`,
+    `exact` tells whether `expression` is just the conjunction of them
+    and `names` is the set of variables in `expression`.
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode='eval').body
+    except SyntaxError:
+        return [], False, set()
+    funcs = set(node.func.id for node in ast.walk(tree)
+                if isinstance(node, ast.Call) and
+                isinstance(node.func, ast.Name))
+    names = set(node.id for node in ast.walk(tree)
+                if isinstance(node, ast.Name)) - funcs
+    terms, pending = [], [tree]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitAnd):
+            pending.extend((node.right, node.left))
+        elif isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+            pending.extend(node.values[::-1])
+        else:
+            terms.append(node)
+    comparisons, exact = [], True
+    for term in terms:
+        result = None
+        if isinstance(term, ast.Compare):
+            result = _comparisons(term)
+        if result is None:
+            exact = False
+        else:
+            comparisons.extend(result)
+    return comparisons, exact, names
+
+
+def _plan(node, bitmaps):
+    """Return the plan for evaluating the `node` expression with the
+    `bitmaps` indexes, or None if some part of it cannot be resolved."""
+    if isinstance(node, ast.BinOp) and isinstance(
+            node.op, (ast.BitAnd, ast.BitOr)):
+        op = 'and' if isinstance(node.op, ast.BitAnd) else 'or'
+        children = [node.left, node.right]
+    elif isinstance(node, ast.BoolOp):
+        op = 'and' if isinstance(node.op, ast.And) else 'or'
+        children = node.values
+    elif isinstance(node, ast.UnaryOp) and isinstance(
+            node.op, (ast.Invert, ast.Not)):
+        child = _plan(node.operand, bitmaps)
+        return None if child is None else ('not', child)
+    elif isinstance(node, ast.Compare):
+        comparisons = _comparisons(node)
+        if comparisons is None or comparisons[0][0] not in bitmaps:
+            return None
+        index, col = bitmaps[comparisons[0][0]]
+        return ('leaf', index, col, [c[1:] for c in comparisons])
+    else:
+        return None
+    children = [_plan(child, bitmaps) for child in children]
+    if None in children:
+        return None
+    return (op, children)
+
+
+def _evalplan(plan, start, stop):
+    """Return the mask of `plan` for the rows in [start, stop), or None if
+    it is false for all of them."""
+    op = plan[0]
+    if op == 'leaf':
+        _, index, col, conditions = plan
+        return index.block(col, conditions, start, stop)
+    elif op == 'not':
+        mask = _evalplan(plan[1], start, stop)
+        if mask is None:
+            return np.ones(stop - start, dtype=np.bool_)
+        return ~mask
+    result = None
+    for child in plan[1]:
+        mask = _evalplan(child, start, stop)
+        if op == 'and':
+            if mask is None:
+                # No need to evaluate the rest
+                return None
+            result = mask if result is None else result & mask
+        elif mask is not None:
+            result = mask if result is None else result | mask
+    return result
+
+
+def bitmap_mask(expression, bitmaps, nrows):
+    """Evaluate the boolean `expression` with bitmap indexes.
+
+    `bitmaps` maps column names to (index, column) pairs.  Returns a
+    boolean carray with `nrows` values, or None if `expression` is not
+    made only of comparisons on the `bitmaps` columns (combined with
+    '&', '|' and '~').
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode='eval').body
+    except SyntaxError:
+        return None
+    plan = _plan(tree, bitmaps)
+    if plan is None:
+        return None
+    result = bcolz.carray(np.empty(0, dtype=np.bool_), expectedlen=nrows,
+                          chunklen=BITMAP_CHUNKLEN)
+    for start in xrange(0, nrows, BITMAP_CHUNKLEN):
+        stop = min(start + BITMAP_CHUNKLEN, nrows)
+        mask = _evalplan(plan, start, stop)
+        if mask is None:
+            mask = np.zeros(stop - start, dtype=np.bool_)
+        result.append(mask)
+    result.flush()
+    return result
+
+
+# Local Variables:
+# mode: python
+# tab-width: 4
+# fill-column: 78
+# End:
@@ -0,0 +1,252 @@
+########################################################################
+#
+#       License: BSD
+#       Created: October 18, 2026
+#
+########################################################################
+
+"""External merge sort for carrays and ctables.
+"""
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import bcolz
+from bcolz.groupby import _read
+from bcolz.py2help import xrange, _strtypes
+
+
+# The maximum number of runs that are merged at once
+MAX_FANIN = 64
+
+
+def _sortrows(rows, keyof):
+    """Return `rows` stably sorted by their keys."""
+    return rows[np.argsort(keyof(rows), kind='mergesort')]
+
+
+def _store(rows, rootdir):
+    """Store `rows` in a new carray (or ctable, for structured rows)."""
+    if rows.dtype.names is not None:
+        return bcolz.ctable(rows, rootdir=rootdir, mode='w')
+    return bcolz.carray(rows, rootdir=rootdir, mode='w')
+
+
+class _cursor(object):
+    """A position in a sorted run, with its current buffer."""
+
+    def __init__(self, run):
+        self.run = run
+        self.pos = 0
+        self.rows = self.keys = ()
+
+    def fill(self, buflen, keyof):
+        stop = min(self.pos + buflen, len(self.run))
+        if stop > self.pos:
+            self.rows = self.run[self.pos:stop]
+            self.keys = keyof(self.rows)
+            self.pos = stop
+
+    def take(self, n):
+        rows, keys = self.rows[:n], self.keys[:n]
+        self.rows, self.keys = self.rows[n:], self.keys[n:]
+        return rows, keys
+
+
+def _merge(runs, keyof, emit, buflen):
+    """Merge the sorted `runs`, passing the rows in blocks to `emit`.
+
+    Every round reads a buffer of `buflen` rows for the runs that have
+    exhausted theirs, and emits all the buffered rows up to the smallest
+    of the last keys in the buffers.  This empties at least one buffer
+    per round, and the ties between runs are broken by run order, so
+    the merge is stable.
+    """
+    cursors = [_cursor(run) for run in runs]
+    while True:
+        active = []
+        for cur in cursors:
+            if len(cur.rows) == 0:
+                cur.fill(buflen, keyof)
+            if len(cur.rows) > 0:
+                active.append(cur)
+        if len(active) == 0:
+            break
+        if len(active) == 1:
+            emit(active[0].take(len(active[0].rows))[0])
+            continue
+        lasts = np.concatenate([cur.keys[-1:] for cur in active])
+        nbound = np.argsort(lasts, kind='mergesort')[0]
+        bound = lasts[nbound:nbound + 1]
+        rows, keys = [], []
+        for i, cur in enumerate(active):
+            side = 'right' if i <= nbound else 'left'
+            n = np.searchsorted(cur.keys, bound, side=side)[0]
+            if n > 0:
+                r, k = cur.take(n)
+                rows.append(r)
+                keys.append(k)
+        rows, keys = np.concatenate(rows), np.concatenate(keys)
+        emit(rows[np.argsort(keys, kind='mergesort')])
+
+
+def extsort(nitems, read, keyof, emit, itemsize):
+    """Sort `nitems` rows within `bcolz.defaults.sort_memsize` bytes.
+
+    `read(start, stop)` has to return the rows in [start, stop) as a
+    NumPy array, `keyof(rows)` the keys for sorting `rows` and
+    `emit(rows)` receives the sorted rows, in consecutive blocks.  The
+    rows are sorted in runs that fit in memory, which are stored in a
+    temporary directory and then merged (in several passes if there are
+    more than `MAX_FANIN` runs).
+    """
+    memsize = bcolz.defaults.sort_memsize
+    runlen = max(memsize // itemsize, 1)
+    if nitems <= runlen:
+        emit(_sortrows(read(0, nitems), keyof))
+        return
+
+    tmpdir = tempfile.mkdtemp(prefix='bcolz-sort-')
+    try:
+        runs = []
+        for start in xrange(0, nitems, runlen):
+            rows = _sortrows(read(start, min(start + runlen, nitems)), keyof)
+            runs.append(_store(rows, os.path.join(tmpdir, str(len(runs)))))
+        nruns = len(runs)
+        buflen = max(memsize // (itemsize * (MAX_FANIN + 1)), 1)
+        while len(runs) > MAX_FANIN:
+            merged = []
+            for i in xrange(0, len(runs), MAX_FANIN):
+                rootdir = os.path.join(tmpdir, str(nruns))
+                nruns += 1
+                sink = []
+
+                def append(rows):
+                    if sink:
+                        sink[0].append(rows)
+                    else:
+                        sink.append(_store(rows, rootdir))
+
+                _merge(runs[i:i + MAX_FANIN], keyof, append, buflen)
+                sink[0].flush()
+                merged.append(sink[0])
+                for run in runs[i:i + MAX_FANIN]:
+                    shutil.rmtree(run.rootdir)
+            runs = merged
+        buflen = max(memsize // (itemsize * (len(runs) + 1)), 1)
+        _merge(runs, keyof, emit, buflen)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _check_1d(obj):
+    if len(obj.shape) > 1:
+        raise TypeError("only unidimensional objects can be sorted")
+
+
+def sort_carray(carr, **kwargs):
+    """Return a sorted copy of `carr`.  See `carray.sort()`."""
+    _check_1d(carr)
+    kwargs.setdefault('expectedlen', len(carr))
+    out = bcolz.carray(np.empty(0, dtype=carr.dtype), **kwargs)
+    extsort(len(carr), lambda start, stop: carr[start:stop],
+            lambda rows: rows, out.append, carr.dtype.itemsize)
+    out.flush()
+    return out
+
+
+def argsort_carray(carr, **kwargs):
+    """Return the indices that sort `carr`.  See `carray.argsort()`."""
+    _check_1d(carr)
+    dtype = np.dtype([('v', carr.dtype), ('p', np.int64)])
+
+    def read(start, stop):
+        rows = np.empty(stop - start, dtype=dtype)
+        rows['v'] = carr[start:stop]
+        rows['p'] = np.arange(start, stop)
+        return rows
+
+    kwargs.setdefault('expectedlen', len(carr))
+    out = bcolz.carray(np.empty(0, dtype=np.int64), **kwargs)
+    extsort(len(carr), read, lambda rows: rows['v'],
+            lambda rows: out.append(rows['p']), dtype.itemsize)
+    out.flush()
+    return out
+
+
+def sort_ctable(table, keys, **kwargs):
+    """Return a copy of `table` sorted by `keys`.  See `ctable.sort_by()`.
+    """
+    if isinstance(keys, _strtypes):
+        keys = keys.replace(',', ' ').split()
+    keys = list(keys)
+    if len(keys) == 0:
+        raise ValueError("`keys` cannot be empty")
+    for name in keys:
+        if name not in table.names:
+            raise ValueError("column '%s' not found" % name)
+        _check_1d(table[name])
+
+    # The rows keep the codes of catcarray columns
+    names = table.names
+    fields, outcols = [], []
+    for name in names:
+        col, dtype = table[name], table.dtype[name]
+        if isinstance(col, bcolz.catcarray):
+            dtype = col.codes.dtype
+            outcols.append(bcolz.catcarray(
+                [], categories=col.categories, kind=col.kind))
+        elif isinstance(col, bcolz.vlcarray):
+            outcols.append(bcolz.vlcarray([], kind=col.kind))
+        else:
+            outcols.append(np.empty((0,) + col.shape[1:], dtype=col.dtype))
+        fields.append((name, dtype))
+    dtype = np.dtype(fields)
+    keydtype = np.dtype([(name, dtype[name]) for name in keys])
+
+    def read(start, stop):
+        rows = np.empty(stop - start, dtype=dtype)
+        for name in names:
+            rows[name] = _read(table[name], start, stop)
+        return rows
+
+    def keyof(rows):
+        if len(keys) == 1:
+            return rows[keys[0]]
+        # A packed copy, as NumPy cannot sort views with gaps
+        k = np.empty(len(rows), dtype=keydtype)
+        for name in keys:
+            k[name] = rows[name]
+        return k
+
+    decoders = {}
+    for name in names:
+        col = table[name]
+        if isinstance(col, bcolz.catcarray):
+            decoders[name] = np.array(col.categories + [None], dtype=object)
+
+    def emit(rows):
+        cols = []
+        for name in names:
+            values = rows[name]
+            if name in decoders:
+                values = decoders[name][values]
+            cols.append(values)
+        out.append(cols)
+
+    kwargs.setdefault('expectedlen', len(table))
+    out = bcolz.ctable(outcols, names, **kwargs)
+    extsort(len(table), read, keyof, emit, dtype.itemsize)
+    out.flush()
+    return out
+
+
+# Local Variables:
+# mode: python
+# tab-width: 4
+# fill-column: 78
+# End:
@@ -0,0 +1,179 @@
+########################################################################
+#
+#       License: BSD
+#       Created: October 18, 2026
+#
+########################################################################
+
+from __future__ import absolute_import
+
+import os
+import json
+import shutil
+
+import numpy as np
+from bcolz import utils
+from bcolz.carray_ext import META_DIR, SIZES_FILE, STORAGE_FILE
+
+
+class strcarray(object):
+    """Base class for the containers of strings (vlcarray, catcarray).
+
+    A strcarray keeps its data in some inner containers that live in
+    subdirectories of its rootdir, plus its own meta files, so that it
+    can be opened like a carray.  Subclasses must implement
+    `_containers()`, returning the inner containers, the first one
+    being the one with an entry per value.  `_STORAGE_KEY` is the key in
+    the storage meta identifying the subclass.
+
+    """
+
+    _STORAGE_KEY = None
+
+    # Properties
+    # ``````````
+
+    @property
+    def cbytes(self):
+        "The compressed size of this object (in bytes)."
+        return sum(container.cbytes for container in self._containers())
+
+    @property
+    def chunklen(self):
+        "The number of values that fit into a chunk."
+        return self._containers()[0].chunklen
+
+    @property
+    def cparams(self):
+        "The compression parameters for this object."
+        return self._containers()[0].cparams
+
+    @property
+    def dtype(self):
+        "The data type of this object (always 'object')."
+        return np.dtype(np.object_)
+
+    @property
+    def len(self):
+        "The length of this object."
+        return len(self._containers()[0])
+
+    @property
+    def nbytes(self):
+        "The original (uncompressed) size of this object (in bytes)."
+        return sum(container.nbytes for container in self._containers())
+
+    @property
+    def ndim(self):
+        "The number of dimensions of this object."
+        return 1
+
+    @property
+    def shape(self):
+        "The shape of this object."
+        return (self.len,)
+
+    def _containers(self):
+        """Return the inner containers of this object."""
+        raise NotImplementedError
+
+    def _check_args(self, mode, kind):
+        """Check the `mode` and `kind` passed to the constructor."""
+        if mode not in ('r', 'w', 'a'):
+            raise ValueError("mode should be 'r', 'w' or 'a'")
+        if kind is not None and kind not in ('S', 'U'):
+            raise ValueError("kind should be 'S' or 'U'")
+
+    def _create_rootdir(self):
+        """Create the rootdir (and its meta dir) of a new object."""
+        if self.rootdir is None:
+            return
+        if os.path.exists(self.rootdir):
+            if self.mode != 'w':
+                raise IOError(
+                    "specified rootdir path '%s' already exists "
+                    "and creation mode is '%s'" % (self.rootdir, self.mode))
+            if os.path.isdir(self.rootdir):
+                shutil.rmtree(self.rootdir)
+            else:
+                os.remove(self.rootdir)
+        os.mkdir(self.rootdir)
+        os.mkdir(os.path.join(self.rootdir, META_DIR))
+
+    def _subdir(self, name):
+        """The rootdir for the `name` container (or None if in-memory)."""
+        if self.rootdir is None:
+            return None
+        return os.path.join(self.rootdir, name)
+
+    def __len__(self):
+        return self.len
+
+    def __iter__(self):
+        return self.iter()
+
+    def flush(self):
+        """Flush data in internal buffers to disk."""
+        if self.rootdir is None:
+            return
+        for container in self._containers():
+            container.flush()
+        if self.mode != 'r':
+            metadir = os.path.join(self.rootdir, META_DIR)
+            with open(os.path.join(metadir, STORAGE_FILE), 'wb') as metafh:
+                metafh.write(json.dumps(self._storage_meta()).encode('ascii'))
+                metafh.write(b"\n")
+            self._update_disk_sizes()
+
+    def _update_disk_sizes(self):
+        """Update the sizes on-disk."""
+        if self.rootdir is None or self.mode == 'r':
+            return
+        metadir = os.path.join(self.rootdir, META_DIR)
+        with open(os.path.join(metadir, SIZES_FILE), 'wb') as metafh:
+            metafh.write(json.dumps(self._sizes_meta()).encode('ascii'))
+            metafh.write(b"\n")
+
+    def _storage_meta(self):
+        """Return the metadata in the storage file (as a dictionary)."""
+        meta = self._containers()[0]._storage_meta()
+        meta.update(dtype='object', dflt=None)
+        meta[self._STORAGE_KEY] = {'kind': self.kind}
+        return meta
+
+    def _sizes_meta(self):
+        """Return the metadata in the sizes file (as a dictionary)."""
+        return {'shape': self.shape, 'nbytes': self.nbytes,
+                'cbytes': self.cbytes}
+
+    def free_cachemem(self):
+        """Get rid of internal caches to free memory."""
+        for container in self._containers():
+            container.free_cachemem()
+
+    def _repr_args(self):
+        """Return the arguments shown in the first line of the repr."""
+        return "%s, '%s'" % (self.shape, self.kind)
+
+    def __str__(self):
+        return str(self[:].tolist())
+
+    def __repr__(self):
+        snbytes = utils.human_readable_size(self.nbytes)
+        scbytes = utils.human_readable_size(self.cbytes)
+        cratio = self.nbytes / float(self.cbytes)
+        fullrepr = """%s(%s)
+  nbytes: %s; cbytes: %s; ratio: %.2f
+  cparams := %r""" % (type(self).__name__, self._repr_args(),
+                      snbytes, scbytes, cratio, self.cparams)
+        if self.rootdir:
+            fullrepr += "\n  rootdir := '%s'" % self.rootdir
+        fullrepr += "\n%s" % str(self)
+        return fullrepr
+
+
+# Local Variables:
+# mode: python
+# tab-width: 4
+# fill-column: 78
+# End:
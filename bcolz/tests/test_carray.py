@@ -870,6 +870,25 @@ class iterTest(MayBeDiskTest):
         self.assertEqual([i for i in ai], [i for i in bi])
         self.assertEqual([i for i in ai], [i for i in bi])
 
+    def test11a(self):
+        """Testing `iter()` method with prefetching"""
+        a = np.arange(1001)
+        b = bcolz.carray(a, chunklen=10, rootdir=self.rootdir)
+        self.assertEqual(list(a), list(b.iter(prefetch=2)))
+        self.assertEqual(list(a[3:900:7]),
+                         list(b.iter(3, 900, 7, prefetch=3)))
+        self.assertEqual(list(a[55:155]),
+                         list(b.iter(5, limit=100, skip=50, prefetch=1)))
+
+    def test11b(self):
+        """Testing abandoning a prefetching `iter()`"""
+        a = np.arange(1001)
+        b = bcolz.carray(a, chunklen=10, rootdir=self.rootdir)
+        bi = b.iter(prefetch=2)
+        self.assertEqual([next(bi) for i in range(15)], list(a[:15]))
+        del bi
+        self.assertEqual(list(a), list(b.iter(prefetch=2)))
+
 
 class iterMemoryTest(iterTest, TestCase):
     disk = False
@@ -933,6 +952,18 @@ class iterblocksTest(MayBeDiskTest):
         slen = min(N, 3*blen + 2)
         self.assertEqual(s, np.arange(blen-1, slen).sum())
 
+    def test04(self):
+        """Testing `iterblocks` method with prefetching"""
+        N, blen = self.N, 100
+        a = bcolz.fromiter(xrange(N), dtype=np.float64, count=N,
+                           rootdir=self.rootdir)
+        blocks = list(bcolz.iterblocks(a, blen, 1, prefetch=2))
+        self.assertEqual(len(blocks), len(range(1, N, blen)))
+        assert_array_equal(np.concatenate(blocks), np.arange(1, N))
+        # Abandoning the iteration should not block
+        for block in bcolz.iterblocks(a, blen, prefetch=1):
+            break
+
 
 class small_iterblocksMemoryTest(iterblocksTest, TestCase):
     N = 120
@@ -2005,6 +2036,789 @@ class persistenceTest(MayBeDiskTest, TestCase):
         self.assertTrue(cn[N+1] == 3)
 
 
+class segmentsTest(MayBeDiskTest, TestCase):
+    disk = True
+
+    def test00(self):
+        """Testing the 'segments' layout (creation and re-opening)"""
+        a = np.arange(1e5)
+        b = bcolz.carray(a, chunklen=1000, rootdir=self.rootdir,
+                         layout='segments')
+        self.assertEqual(b.layout, 'segments')
+        datadir = os.path.join(self.rootdir, 'data')
+        # Only one segment, the index and the leftover chunk (if any)
+        self.assertTrue(len(os.listdir(datadir)) <= 3)
+        c = bcolz.open(rootdir=self.rootdir)
+        self.assertEqual(c.layout, 'segments')
+        assert_array_equal(a, c[:], "Arrays are not equal")
+
+    def test01(self):
+        """Testing the 'segments' layout (append, setitem and trim)"""
+        a = np.arange(10001)
+        b = bcolz.carray(a, chunklen=100, rootdir=self.rootdir,
+                         layout='segments')
+        b.append(a)
+        b[150:250] = 3
+        b.trim(5050)
+        b.flush()
+        a = np.concatenate((a, a))
+        a[150:250] = 3
+        a = a[:-5050]
+        assert_array_equal(a, b[:], "Arrays are not equal")
+        c = bcolz.open(rootdir=self.rootdir, mode='a')
+        assert_array_equal(a, c[:], "Arrays are not equal")
+        c.append(a)
+        c.flush()
+        c = bcolz.open(rootdir=self.rootdir, mode='r')
+        assert_array_equal(np.concatenate((a, a)), c[:],
+                           "Arrays are not equal")
+
+    def test02(self):
+        """Testing the 'segments' layout (opening in 'w' mode)"""
+        b = bcolz.arange(1e4, chunklen=100, rootdir=self.rootdir,
+                         layout='segments')
+        b = bcolz.carray(rootdir=self.rootdir, mode='w')
+        self.assertEqual(len(b), 0)
+        b.append([1, 2])
+        b.flush()
+        c = bcolz.open(rootdir=self.rootdir)
+        assert_array_equal(c[:], [1, 2], "Arrays are not equal")
+
+    def test03(self):
+        """Testing the 'segments' layout (non-valid values)"""
+        self.assertRaises(ValueError, bcolz.carray, [1, 2],
+                          rootdir=self.rootdir, layout='foo')
+
+
+class mmapTest(MayBeDiskTest):
+    disk = True
+
+    def setUp(self):
+        MayBeDiskTest.setUp(self)
+        self.oldmmap = bcolz.defaults.mmap
+        bcolz.defaults.mmap = True
+
+    def tearDown(self):
+        bcolz.defaults.mmap = self.oldmmap
+        MayBeDiskTest.tearDown(self)
+
+    def test00(self):
+        """Testing reads via memory maps"""
+        a = np.arange(1e5)
+        bcolz.carray(a, chunklen=1000, rootdir=self.rootdir,
+                     layout=self.layout)
+        b = bcolz.open(rootdir=self.rootdir, mode='r')
+        assert_array_equal(a, b[:], "Arrays are not equal")
+        self.assertEqual(b[1234], a[1234])
+        assert_array_equal(a[5000:6000], list(b.iter(5000, 6000)),
+                           "Arrays are not equal")
+
+    def test01(self):
+        """Testing modifications of memory mapped data"""
+        a = np.arange(1e4)
+        b = bcolz.carray(a, chunklen=100, rootdir=self.rootdir,
+                         layout=self.layout)
+        b = bcolz.open(rootdir=self.rootdir, mode='a')
+        c = b[:]
+        b[50:150] = 0
+        a[50:150] = 0
+        b.trim(1234)
+        b.append(a[-1234:])
+        b.flush()
+        assert_array_equal(a, b[:], "Arrays are not equal")
+        assert_array_equal(a, bcolz.open(rootdir=self.rootdir)[:],
+                           "Arrays are not equal")
+
+    @skipUnless(os.path.isdir('/proc/self/fd'), "needs /proc/self/fd")
+    def test02(self):
+        """Testing that mapped reads do not keep a descriptor per chunk"""
+        a = np.arange(1e5)
+        bcolz.carray(a, chunklen=100, rootdir=self.rootdir,
+                     layout=self.layout)
+        b = bcolz.open(rootdir=self.rootdir, mode='r')
+        nfds = len(os.listdir('/proc/self/fd'))
+        assert_array_equal(a, b[:], "Arrays are not equal")
+        self.assertTrue(len(os.listdir('/proc/self/fd')) < nfds + 10)
+
+
+class mmapFilesTest(mmapTest, TestCase):
+    layout = 'files'
+
+
+class mmapSegmentsTest(mmapTest, TestCase):
+    layout = 'segments'
+
+
+class specialChunksTest(MayBeDiskTest):
+    layout = None
+
+    def reopen(self, b):
+        b.flush()
+        if self.disk:
+            b = bcolz.open(rootdir=self.rootdir, mode='a')
+        return b
+
+    def test00(self):
+        """Testing chunks of constants"""
+        b = bcolz.fill(1050, 3.5, chunklen=100, rootdir=self.rootdir,
+                       layout=self.layout)
+        b = self.reopen(b)
+        self.assertEqual([b.chunks[i].flags for i in range(10)], [1] * 10)
+        self.assertEqual(b.chunks[0].runs(), None)
+        self.assertEqual(b[7], 3.5)
+        assert_array_equal(b[95:1050:9], [3.5] * 107)
+        self.assertEqual(b.sum(), 3.5 * 1050)
+        self.assertEqual(b.zonemap(3), (3.5, 3.5, 0))
+
+    def test01(self):
+        """Testing chunks of runs"""
+        a = np.repeat(np.arange(10, dtype='i4'), 100)
+        a = np.concatenate((a, a[:170]))
+        b = bcolz.carray(a, chunklen=300, rootdir=self.rootdir,
+                         layout=self.layout)
+        b = self.reopen(b)
+        self.assertEqual(b.chunks[0].flags, 2)
+        ends, values = b.chunks[0].runs()
+        self.assertEqual(ends.tolist(), [100, 200, 300])
+        self.assertEqual(values.tolist(), [0, 1, 2])
+        self.assertEqual([b[i] for i in (0, 99, 100, 299, 300, 1169)],
+                         [a[i] for i in (0, 99, 100, 299, 300, 1169)])
+        assert_array_equal(b[:], a)
+        assert_array_equal(b[150:1100:7], a[150:1100:7])
+        self.assertEqual(b.sum(), a.sum())
+        self.assertEqual(list(b.where(b[:] == 4)), [4] * 100)
+
+    def test02(self):
+        """Testing modifications of constant and run chunks"""
+        a = np.zeros(1000, dtype='i8')
+        b = bcolz.carray(a, chunklen=200, rootdir=self.rootdir,
+                         layout=self.layout)
+        b[250:300] = 7
+        a[250:300] = 7
+        b[400:600] = np.arange(200)
+        a[400:600] = np.arange(200)
+        b.append(np.ones(150, dtype='i8'))
+        a = np.concatenate((a, np.ones(150, dtype='i8')))
+        b = self.reopen(b)
+        self.assertEqual([b.chunks[i].flags for i in range(5)],
+                         [1, 2, 0, 1, 1])
+        assert_array_equal(b[:], a)
+        self.assertEqual(b.sum(), a.sum())
+
+    def test03(self):
+        """Testing the sum of boolean chunks"""
+        a = np.arange(1000) % 3 == 0
+        a[:300] = True
+        b = bcolz.carray(a, chunklen=100, rootdir=self.rootdir,
+                         layout=self.layout)
+        b = self.reopen(b)
+        self.assertEqual(b.sum(), a.sum())
+        self.assertEqual(sum(1 for _ in b.wheretrue()), a.sum())
+
+    def test04(self):
+        """Testing that unknown chunk formats are rejected"""
+        if not self.disk:
+            return
+        a = np.repeat(np.arange(3, dtype='i8'), 100)
+        b = bcolz.carray(a, chunklen=100, rootdir=self.rootdir,
+                         layout=self.layout)
+        b.append(np.arange(100))
+        b.flush()
+        datadir = os.path.join(self.rootdir, 'data')
+        if self.layout == 'segments':
+            path = os.path.join(datadir, '__seg0.blp')
+            with open(path, 'rb') as fh:
+                self.assertEqual(fh.read(6)[4:], b'\x02\x00')
+            # Set the flags of the second chunk in the index to 7
+            path = os.path.join(datadir, '__segindex__')
+            offset = (1 * 4 + 3) * 8
+        else:
+            # Chunks with flags get a newer format version
+            for nchunk, header in ((0, b'\x02\x01'), (3, b'\x01\x00')):
+                path = os.path.join(datadir, '__%d.blp' % nchunk)
+                with open(path, 'rb') as fh:
+                    self.assertEqual(fh.read(6)[4:], header)
+            path = os.path.join(datadir, '__1.blp')
+            offset = 5
+        with open(path, 'r+b') as fh:
+            fh.seek(offset)
+            fh.write(b'\x07')
+        self.assertRaises(IOError, lambda: bcolz.open(self.rootdir)[:])
+        if self.layout != 'segments':
+            # Unknown format versions are rejected too
+            with open(path, 'r+b') as fh:
+                fh.seek(4)
+                fh.write(b'\x09\x01')
+            self.assertRaises(IOError, lambda: bcolz.open(self.rootdir)[:])
+
+
+class prefilterTest(MayBeDiskTest):
+
+    def test00(self):
+        """Testing prefilters for sorted integers"""
+        a = np.cumsum(np.arange(10000) % 7, dtype='i8') + 2**40
+        for code, prefilter in enumerate(('delta', 'delta2', 'for'), 1):
+            cparams = bcolz.cparams(prefilter=prefilter)
+            b = bcolz.carray(a[:-1], cparams=cparams, chunklen=1000,
+                             rootdir=self.rootdir, mode='w')
+            b.append(a[-1:])
+            b.flush()
+            if self.disk:
+                b = bcolz.open(rootdir=self.rootdir)
+            self.assertEqual(b.cparams.prefilter, prefilter)
+            self.assertEqual(b.chunks[0].prefilter, code)
+            assert_array_equal(b[:], a, prefilter)
+            assert_array_equal(b[999:5555:3], a[999:5555:3], prefilter)
+            self.assertEqual(b[1234], a[1234])
+            self.assertEqual(b.sum(), a.sum())
+            self.assertEqual(list(b.iter(9990)), a[9990:].tolist())
+
+    def test01(self):
+        """Testing prefilters with overflows and datetimes"""
+        a = np.array([0, 255, 3, 250, 128] * 300, dtype='u1')
+        b = bcolz.carray(a, cparams=bcolz.cparams(prefilter='delta2'),
+                         rootdir=self.rootdir)
+        assert_array_equal(b[:], a)
+        d = np.arange(1000).astype('M8[s]')
+        d[500] = np.datetime64('NaT')
+        b = bcolz.carray(d, cparams=bcolz.cparams(prefilter='delta'),
+                         chunklen=300, rootdir=self.rootdir, mode='w')
+        if self.disk:
+            b = bcolz.open(rootdir=self.rootdir)
+        assert_array_equal(b[:], d)
+
+    def test02(self):
+        """Testing that prefilters are not applied to other types"""
+        a = np.linspace(0, 1, 1000)
+        b = bcolz.carray(a, cparams=bcolz.cparams(prefilter='delta'),
+                         chunklen=100, rootdir=self.rootdir)
+        self.assertEqual(b.chunks[0].prefilter, 0)
+        assert_array_equal(b[:], a)
+        self.assertRaises(ValueError, bcolz.cparams, prefilter='foo')
+
+    def test03(self):
+        """Testing scattered reads of prefiltered chunks"""
+        a = np.cumsum(np.arange(20000) % 5, dtype='i4').reshape(-1, 2) - 7
+        idx = np.random.RandomState(1).randint(0, len(a), 500)
+        for prefilter in ('delta', 'delta2', 'for'):
+            b = bcolz.carray(a, cparams=bcolz.cparams(prefilter=prefilter),
+                             chunklen=1000, rootdir=self.rootdir, mode='w')
+            b.flush()
+            if self.disk:
+                b = bcolz.open(rootdir=self.rootdir)
+            assert_array_equal(b[idx], a[idx], prefilter)
+            self.assertEqual([b[i].tolist() for i in idx[:100]],
+                             a[idx[:100]].tolist())
+            for start in (0, 1, 999, 1000, 4567):
+                assert_array_equal(b[start:start + 10],
+                                   a[start:start + 10], prefilter)
+            # Reading chunks again gives the same (cached) values
+            assert_array_equal(b[idx], a[idx], prefilter)
+
+
+class prefilterMemoryTest(prefilterTest, TestCase):
+    disk = False
+
+
+class prefilterDiskTest(prefilterTest, TestCase):
+    disk = True
+
+
+class trimbitsTest(MayBeDiskTest):
+
+    def test00(self):
+        """Testing the trimming of float mantissas"""
+        a = np.linspace(-1, 1, 1000) * np.pi
+        a[[3, 5, 7]] = [np.nan, np.inf, -np.inf]
+        cparams = bcolz.cparams(trimbits=40)
+        b = bcolz.carray(a, cparams=cparams, chunklen=100,
+                         rootdir=self.rootdir)
+        if self.disk:
+            b = bcolz.open(rootdir=self.rootdir)
+        self.assertEqual(b.cparams.trimbits, 40)
+        # The relative error is bounded by the bits that are kept
+        assert_allclose(b[:], a, rtol=2.**-12)
+        self.assertTrue(np.any(b[:] != a))
+        assert_array_equal(b[3:8:2], a[3:8:2])
+        # And the statistics are those of the stored values
+        self.assertEqual(b.zonemap(1), (b[100], b[199], 0))
+        # Complex numbers and small floats are trimmed too
+        c = (a + 1j * a).astype('c8')
+        bc = bcolz.carray(c, cparams=bcolz.cparams(trimbits=20),
+                          chunklen=100)
+        assert_allclose(bc[:], c, rtol=2.**-2)
+        self.assertTrue(np.any(bc[:] != c))
+        self.assertRaises(ValueError, bcolz.cparams, trimbits=-1)
+
+    def test01(self):
+        """Testing that the values in the last chunk are trimmed too"""
+        a = np.linspace(-1, 1, 1000) * np.pi
+        b = bcolz.carray(a[:950], cparams=bcolz.cparams(trimbits=40),
+                         chunklen=100, rootdir=self.rootdir)
+        # Fill the last chunk with appends and updates
+        b.append(a[950:990])
+        b.resize(1000)
+        b[990:] = a[990:]
+        a[960] = np.e
+        b[np.arange(1000) == 960] = np.e
+        leftover, stats = b[900:], b.zonemap(9)
+        assert_allclose(leftover, a[900:], rtol=2.**-12)
+        self.assertTrue(np.any(leftover != a[900:]))
+        self.assertEqual(stats, (leftover.min(), leftover.max(), 0))
+        # The values do not change once saved and compressed
+        b.flush()
+        if self.disk:
+            b = bcolz.open(rootdir=self.rootdir)
+        assert_array_equal(b[900:], leftover)
+        b.append(a[:100])
+        assert_array_equal(b[900:1000], leftover)
+        self.assertEqual(b.zonemap(9), stats)
+
+
+class trimbitsMemoryTest(trimbitsTest, TestCase):
+    disk = False
+
+
+class trimbitsDiskTest(trimbitsTest, TestCase):
+    disk = True
+
+
+class reductionsTest(MayBeDiskTest):
+
+    def check(self, a, ops=('min', 'max', 'argmin', 'argmax', 'mean',
+                            'var', 'std', 'any', 'all'), chunklen=100):
+        b = bcolz.carray(a, chunklen=chunklen, rootdir=self.rootdir,
+                         mode='w')
+        if self.disk:
+            b = bcolz.open(rootdir=self.rootdir)
+        for op in ops:
+            if a.dtype.kind == 'M':
+                self.assertEqual(getattr(b, op)(), getattr(a, op)(), op)
+            else:
+                assert_allclose(getattr(b, op)(), getattr(a, op)(),
+                                rtol=1e-10, err_msg=op)
+        self.assertEqual(b.count_nonzero(), np.count_nonzero(a))
+        return b
+
+    def test00(self):
+        """Testing reductions of numerical carrays"""
+        a = np.sin(np.arange(1234.)) * 100
+        b = self.check(a)
+        assert_allclose(b.var(ddof=1), a.var(ddof=1))
+        self.check(a.astype('i4'))
+        self.check(a > 50)
+        self.check(np.zeros(1234, dtype='u2'))
+        self.check(np.linspace(0, 1, 60).reshape(20, 3))
+
+    def test01(self):
+        """Testing reductions of constant and run chunks"""
+        a = np.repeat(np.arange(-5, 5), 130).astype('f8')
+        b = self.check(a, chunklen=300)
+        self.assertEqual(b.chunks[0].flags, 2)
+        a = np.full(1234, 3, dtype='i8')
+        a[-1] = 0
+        b = self.check(a)
+        self.assertEqual(b.chunks[0].flags, 1)
+        self.check(np.ones((400, 3)))
+
+    def test02(self):
+        """Testing reductions with NaNs and datetimes"""
+        a = np.arange(1234.)
+        a[[150, 1000]] = np.nan
+        b = self.check(a, ops=('min', 'max', 'argmin', 'argmax', 'mean'))
+        self.assertTrue(np.isnan(b.max()))
+        self.assertEqual(b.argmax(), 150)
+        d = np.arange(1234).astype('M8[s]')[::-1]
+        self.check(d, ops=('min', 'max', 'argmin', 'argmax'))
+
+    def test03(self):
+        """Testing reductions of non-valid carrays"""
+        b = bcolz.carray([], dtype='f8', rootdir=self.rootdir)
+        self.assertRaises(ValueError, b.min)
+        self.assertRaises(ValueError, b.argmax)
+        b = bcolz.carray(np.array(['a', 'b']), rootdir=self.rootdir,
+                         mode='w')
+        self.assertRaises(TypeError, b.max)
+        self.assertRaises(TypeError, b.mean)
+
+    def test04(self):
+        """Testing reductions with the chunks processed in parallel"""
+        a = np.sin(np.arange(1e5))
+        a[50000:60000] = 0
+        b = bcolz.carray(a, chunklen=1000, rootdir=self.rootdir)
+        b.append(a[:123])
+        ops = ('sum', 'min', 'max', 'argmin', 'argmax', 'mean', 'std',
+               'count_nonzero', 'any', 'all')
+        nthreads = bcolz.set_nthreads(1)
+        try:
+            serial = [getattr(b, op)() for op in ops]
+            bcolz.set_nthreads(4)
+            parallel = [getattr(b, op)() for op in ops]
+            self.assertTrue(bcolz.carray_ext._get_pool() is not None)
+        finally:
+            bcolz.set_nthreads(nthreads)
+        # Partial results are combined in order, so results are identical
+        self.assertEqual(parallel, serial)
+        a = np.concatenate((a, a[:123]))
+        assert_allclose(serial[0], a.sum())
+        self.assertEqual(serial[7], np.count_nonzero(a))
+
+
+class reductionsMemoryTest(reductionsTest, TestCase):
+    disk = False
+
+
+class reductionsDiskTest(reductionsTest, TestCase):
+    disk = True
+
+
+class specialChunksMemoryTest(specialChunksTest, TestCase):
+    disk = False
+
+
+class specialChunksFilesTest(specialChunksTest, TestCase):
+    disk = True
+    layout = 'files'
+
+
+class specialChunksSegmentsTest(specialChunksTest, TestCase):
+    disk = True
+    layout = 'segments'
+
+
+class chunkcacheTest(MayBeDiskTest, TestCase):
+    disk = True
+
+    def test00(self):
+        """Testing that several chunks are kept in the cache"""
+        a = np.arange(1e4)
+        b = bcolz.carray(a, chunklen=100, rootdir=self.rootdir)
+        b.chunkcache = cache = bcolz.chunkcache(2 ** 20)
+        # Alternate between chunks; only the first round should miss
+        for i in range(3):
+            for j in (150, 2550, 7050):
+                self.assertEqual(b[j], a[j])
+        self.assertEqual(cache.misses, 3)
+        self.assertTrue(cache.hits >= 6)
+        self.assertEqual(len(cache), 3)
+
+    def test01(self):
+        """Testing that the cache honors its budget"""
+        a = np.arange(1e4)
+        b = bcolz.carray(a, chunklen=100, rootdir=self.rootdir)
+        b.chunkcache = cache = bcolz.chunkcache(2 ** 20)
+        assert_array_equal(a[::100], [b[i] for i in range(0, len(a), 100)])
+        cbytes = cache.nbytes
+        self.assertEqual(len(cache), 100)
+        cache.maxbytes = cbytes // 2
+        self.assertTrue(cache.nbytes <= cbytes // 2)
+        self.assertTrue(0 < len(cache) < 100)
+        # The last chunk used is always kept
+        cache.maxbytes = 0
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(b[9850], a[9850])
+
+    def test02(self):
+        """Testing that modifications and free_cachemem() clear the cache"""
+        a = np.arange(1e4)
+        b = bcolz.carray(a, chunklen=100, rootdir=self.rootdir)
+        b.chunkcache = cache = bcolz.chunkcache(2 ** 20)
+        self.assertEqual(b[150], a[150])
+        b[150] = a[150] = -1
+        self.assertEqual(b[150], -1)
+        assert_array_equal(a, b[:], "Arrays are not equal")
+        self.assertTrue(len(cache) > 0)
+        b.free_cachemem()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.nbytes, 0)
+
+    def test03(self):
+        """Testing a cache shared between carrays"""
+        a = np.arange(1e4)
+        b = bcolz.carray(a, chunklen=100, rootdir=self.rootdir)
+        c = bcolz.carray(a * 2, chunklen=100,
+                         rootdir=self.rootdir + '_2')
+        try:
+            b.chunkcache = c.chunkcache = cache = bcolz.chunkcache(2 ** 20)
+            self.assertEqual(b[150], a[150])
+            self.assertEqual(c[150], a[150] * 2)
+            self.assertEqual(len(cache), 2)
+            c.free_cachemem()
+            self.assertEqual(len(cache), 1)
+            misses = cache.misses
+            self.assertEqual(b[150], a[150])
+            self.assertEqual(cache.misses, misses)
+        finally:
+            shutil.rmtree(self.rootdir + '_2')
+
+    def test04(self):
+        """Testing that the default cache follows the defaults"""
+        b = bcolz.carray(np.arange(10), rootdir=self.rootdir)
+        self.assertTrue(isinstance(b.chunkcache, bcolz.chunkcache))
+        self.assertTrue(bcolz.carray(np.arange(10)).chunkcache is None)
+        oldsize = bcolz.defaults.chunk_cache_size
+        try:
+            bcolz.defaults.chunk_cache_size = 1234
+            self.assertEqual(b.chunkcache.maxbytes, 1234)
+        finally:
+            bcolz.defaults.chunk_cache_size = oldsize
+        self.assertRaises(ValueError, setattr, bcolz.defaults,
+                          'chunk_cache_size', -1)
+
+
+class blockcacheTest(MayBeDiskTest):
+
+    def test00(self):
+        """Testing scattered scalar reads through the block cache"""
+        a = np.arange(1e5)
+        b = bcolz.carray(a, chunklen=10000, rootdir=self.rootdir)
+        idx = np.random.randint(0, len(a), 1000)
+        for i in range(3):
+            for j in idx:
+                self.assertEqual(b[j], a[j])
+        stats = b.blockcache_stats
+        self.assertEqual(stats['hits'] + stats['misses'], 3000)
+        self.assertTrue(stats['nbytes'] <= b.blockcache_size)
+
+    def test01(self):
+        """Testing that hot blocks are kept in the cache"""
+        a = np.arange(1e5)
+        b = bcolz.carray(a, chunklen=10000, rootdir=self.rootdir)
+        # Alternate between two distant positions
+        for i in range(10):
+            self.assertEqual(b[10], a[10])
+            self.assertEqual(b[50010], a[50010])
+        stats = b.blockcache_stats
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['hits'], 18)
+        self.assertTrue(stats['nblocks'] > 1)
+
+    def test02(self):
+        """Testing a block cache smaller than a block"""
+        a = np.arange(1e5)
+        b = bcolz.carray(a, chunklen=10000, rootdir=self.rootdir)
+        b.blockcache_size = 0
+        for i in range(3):
+            self.assertEqual(b[10], a[10])
+            self.assertEqual(b[50010], a[50010])
+        self.assertEqual(b.blockcache_stats['nblocks'], 1)
+        self.assertRaises(ValueError, setattr, b, 'blockcache_size', -1)
+
+    def test03(self):
+        """Testing that modifications invalidate the block cache"""
+        a = np.arange(1e5)
+        b = bcolz.carray(a, chunklen=10000, rootdir=self.rootdir)
+        self.assertEqual(b[10], a[10])
+        self.assertEqual(b[50010], a[50010])
+        b[10] = a[10] = -1
+        b[50010] = a[50010] = -2
+        self.assertEqual(b[10], a[10])
+        self.assertEqual(b[50010], a[50010])
+        # Replace the tail with different data
+        b.trim(60000)
+        b.append(a[40000:] * 2)
+        a[40000:] *= 2
+        self.assertEqual(b[50010], a[50010])
+        b.free_cachemem()
+        self.assertEqual(b.blockcache_stats['nbytes'], 0)
+        self.assertEqual(b[50010], a[50010])
+
+
+class blockcacheMemoryTest(blockcacheTest, TestCase):
+    disk = False
+
+
+class blockcacheDiskTest(blockcacheTest, TestCase):
+    disk = True
+
+
+class sortTest(MayBeDiskTest):
+
+    def setUp(self):
+        MayBeDiskTest.setUp(self)
+        self.memsize = bcolz.defaults.sort_memsize
+
+    def tearDown(self):
+        bcolz.defaults.sort_memsize = self.memsize
+        MayBeDiskTest.tearDown(self)
+
+    def check(self, a, **kwargs):
+        b = bcolz.carray(a, chunklen=1000)
+        s = b.sort(rootdir=self.rootdir, mode="w", **kwargs)
+        if self.disk:
+            s = bcolz.open(rootdir=self.rootdir)
+        assert_array_equal(s[:], np.sort(a))
+        i = b.argsort()
+        self.assertEqual(i.dtype, np.dtype(np.int64))
+        assert_array_equal(i[:], np.argsort(a, kind='mergesort'))
+
+    def test00(self):
+        """Testing sort() and argsort() in memory"""
+        a = np.random.RandomState(0).randint(0, 100, 10000)
+        self.check(a)
+        self.check(np.array([3., np.nan, -1., 0.]))
+        self.check(np.array([], dtype='i4'))
+
+    def test01(self):
+        """Testing sort() and argsort() merging runs from disk"""
+        a = np.random.RandomState(0).rand(10000)
+        a[::7] = np.nan
+        a[1::7] = 0.5
+        bcolz.defaults.sort_memsize = 10000
+        self.check(a)
+        self.check(a.astype('f4'), cparams=bcolz.cparams(clevel=9))
+
+    def test02(self):
+        """Testing sort() merging runs in several passes"""
+        a = np.random.RandomState(0).randint(0, 100, 2000).astype('i2')
+        bcolz.defaults.sort_memsize = 400
+        fanin = bcolz.sorting.MAX_FANIN
+        bcolz.sorting.MAX_FANIN = 4
+        try:
+            self.check(a)
+        finally:
+            bcolz.sorting.MAX_FANIN = fanin
+
+    def test03(self):
+        """Testing sort() of strings"""
+        a = np.array([b'%d' % (i * 7 % 101) for i in xrange(1000)])
+        bcolz.defaults.sort_memsize = 500
+        self.check(a)
+        b = bcolz.zeros((10, 2))
+        self.assertRaises(TypeError, b.sort)
+
+
+class sortMemoryTest(sortTest, TestCase):
+    disk = False
+
+
+class sortDiskTest(sortTest, TestCase):
+    disk = True
+
+
+class takeTest(MayBeDiskTest):
+
+    def test00(self):
+        """Testing `take()` with unordered and repeated indices"""
+        a = np.arange(10000.)
+        a[2000:5000] = 3.
+        b = bcolz.carray(a, chunklen=1000, rootdir=self.rootdir)
+        idx = np.random.RandomState(0).randint(-len(a), len(a), 3000)
+        assert_array_equal(b.take(idx), a.take(idx))
+        assert_array_equal(b[idx], a[idx])
+        idx = np.sort(idx % len(a))
+        assert_array_equal(b.take(idx), a.take(idx))
+        idx = np.array([[9999, 0], [5, 5]])
+        assert_array_equal(b.take(idx), a[idx])
+        self.assertEqual(b.take([]).dtype, a.dtype)
+        self.assertEqual(len(b.take([])), 0)
+        self.assertRaises(IndexError, b.take, [3, 10000])
+        self.assertRaises(IndexError, b.take, [-10001])
+
+    def test01(self):
+        """Testing `take()` with multidimensional and object carrays"""
+        a = np.arange(3000).reshape(1000, 3)
+        b = bcolz.carray(a, chunklen=100, rootdir=self.rootdir)
+        idx = [999, 3, 450, 3, 0]
+        assert_array_equal(b.take(idx), a[idx])
+        a = np.array(['a', None, 2] * 100, dtype=object)
+        b = bcolz.carray(a, chunklen=10)
+        idx = [299, 3, 45, 3, 0]
+        self.assertEqual(b.take(idx).tolist(), a[idx].tolist())
+
+
+class takeMemoryTest(takeTest, TestCase):
+    disk = False
+
+
+class takeDiskTest(takeTest, TestCase):
+    disk = True
+
+
+class zonemapsTest(MayBeDiskTest):
+
+    def test00(self):
+        """Testing the statistics of chunks"""
+        a = np.arange(1e4)
+        b = bcolz.carray(a, chunklen=1000, rootdir=self.rootdir)
+        b.append(a[:123])
+        stats = b.chunk_stats()
+        self.assertEqual(len(stats), 11)
+        assert_array_equal(stats['min'][:10], a[::1000])
+        assert_array_equal(stats['max'][:10], a[999::1000])
+        self.assertEqual(tuple(stats[10]), (0, 122, 0, 123))
+        self.assertEqual(stats['count'].sum(), len(b))
+        self.assertEqual(b.zonemap(3), (3000, 3999, 0))
+
+    def test01(self):
+        """Testing the statistics of chunks with NaNs"""
+        a = np.arange(1e4)
+        a[1500:1600] = np.nan
+        a[2000:3000] = np.nan
+        b = bcolz.carray(a, chunklen=1000, rootdir=self.rootdir)
+        stats = b.chunk_stats()
+        self.assertEqual(tuple(stats[1])[:3], (1000, 1999, 100))
+        self.assertEqual(stats[2]['nnull'], 1000)
+        self.assertTrue(np.isnan(stats[2]['min']))
+
+    def test02(self):
+        """Testing that modifications update the statistics"""
+        a = np.arange(1e4)
+        b = bcolz.carray(a, chunklen=1000, rootdir=self.rootdir)
+        b[1500] = -1
+        b.trim(3500)
+        b.append([1e6] * 2000)
+        b.flush()
+        self.assertEqual(b.zonemap(1), (-1, 1999, 0))
+        self.assertEqual(b.zonemap(6), (6000, 1e6, 0))
+        if self.rootdir:
+            b = bcolz.open(rootdir=self.rootdir)
+            self.assertEqual(b.zonemap(1), (-1, 1999, 0))
+            self.assertEqual(b.zonemap(6), (6000, 1e6, 0))
+
+    def test03(self):
+        """Testing the statistics of datetime chunks"""
+        a = np.arange(100).astype('M8[s]')
+        a[10] = np.datetime64('NaT')
+        b = bcolz.carray(a, chunklen=50, rootdir=self.rootdir)
+        stats = b.chunk_stats()
+        self.assertEqual(stats[0]['min'], a[0])
+        self.assertEqual(stats[0]['nnull'], 1)
+        self.assertEqual(stats[1]['max'], a[99])
+
+    def test04(self):
+        """Testing statistics for non-supported types"""
+        b = bcolz.carray(['a', 'b'], rootdir=self.rootdir)
+        self.assertRaises(TypeError, b.chunk_stats)
+
+
+class zonemapsMemoryTest(zonemapsTest, TestCase):
+    disk = False
+
+
+class zonemapsDiskTest(zonemapsTest, TestCase):
+    disk = True
+
+    def test05(self):
+        """Testing statistics not saved on disk"""
+        a = np.arange(1e4)
+        b = bcolz.carray(a, chunklen=1000, rootdir=self.rootdir)
+        os.remove(os.path.join(self.rootdir, 'meta', 'zonemaps'))
+        b = bcolz.open(rootdir=self.rootdir, mode='r')
+        self.assertEqual(b.zonemap(2), None)
+        self.assertEqual(b.zonemap(2, compute=True), (2000, 2999, 0))
+        assert_array_equal(b.chunk_stats()['max'], a[999::1000])
+
+    def test06(self):
+        """Testing that non-flushed modifications do not leave stale stats"""
+        a = np.arange(1e4)
+        b = bcolz.carray(a, chunklen=1000, rootdir=self.rootdir)
+        b[1500] = -1
+        b = bcolz.open(rootdir=self.rootdir, mode='r')
+        self.assertEqual(b.zonemap(1), None)
+        self.assertEqual(b.zonemap(2), None)
+
+
 class bloscCompressorsTest(MayBeDiskTest, TestCase):
 
     def tearDown(self):
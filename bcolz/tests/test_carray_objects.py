@@ -21,6 +21,7 @@ Notes on object handling:
 
 """
 
+import os
 import unittest
 from unittest import TestCase
 
@@ -138,6 +139,74 @@ class ObjectCarrayTest(MayBeDiskTest):
         self.assertEqual(b[0], 1)
 
 
+class ObjectBatchesTest(MayBeDiskTest):
+
+    def setUp(self):
+        MayBeDiskTest.setUp(self)
+        self.src = np.empty((1005,), dtype=np.dtype('O'))
+        self.src[:] = [('s' * (i % 13), i) for i in range(1005)]
+
+    def test00(self):
+        """Testing that objects are stored in batches of chunklen"""
+        carr = bcolz.carray(self.src, chunklen=100, rootdir=self.rootdir)
+        self.assertEqual(len(carr), 1005)
+        self.assertEqual(carr.nchunks, 10)
+        if self.disk:
+            datadir = os.path.join(self.rootdir, 'data')
+            self.assertEqual(len(os.listdir(datadir)), 11)
+            carr = bcolz.open(rootdir=self.rootdir)
+        self.assertEqual(len(carr), 1005)
+        for i in (0, 99, 100, 555, 1000, 1004, -1):
+            self.assertEqual(carr[i], self.src[i])
+        self.assertEqual(carr[3:1003:7].tolist(), self.src[3:1003:7].tolist())
+        self.assertEqual(list(carr), self.src.tolist())
+
+    def test01(self):
+        """Testing appending objects in batches"""
+        carr = bcolz.carray(self.src[:10], chunklen=100, rootdir=self.rootdir)
+        carr.append(self.src[10:500])
+        carr.append(self.src[500:])
+        carr.flush()
+        if self.disk:
+            carr = bcolz.open(rootdir=self.rootdir, mode='a')
+        self.assertEqual(len(carr), 1005)
+        self.assertEqual(carr[:].tolist(), self.src.tolist())
+        carr.append(self.src[:5])
+        self.assertEqual(len(carr), 1010)
+        self.assertEqual(carr[-5:].tolist(), self.src[:5].tolist())
+
+    def test02(self):
+        """Testing trimming objects in batches"""
+        carr = bcolz.carray(self.src, chunklen=100, rootdir=self.rootdir)
+        carr.trim(110)
+        self.assertEqual(len(carr), 895)
+        if self.disk:
+            carr = bcolz.open(rootdir=self.rootdir, mode='a')
+        self.assertEqual(carr[:].tolist(), self.src[:895].tolist())
+        carr.append(self.src[895:])
+        self.assertEqual(carr[:].tolist(), self.src.tolist())
+
+    def test03(self):
+        """Testing objects in ctable columns"""
+        ra = np.empty((1005,), dtype='i4,O')
+        ra['f0'] = np.arange(1005)
+        ra['f1'] = self.src
+        t = bcolz.ctable(ra, chunklen=100, rootdir=self.rootdir)
+        if self.disk:
+            t = bcolz.open(rootdir=self.rootdir)
+        self.assertEqual(t[500]['f1'], self.src[500])
+        self.assertEqual(t['f1'][200:300].tolist(), self.src[200:300].tolist())
+        self.assertEqual([r.f1 for r in t.iter(995)], self.src[995:].tolist())
+
+
+class ObjectBatchesMemoryTest(ObjectBatchesTest, TestCase):
+    disk = False
+
+
+class ObjectBatchesDiskTest(ObjectBatchesTest, TestCase):
+    disk = True
+
+
 class ObjectCarraymemoryTest(ObjectCarrayTest, TestCase):
     disk = False
 
@@ -0,0 +1,163 @@
+########################################################################
+#
+#       License: BSD
+#       Created: October 18, 2026
+#
+########################################################################
+
+from __future__ import absolute_import
+
+import numpy as np
+from numpy.testing import assert_array_equal
+import bcolz
+from bcolz.tests.common import (
+    MayBeDiskTest, TestCase, unittest, skipUnless)
+from bcolz.py2help import xrange
+
+
+class catcarrayTest(MayBeDiskTest):
+
+    def setUp(self):
+        MayBeDiskTest.setUp(self)
+        countries = [u'ES', u'FR', None, u'US', u'DE', u'US']
+        self.vals = np.array([countries[i % 6] for i in xrange(1000)],
+                             dtype=object)
+
+    def test00(self):
+        """Testing catcarray creation and indexing"""
+        c = bcolz.catcarray(self.vals, chunklen=100, rootdir=self.rootdir)
+        if self.disk:
+            c = bcolz.open(rootdir=self.rootdir)
+            self.assertTrue(isinstance(c, bcolz.catcarray))
+        self.assertEqual(len(c), len(self.vals))
+        self.assertEqual(c.kind, 'U')
+        self.assertEqual(c.dtype, np.dtype('O'))
+        self.assertEqual(c.codes.dtype, np.dtype(np.int8))
+        self.assertEqual(c.categories, [u'ES', u'FR', u'US', u'DE'])
+        self.assertEqual(c.codes[:6].tolist(), [0, 1, -1, 2, 3, 2])
+        for i in (0, 2, 99, 100, 999, -1):
+            self.assertEqual(c[i], self.vals[i])
+        assert_array_equal(c[:], self.vals)
+        assert_array_equal(c[3:900:7], self.vals[3:900:7])
+        assert_array_equal(c[[5, 999, 0, 5]], self.vals[[5, 999, 0, 5]])
+        self.assertEqual(list(c.iter(10, 900, 3, limit=5, skip=2)),
+                         self.vals[10:900:3][2:7].tolist())
+        mask = np.arange(len(self.vals)) % 7 == 0
+        self.assertEqual(list(c.where(mask)), self.vals[mask].tolist())
+
+    def test01(self):
+        """Testing appending new categories to a catcarray"""
+        c = bcolz.catcarray(self.vals, rootdir=self.rootdir)
+        new = [u'c%d' % i for i in xrange(200)]
+        c.append(new)
+        c.append(u'US')
+        c.flush()
+        if self.disk:
+            c = bcolz.open(rootdir=self.rootdir)
+        # The codes have been widened for the new categories
+        self.assertEqual(c.codes.dtype, np.dtype(np.int16))
+        self.assertEqual(len(c.categories), 204)
+        self.assertEqual(len(c), len(self.vals) + 201)
+        assert_array_equal(c[:len(self.vals)], self.vals)
+        self.assertEqual(c[len(self.vals):-1].tolist(), new)
+        self.assertEqual(c[-1], u'US')
+
+    def test02(self):
+        """Testing trimming and resizing a catcarray"""
+        c = bcolz.catcarray(self.vals, rootdir=self.rootdir)
+        c.trim(10)
+        c.resize(995)
+        if self.disk:
+            c = bcolz.open(rootdir=self.rootdir)
+        assert_array_equal(c[:990], self.vals[:990])
+        self.assertEqual(c[990:].tolist(), [None] * 5)
+
+    def test03(self):
+        """Testing catcarray.fromcodes() and isin()"""
+        c = bcolz.catcarray.fromcodes([1, 0, -1, 1], [b'a', b'b'],
+                                      rootdir=self.rootdir)
+        self.assertEqual(c.kind, 'S')
+        self.assertEqual(c[:].tolist(), [b'b', b'a', None, b'b'])
+        self.assertEqual(c.isin([b'b', b'z'])[:].tolist(),
+                         [True, False, False, True])
+        # Unicode values are looked up as bytes
+        self.assertEqual(c.isin(u'a')[:].tolist(),
+                         [False, True, False, False])
+        self.assertRaises(ValueError, bcolz.catcarray.fromcodes,
+                          [0, 2], [b'a', b'b'])
+        self.assertRaises(ValueError, bcolz.catcarray, [],
+                          categories=[b'a', b'a'])
+        self.assertRaises(TypeError, c.append, 3)
+
+    def test04(self):
+        """Testing queries on catcarray columns"""
+        c = bcolz.catcarray(self.vals, chunklen=100)
+        t = bcolz.ctable([c, np.arange(len(c))], names=['c', 'i'],
+                         rootdir=self.rootdir)
+        if self.disk:
+            t = bcolz.open(rootdir=self.rootdir)
+            self.assertTrue(isinstance(t['c'], bcolz.catcarray))
+        vals = self.vals
+        isnone = np.array([v is None for v in vals])
+        i = np.arange(len(vals))
+        self.assertEqual(t.eval("c == 'US'")[:].tolist(),
+                         (vals == u'US').tolist())
+        self.assertEqual(t.eval("'US' != c")[:].tolist(),
+                         (vals != u'US').tolist())
+        self.assertEqual(t.eval("c in ('FR', 'DE', 'XX')")[:].tolist(),
+                         ((vals == u'FR') | (vals == u'DE')).tolist())
+        self.assertEqual(t.eval("c not in ['FR', 'DE']")[:].tolist(),
+                         ((vals != u'FR') & (vals != u'DE')).tolist())
+        self.assertEqual(t.eval("c == 'XX'")[:].sum(), 0)
+        self.assertEqual(t.eval("(c == b'ES') & (i > 500)")[:].tolist(),
+                         ((vals == u'ES') & (i > 500)).tolist())
+        self.assertEqual([r.i for r in t.where("c != 'US'", limit=3)],
+                         [0, 1, 2])
+        # Other uses of the column work on its decoded values
+        self.assertEqual(t.eval("c == None", vm="python")[:].tolist(),
+                         isnone.tolist())
+
+    def test05(self):
+        """Testing comparisons on codes with user variables"""
+        c = bcolz.catcarray(self.vals, rootdir=self.rootdir)
+        wanted = [u'ES', u'US']
+        result = bcolz.eval("c in wanted", user_dict={'c': c,
+                                                      'wanted': wanted})
+        self.assertEqual(result[:].tolist(),
+                         ((self.vals == u'ES') |
+                          (self.vals == u'US')).tolist())
+
+    @skipUnless(bcolz.pandas_here, "pandas not here")
+    def test06(self):
+        """Testing catcarrays from/to pandas categoricals"""
+        import pandas as pd
+        df = pd.DataFrame({'c': pd.Categorical(self.vals),
+                           'i': np.arange(len(self.vals))})
+        t = bcolz.ctable.fromdataframe(df, rootdir=self.rootdir)
+        c = t['c']
+        self.assertTrue(isinstance(c, bcolz.catcarray))
+        self.assertEqual(c.categories, list(df['c'].cat.categories))
+        df2 = t.todataframe()
+        self.assertEqual(df2['c'].dtype.name, 'category')
+        assert_array_equal(df2['c'].cat.codes.values, c.codes[:])
+        self.assertEqual(df2['c'].isnull().sum(), 167)
+
+
+class catcarrayMemoryTest(catcarrayTest, TestCase):
+    disk = False
+
+
+class catcarrayDiskTest(catcarrayTest, TestCase):
+    disk = True
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
+
+
+# Local Variables:
+# mode: python
+# py-indent-offset: 4
+# tab-width: 4
+# fill-column: 72
+# End:
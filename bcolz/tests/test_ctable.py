@@ -223,6 +223,121 @@ class persistentTest(MayBeDiskTest, TestCase):
         ra = np.rec.fromarrays([a[:], b[:]]).view(np.ndarray)
         assert_array_equal(t[:], ra, "ctable values are not correct")
 
+    def test02(self):
+        """Testing ctable with the 'segments' layout"""
+        N = 10000
+        ra = np.fromiter(((i, i * 2.) for i in xrange(N)), dtype='i4,f8')
+        t = bcolz.ctable(ra, rootdir=self.rootdir, chunklen=1000,
+                         layout='segments')
+        t.append(ra)
+        t.flush()
+        t = bcolz.open(rootdir=self.rootdir, mode='r')
+        for name in t.names:
+            self.assertEqual(t[name].layout, 'segments')
+        assert_array_equal(t[:], np.concatenate((ra, ra)),
+                           "ctable values are not correct")
+
+    def test03(self):
+        """Testing the statistics of chunks in ctable columns"""
+        N = 10000
+        ra = np.fromiter(((i, i * 2.) for i in xrange(N)), dtype='i4,f8')
+        t = bcolz.ctable(ra, chunklen=1000, rootdir=self.rootdir)
+        t = bcolz.open(rootdir=self.rootdir)
+        stats = t.chunk_stats('f1')
+        assert_array_equal(stats['min'], ra['f1'][::1000])
+        assert_array_equal(stats['max'], ra['f1'][999::1000])
+
+    def test04(self):
+        """Testing that columns are opened lazily"""
+        N = 10000
+        ra = np.fromiter(((i, i * 2., i * 3) for i in xrange(N)),
+                         dtype='i4,f8,(2,)i8')
+        t = bcolz.ctable(ra, rootdir=self.rootdir)
+        t = bcolz.open(rootdir=self.rootdir, mode='a')
+        self.assertEqual(t.cols.opened(), [])
+        self.assertEqual(len(t), N)
+        self.assertEqual(t.dtype, ra.dtype)
+        self.assertEqual(t.names, ['f0', 'f1', 'f2'])
+        self.assertEqual(t.eval('f1 > 10').sum(), N - 6)
+        self.assertEqual([name for name, col in t.cols.opened()], ['f1'])
+        # Appending opens all the columns, and flush updates the manifest
+        t.append(ra[:10])
+        t.flush()
+        t = bcolz.open(rootdir=self.rootdir, mode='r')
+        self.assertEqual(len(t), N + 10)
+        assert_array_equal(t[:], np.concatenate((ra, ra[:10])),
+                           "ctable values are not correct")
+
+    def test05(self):
+        """Testing opening a ctable with a manifest of previous versions"""
+        N = 1000
+        ra = np.fromiter(((i, i * 2.) for i in xrange(N)), dtype='i4,f8')
+        t = bcolz.ctable(ra, rootdir=self.rootdir)
+        # Write the manifest like previous versions did
+        rootsfile = os.path.join(self.rootdir, '__rootdirs__')
+        with open(rootsfile, 'wb') as rfile:
+            rfile.write(b'{"names": ["f0", "f1"]}\n')
+        t = bcolz.open(rootdir=self.rootdir, mode='r')
+        self.assertEqual(t.cols.opened(), [])
+        self.assertEqual(len(t), N)
+        self.assertEqual(t.dtype, ra.dtype)
+        assert_array_equal(t[:], ra, "ctable values are not correct")
+
+    def test06(self):
+        """Testing that the manifest is enough for opening a ctable"""
+        N = 10000
+        ra = np.fromiter(((i, i * 2.) for i in xrange(N)), dtype='i4,f8')
+        t = bcolz.ctable(ra, rootdir=self.rootdir, chunklen=1000,
+                         cparams=bcolz.cparams(clevel=9))
+        nbytes, cbytes = t.nbytes, t.cbytes
+        # The per-column meta files are not needed anymore
+        for name in t.names:
+            for meta in ('sizes', 'storage'):
+                os.remove(os.path.join(self.rootdir, name, 'meta', meta))
+        t = bcolz.open(rootdir=self.rootdir, mode='r')
+        self.assertEqual((t.nbytes, t.cbytes), (nbytes, cbytes))
+        self.assertEqual(t.cols.opened(), [])
+        self.assertEqual(t['f1'].chunklen, 1000)
+        self.assertEqual(t['f1'].cparams.clevel, 9)
+        assert_array_equal(t[:], ra, "ctable values are not correct")
+        self.assertFalse(
+            os.path.exists(os.path.join(self.rootdir, '__rootdirs__.tmp')))
+
+    def test07(self):
+        """Testing that the manifest follows trims and resizes"""
+        N = 1000
+        ra = np.fromiter(((i, i * 2.) for i in xrange(N)), dtype='i4,f8')
+        t = bcolz.ctable(ra, rootdir=self.rootdir)
+        t.trim(10)
+        t = bcolz.open(rootdir=self.rootdir, mode='a')
+        self.assertEqual(len(t), N - 10)
+        t.resize(N + 10)
+        t = bcolz.open(rootdir=self.rootdir, mode='r')
+        self.assertEqual(len(t), N + 10)
+        assert_array_equal(t[:N - 10], ra[:N - 10],
+                           "ctable values are not correct")
+
+    def test08(self):
+        """Testing that columns modified directly do not trust the manifest"""
+        N = 15
+        ra = np.fromiter(((i, i * 2.) for i in xrange(N)), dtype='i4,f8')
+        t = bcolz.ctable(ra, rootdir=self.rootdir)
+        # Append to a column behind the back of the ctable
+        col = bcolz.open(rootdir=os.path.join(self.rootdir, 'f0'), mode='a')
+        col.append(np.arange(100, dtype='i4'))
+        col.flush()
+        t = bcolz.open(rootdir=self.rootdir, mode='r')
+        self.assertEqual(len(t['f0']), N + 100)
+        self.assertEqual(t.cols.coltype('f0')[1], (N + 100,))
+        assert_array_equal(t['f0'][N:], np.arange(100, dtype='i4'))
+        self.assertEqual(len(t['f1']), N)
+        # A rewrite right away is seen too (no matter the mtime resolution)
+        col.append(np.array([-1], dtype='i4'))
+        col.flush()
+        t = bcolz.open(rootdir=self.rootdir, mode='r')
+        self.assertEqual(len(t['f0']), N + 101)
+        self.assertEqual(t['f0'][-1], -1)
+
 
 class add_del_colTest(MayBeDiskTest):
 
@@ -1435,6 +1550,16 @@ class iterblocksTest(MayBeDiskTest):
         slen = min(N, 3 * blen + 2)
         self.assertEqual(s, (np.arange(blen - 1, slen) * 3).sum())
 
+    def test04(self):
+        """Testing `iterblocks` method with prefetching"""
+        N, blen = self.N, 100
+        ra = np.fromiter(((i, i * 2., i * 3)
+                          for i in xrange(N)), dtype='i4,f8,i8')
+        t = bcolz.ctable(ra, rootdir=self.rootdir)
+        blocks = list(bcolz.iterblocks(t, blen, prefetch=2))
+        assert_array_equal(np.concatenate(blocks), ra)
+        self.assertEqual(list(t.iter(prefetch=2)), list(t.iter()))
+
 
 class small_iterblocksMemoryTest(iterblocksTest, TestCase):
     N = 100
@@ -1848,6 +1973,354 @@ class where_largeDiskTest(whereTest, TestCase):
 
 
 # This test goes here until a new test_toplevel.py would be created
+class reductionsTest(MayBeDiskTest):
+
+    def test00(self):
+        """Testing column-wise reductions"""
+        N = 1000
+        ra = np.fromiter(((i, i * 2., i % 3 == 0) for i in xrange(N)),
+                         dtype='i4,f8,b1')
+        t = bcolz.ctable(ra, chunklen=100, rootdir=self.rootdir)
+        if self.disk:
+            t = bcolz.open(rootdir=self.rootdir)
+        for op in ('sum', 'min', 'max', 'argmin', 'argmax', 'mean', 'std',
+                   'any', 'all'):
+            r = getattr(t, op)()
+            self.assertEqual(r.dtype.names, ('f0', 'f1', 'f2'))
+            for name in r.dtype.names:
+                assert_allclose(r[name], getattr(ra[name], op)(),
+                                err_msg=op)
+        r = t.var('f1', ddof=1)
+        assert_allclose(r['f1'], ra['f1'].var(ddof=1))
+        self.assertEqual(t.count_nonzero(['f0', 'f2']).tolist(),
+                         (N - 1, 334))
+        self.assertRaises(ValueError, t.min, 'f0 foo')
+
+
+class reductionsMemoryTest(reductionsTest, TestCase):
+    disk = False
+
+
+class reductionsDiskTest(reductionsTest, TestCase):
+    disk = True
+
+
+class groupbyTest(MayBeDiskTest):
+
+    def setUp(self):
+        MayBeDiskTest.setUp(self)
+        N = 10000
+        self.k = np.arange(N) * 7 % 113
+        self.f = np.arange(N) * .5
+        self.f[::11] = np.nan
+        self.i = np.arange(N, dtype=np.int32)
+        self.memsize = bcolz.defaults.groupby_memsize
+
+    def tearDown(self):
+        bcolz.defaults.groupby_memsize = self.memsize
+        MayBeDiskTest.tearDown(self)
+
+    def check(self, t, **kwargs):
+        r = t.groupby('k', [('f', 'sum'), ('f', 'count'), ('f', 'min'),
+                            ('f', 'max'), ('f', 'mean'),
+                            ('i', 'count', 'n'), ('i', 'max')], **kwargs)
+        self.assertEqual(r.names, ['k', 'f_sum', 'f_count', 'f_min',
+                                   'f_max', 'f_mean', 'n', 'i_max'])
+        self.assertEqual(r['i_max'].dtype, np.dtype(np.int32))
+        ra = r[:]
+        ra.sort(order='k')
+        keys = np.unique(self.k)
+        assert_array_equal(ra['k'], keys)
+        for name, op in (('f_sum', np.nansum), ('f_min', np.nanmin),
+                         ('f_max', np.nanmax), ('f_mean', np.nanmean)):
+            assert_allclose(ra[name], [op(self.f[self.k == key])
+                                       for key in keys], err_msg=name)
+        assert_array_equal(ra['f_count'], [
+            np.isfinite(self.f[self.k == key]).sum() for key in keys])
+        assert_array_equal(ra['n'], np.bincount(self.k))
+        assert_array_equal(ra['i_max'], [
+            self.i[self.k == key].max() for key in keys])
+        return r
+
+    def test00(self):
+        """Testing groupby() with numerical keys"""
+        t = bcolz.ctable([self.k, self.f, self.i], names=['k', 'f', 'i'],
+                         chunklen=1000, rootdir=self.rootdir)
+        if self.disk:
+            t = bcolz.open(rootdir=self.rootdir)
+        r = self.check(t)
+        # Without spilling, the groups come out sorted
+        assert_array_equal(r['k'][:], np.unique(self.k))
+
+    def test01(self):
+        """Testing groupby() spilling partial aggregates to disk"""
+        t = bcolz.ctable([self.k, self.f, self.i], names=['k', 'f', 'i'],
+                         chunklen=1000)
+        bcolz.defaults.groupby_memsize = 1000
+        r = self.check(t, blen=500, rootdir=self.rootdir)
+        if self.disk:
+            r2 = bcolz.open(rootdir=self.rootdir)
+            self.assertEqual(r2[:].tolist(), r[:].tolist())
+
+    def test02(self):
+        """Testing groupby() with several keys and string columns"""
+        names = np.array(['a', 'b', None, 'c'], dtype=object)[self.k % 4]
+        d = self.i.astype('M8[D]')
+        d[::3] = np.datetime64('NaT')
+        t = bcolz.ctable([bcolz.catcarray(names), bcolz.vlcarray(
+            names.astype('U')), self.i % 2, d], names=['c', 's', 'k', 'd'],
+            rootdir=self.rootdir)
+        r = t.groupby(['c', 'k'], [('d', 'min'), ('s', 'count')])
+        self.assertTrue(isinstance(r['c'], bcolz.catcarray))
+        # Categorical keys come out in the order of their categories
+        self.assertEqual(t['c'].categories, [u'a', u'c', u'b'])
+        expected = []
+        for c in (u'a', u'c', u'b'):
+            for k in (0, 1):
+                mask = (names == c) & (self.i % 2 == k)
+                expected.append((c, k, d[mask][~np.isnat(d[mask])].min(),
+                                 mask.sum()))
+        self.assertEqual(r[:].tolist(), expected)
+        r = t.groupby('s', [('d', 'max')])
+        self.assertTrue(isinstance(r['s'], bcolz.vlcarray))
+        self.assertEqual(r['s'][:].tolist(), [u'None', u'a', u'b', u'c'])
+        self.assertEqual(r['d_max'][:].tolist(), [
+            d[(names == s) & ~np.isnat(d)].max()
+            for s in (None, u'a', u'b', u'c')])
+        self.assertRaises(ValueError, t.groupby, 'foo', [('k', 'sum')])
+        self.assertRaises(ValueError, t.groupby, 'k', [('d', 'median')])
+        self.assertRaises(TypeError, t.groupby, 'k', [('s', 'sum')])
+
+    def test03(self):
+        """Testing that groupby() re-partitions too large partitions"""
+        from bcolz.groupby import _aggregator
+        k = np.arange(3000) * 7 % 601
+        t = bcolz.ctable([k, k * .5], names=['k', 'f'], chunklen=1000)
+        # Room for 20 states of (k, sum, count), while every partition
+        # gets about 601 / 16 groups
+        maxstates = 20
+        bcolz.defaults.groupby_memsize = maxstates * 24
+        sizes = []
+        combine = _aggregator.combine
+
+        def tracked_combine(self, state):
+            sizes.append(len(state))
+            return combine(self, state)
+        _aggregator.combine = tracked_combine
+        try:
+            r = t.groupby('k', [('f', 'sum'), ('f', 'count')], blen=100,
+                          rootdir=self.rootdir)
+        finally:
+            _aggregator.combine = combine
+        self.assertTrue(max(sizes) <= maxstates + 100, max(sizes))
+        ra = r[:]
+        ra.sort(order='k')
+        assert_array_equal(ra['k'], np.arange(601))
+        assert_array_equal(ra['f_count'], np.bincount(k))
+        assert_allclose(ra['f_sum'], np.bincount(k, weights=k * .5))
+
+
+class groupbyMemoryTest(groupbyTest, TestCase):
+    disk = False
+
+
+class groupbyDiskTest(groupbyTest, TestCase):
+    disk = True
+
+
+class sortbyTest(MayBeDiskTest):
+
+    def setUp(self):
+        MayBeDiskTest.setUp(self)
+        self.memsize = bcolz.defaults.sort_memsize
+
+    def tearDown(self):
+        bcolz.defaults.sort_memsize = self.memsize
+        MayBeDiskTest.tearDown(self)
+
+    def test00(self):
+        """Testing sort_by() with several keys"""
+        N = 3000
+        rs = np.random.RandomState(0)
+        k = rs.randint(0, 5, N)
+        f = rs.rand(N).round(1)
+        f[::13] = np.nan
+        names = np.array(['a', None, 'b'], dtype=object)[rs.randint(0, 3, N)]
+        t = bcolz.ctable([k, f, bcolz.catcarray(names),
+                          bcolz.vlcarray(names.astype('U')), np.arange(N)],
+                         names=['k', 'f', 'c', 's', 'i'], chunklen=500)
+        for memsize in (self.memsize, 20000):
+            bcolz.defaults.sort_memsize = memsize
+            r = t.sort_by('k, f', rootdir=self.rootdir, mode='w')
+            if self.disk:
+                r = bcolz.open(rootdir=self.rootdir)
+            self.assertEqual(r.names, t.names)
+            self.assertTrue(isinstance(r['c'], bcolz.catcarray))
+            order = np.lexsort((f, k))
+            assert_array_equal(r['i'][:], order)
+            assert_array_equal(r['f'][:], f[order])
+            self.assertEqual(r['c'][:].tolist(), names[order].tolist())
+            self.assertEqual(r['s'][:].tolist(),
+                             names.astype('U')[order].tolist())
+            # Categorical columns sort by code and vlcarrays by value
+            r = t.sort_by(['c'])
+            assert_array_equal(r['i'][:], np.argsort(
+                t['c'].codes[:], kind='mergesort'))
+            r = t.sort_by('s')
+            assert_array_equal(r['i'][:], np.argsort(
+                names.astype('U'), kind='mergesort'))
+        self.assertRaises(ValueError, t.sort_by, 'foo')
+
+
+class sortbyMemoryTest(sortbyTest, TestCase):
+    disk = False
+
+
+class sortbyDiskTest(sortbyTest, TestCase):
+    disk = True
+
+
+class indexTest(MayBeDiskTest):
+
+    def setUp(self):
+        MayBeDiskTest.setUp(self)
+        N = 10000
+        rs = np.random.RandomState(0)
+        self.ids = rs.permutation(N) * 2
+        self.x = rs.rand(N).round(2)
+        self.x[::17] = np.nan
+        self.s = np.array([b'k%d' % (i % 50) for i in xrange(N)])
+        self.t = bcolz.ctable([self.ids, self.x, self.s, np.arange(N)],
+                              names=['id', 'x', 's', 'i'], chunklen=1000,
+                              rootdir=self.rootdir)
+
+    def check(self, t, expression, mask):
+        self.assertEqual(t[expression]['i'].tolist(),
+                         np.flatnonzero(mask).tolist())
+        self.assertEqual([r.nrow__ for r in t.where(
+            expression, outcols='nrow__', skip=1, limit=5)],
+            np.flatnonzero(mask)[1:6].tolist())
+
+    def test00(self):
+        """Testing queries resolved with a sorted index"""
+        t = self.t
+        index = t.create_index('id')
+        self.assertEqual(index.kind, 'sorted')
+        self.assertEqual(index.nrows, len(t))
+        if self.disk:
+            t = bcolz.open(rootdir=self.rootdir)
+        self.assertEqual(list(t.indexes), ['id'])
+        ids = self.ids
+        self.check(t, "id == 1234", ids == 1234)
+        self.check(t, "id == 1233", ids == 1233)
+        self.check(t, "(id >= 10) & (id < 30)", (ids >= 10) & (ids < 30))
+        self.check(t, "(300 > id) & (id > -5)", ids < 300)
+        self.check(t, "id <= 12.5", ids <= 12.5)
+        self.check(t, "(id < 200) & (i > 5000)",
+                   (ids < 200) & (np.arange(len(t)) > 5000))
+        self.check(t, "(id < 200) & (x > 0.5)", (ids < 200) & (self.x > 0.5))
+        self.check(t, "id > 100000", np.zeros(len(ids), dtype=bool))
+
+    def test01(self):
+        """Testing indexes on floats and strings"""
+        t = self.t
+        memsize = bcolz.defaults.sort_memsize
+        bcolz.defaults.sort_memsize = 20000
+        try:
+            t.create_index('x')
+            t.create_index('s')
+        finally:
+            bcolz.defaults.sort_memsize = memsize
+        if self.disk:
+            t = bcolz.open(rootdir=self.rootdir)
+        x, s = self.x, self.s
+        self.check(t, "x == 0.5", x == 0.5)
+        self.check(t, "(x > 0.99)", x > 0.99)
+        self.check(t, "x < 0.01", x < 0.01)
+        self.check(t, "s == 'k7'", s == b'k7')
+        self.check(t, "(s == b'k7') & (x >= 0.9)", (s == b'k7') & (x >= 0.9))
+        self.assertRaises(ValueError, t.create_index, 'foo')
+        self.assertRaises(ValueError, t.create_index, 'x', kind='foo')
+
+    def test02(self):
+        """Testing indexes when the ctable changes"""
+        t = self.t
+        t.create_index('id')
+        t.append((-3, 0.5, b'k0', len(t)))
+        t.flush()
+        if self.disk:
+            t = bcolz.open(rootdir=self.rootdir)
+        ids = np.append(self.ids, -3)
+        # The appended rows are scanned
+        self.assertFalse(t.indexes['id'].stale)
+        self.check(t, "id < 4", ids < 4)
+        t.trim(1)
+        self.assertFalse(t.indexes['id'].stale)
+        t.trim(1)
+        self.assertTrue(t.indexes['id'].stale)
+        ids = ids[:-2]
+        self.check(t, "id < 4", ids < 4)
+        t.create_index('id')
+        t[0] = (5, 0., b'', 0)
+        self.assertTrue(t.indexes['id'].stale)
+        if self.disk:
+            t = bcolz.open(rootdir=self.rootdir)
+            self.assertTrue(t.indexes['id'].stale)
+        ids[0] = 5
+        self.check(t, "id == 5", ids == 5)
+        t.delcol('id')
+        self.assertEqual(t.indexes, {})
+        self.assertRaises(ValueError, t.drop_index, 'id')
+
+    def test03(self):
+        """Testing queries resolved with bitmap indexes"""
+        t = self.t
+        chunklen = bcolz.indexes.BITMAP_CHUNKLEN
+        bcolz.indexes.BITMAP_CHUNKLEN = 1000
+        try:
+            index = t.create_index('s', kind='bitmap')
+            t.create_index('x', kind='bitmap')
+            self.assertEqual(index.kind, 'bitmap')
+            t.append((-3, 0.5, b'k3', len(t)))
+            t.flush()
+            if self.disk:
+                t = bcolz.open(rootdir=self.rootdir)
+            self.assertEqual(sorted(t.indexes), ['s', 'x'])
+            s, x = np.append(self.s, b'k3'), np.append(self.x, 0.5)
+            i = np.arange(len(t))
+            self.check(t, "s == 'k3'", s == b'k3')
+            self.check(t, "(s == 'k3') | (s == 'k10')",
+                       (s == b'k3') | (s == b'k10'))
+            self.check(t, "(s == 'k3') & ~(x < 0.5)",
+                       (s == b'k3') & ~(x < 0.5))
+            self.check(t, "(s >= 'k48') & (0.2 < x <= 0.3)",
+                       (s >= b'k48') & (x > 0.2) & (x <= 0.3))
+            self.check(t, "~((s < 'k2') | (x >= 0.1))",
+                       ~((s < b'k2') | (x >= 0.1)))
+            self.check(t, "(s == 'k3') & (i > 5000)",
+                       (s == b'k3') & (i > 5000))
+            self.check(t, "(s == 'foo') | (x == 2)", np.zeros(len(t), bool))
+        finally:
+            bcolz.indexes.BITMAP_CHUNKLEN = chunklen
+
+    def test04(self):
+        """Testing that bitmap indexes refuse many distinct values"""
+        t = self.t
+        self.assertRaises(ValueError, t.create_index, 'id', kind='bitmap')
+        self.assertEqual(t.indexes, {})
+        if self.disk:
+            self.assertEqual(os.listdir(
+                os.path.join(self.rootdir, bcolz.indexes.INDEXES_DIR)), [])
+
+
+class indexMemoryTest(indexTest, TestCase):
+    disk = False
+
+
+class indexDiskTest(indexTest, TestCase):
+    disk = True
+
+
 class walkTest(MayBeDiskTest, TestCase):
     disk = True
     ncas = 3  # the number of carrays per level
@@ -1940,6 +2413,29 @@ class conversionTest(TestCase):
         for key in ct.names:
             assert_allclose(ct2[key][:], ct[key][:])
 
+    @skipUnless(bcolz.pandas_here, "pandas not here")
+    def test00b(self):
+        """Testing queries and updates on string columns from pandas"""
+        import pandas as pd
+        N = 1000
+        df = pd.DataFrame({'s': ['a', 'bb', 'ccc'] * N,
+                           'i': np.arange(3 * N)}, columns=['s', 'i'])
+        ct = bcolz.ctable.fromdataframe(df)
+        self.assertEqual(ct['s'].dtype, np.dtype('S3'))
+        self.assertEqual([r.i for r in ct.where("s == b'bb'", limit=2)],
+                         [1, 4])
+        self.assertEqual(ct.eval("s == b'a'").sum(), N)
+        ct[1] = (b'zz', -1)
+        self.assertEqual((ct['s'][1], ct['i'][1]), (b'zz', -1))
+        self.assertEqual(ct.eval("s == b'bb'").sum(), N - 1)
+        # Unicode strings that do not fit in 'S' are kept as objects
+        df = pd.DataFrame({'s': [u'\xe9', u'a'] * N})
+        ct = bcolz.ctable.fromdataframe(df)
+        self.assertEqual(ct['s'].dtype, np.dtype(object))
+        self.assertEqual(ct['s'][:2].tolist(), [u'\xe9', u'a'])
+        self.assertRaises(ValueError, bcolz.ctable.fromdataframe, df,
+                          strings='bad')
+
     @skipUnless(bcolz.tables_here, "PyTables not here")
     def test01(self):
         """Testing roundtrips to a HDF5 file"""
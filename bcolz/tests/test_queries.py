@@ -10,6 +10,7 @@ from __future__ import absolute_import
 
 
 import numpy as np
+from numpy.testing import assert_array_equal
 import bcolz
 from bcolz.py2help import xrange
 from bcolz.tests.common import (
@@ -189,6 +190,45 @@ class whereblocksTest(MayBeDiskTest):
         self.assertEqual(l, N - M - 2)
         self.assertEqual(s, np.arange(M + 1, N - 1).sum())
 
+    def test08(self):
+        """Testing `whereblocks` method with 'nrow__' and fixed blocks"""
+        N = self.N
+        ra = np.fromiter(((i, i * 2., i % 3)
+                          for i in xrange(N)), dtype='i4,f8,i8')
+        t = bcolz.ctable(ra, chunklen=30, rootdir=self.rootdir)
+        nrows = np.flatnonzero(ra['f2'] != 1)
+        for skip, limit in ((0, None), (7, None), (5, 43), (N, None)):
+            selected = nrows[skip:None if limit is None else skip + limit]
+            blocks = list(t.whereblocks('f2 != 1', blen=16,
+                                        outfields=('nrow__', 'f1'),
+                                        skip=skip, limit=limit))
+            self.assertTrue(all(len(block) == 16 for block in blocks[:-1]))
+            self.assertTrue(len(blocks[-1]) < 16)
+            block = np.concatenate(blocks)
+            self.assertEqual(block.dtype.names, ('nrow__', 'f1'))
+            self.assertEqual(block['nrow__'].tolist(), selected.tolist())
+            self.assertEqual(block['f1'].tolist(), (selected * 2.).tolist())
+
+    def test09(self):
+        """Testing `where` method with `as_array`"""
+        N = self.N
+        ra = np.fromiter(((i, i * 2., i % 3)
+                          for i in xrange(N)), dtype='i4,f8,i8')
+        t = bcolz.ctable(ra, chunklen=30, rootdir=self.rootdir)
+        value = 1
+        result = t.where('f2 == value', as_array=True)
+        self.assertTrue(isinstance(result, np.ndarray))
+        assert_array_equal(result, ra[ra['f2'] == 1])
+        result = t.where(t.eval('f2 == 1'), outcols='f0, nrow__', skip=3,
+                         limit=10, as_array=True)
+        nrows = np.flatnonzero(ra['f2'] == 1)[3:13]
+        self.assertEqual(result.dtype.names, ('f0', 'nrow__'))
+        self.assertEqual(result['nrow__'].tolist(), nrows.tolist())
+        self.assertEqual(result['f0'].tolist(), nrows.tolist())
+        result = t.where('f2 > 5', as_array=True)
+        self.assertEqual(result.dtype, ra.dtype)
+        self.assertEqual(len(result), 0)
+
 
 class small_whereblocksTest(whereblocksTest, TestCase):
     N = 120
@@ -208,6 +248,92 @@ class big_whereblocksDiskTest(whereblocksTest, TestCase):
     disk = True
 
 
+class pushdownTest(MayBeDiskTest):
+
+    def setUp(self):
+        MayBeDiskTest.setUp(self)
+        N = self.N
+        self.ra = np.fromiter(((i, i * 2., i % 7) for i in xrange(N)),
+                              dtype='i4,f8,i8')
+        self.t = bcolz.ctable(self.ra, chunklen=100, rootdir=self.rootdir)
+
+    def test00(self):
+        """Testing `where` with predicates that can skip chunks"""
+        ra, t = self.ra, self.t
+        N = self.N
+        for expr, mask in [
+                ('f0 > 1234', ra['f0'] > 1234),
+                ('f0 <= 99', ra['f0'] <= 99),
+                ('(f0 >= 300) & (f0 < 3000)',
+                 (ra['f0'] >= 300) & (ra['f0'] < 3000)),
+                ('300 <= f0 < 3000', (300 <= ra['f0']) & (ra['f0'] < 3000)),
+                ('(f0 < 10) | (f1 > 2 * 10)',
+                 (ra['f0'] < 10) | (ra['f1'] > 20)),
+                ('~(f0 > 50)', ~(ra['f0'] > 50)),
+                ('f0 == 345', ra['f0'] == 345),
+                ('f0 != 345', ra['f0'] != 345),
+                ('(f0 > 150) & (f2 == 3)', (ra['f0'] > 150) & (ra['f2'] == 3)),
+                ('-1 < f0', ra['f0'] > -1),
+                ('f0 > %d' % N, ra['f0'] > N)]:
+            result = [r.f0 for r in t.where(expr)]
+            self.assertEqual(result, ra['f0'][mask].tolist(), expr)
+            self.assertTrue(
+                (t.eval(expr, out_flavor='numpy') == mask).all(), expr)
+
+    def test01(self):
+        """Testing `eval` with user variables in predicates"""
+        ra, t = self.ra, self.t
+        lim = 1000
+        result = t.eval('f0 < lim', out_flavor='numpy')
+        self.assertTrue((result == (ra['f0'] < lim)).all())
+
+    def test02(self):
+        """Testing the planning of predicates on chunk stats"""
+        from bcolz.chunked_eval import _plan, NONE, SOME, ALL
+        f0 = self.t['f0']
+        plan = _plan('(f0 >= 150) & (f0 < 400)', {'f0': f0}, len(f0))
+        self.assertEqual(plan.chunklen, 100)
+        self.assertEqual(plan.check(0, 100), NONE)
+        self.assertEqual(plan.check(100, 200), SOME)
+        self.assertEqual(plan.check(200, 400), ALL)
+        self.assertEqual(plan.check(400, 500), NONE)
+        # Non-boolean expressions are not planned
+        self.assertTrue(_plan('f0 + 1', {'f0': f0}, len(f0)) is None)
+        # Nor predicates that do not involve carrays
+        a = f0[:]
+        self.assertTrue(_plan('a > 1', {'a': a}, len(a)) is None)
+
+    def test03(self):
+        """Testing the planning of predicates on constant chunks"""
+        from bcolz.chunked_eval import _plan, NONE, ALL
+        z = bcolz.zeros(1000, dtype='i4', chunklen=100)
+        plan = _plan('z > 0', {'z': z}, len(z))
+        self.assertEqual(plan.check(0, 900), NONE)
+        plan = _plan('z == 0', {'z': z}, len(z))
+        self.assertEqual(plan.check(0, 900), ALL)
+        self.assertEqual(bcolz.eval('z == 0').sum(), 1000)
+
+    def test04(self):
+        """Testing predicates with NaN values"""
+        a = np.arange(1000, dtype='f8')
+        a[100:200] = np.nan
+        a[250] = np.nan
+        c = bcolz.carray(a, chunklen=100)
+        for expr, mask in [('c > 10', a > 10), ('c != 120', a != 120),
+                           ('c <= 300', a <= 300), ('~(c > 10)', ~(a > 10))]:
+            self.assertTrue(
+                (bcolz.eval(expr, out_flavor='numpy') == mask).all(), expr)
+
+
+class pushdownMemoryTest(pushdownTest, TestCase):
+    N = 10000
+
+
+class pushdownDiskTest(pushdownTest, TestCase):
+    N = 10000
+    disk = True
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
 
@@ -0,0 +1,172 @@
+########################################################################
+#
+#       License: BSD
+#       Created: October 18, 2026
+#
+########################################################################
+
+from __future__ import absolute_import
+
+import numpy as np
+from numpy.testing import assert_array_equal
+import bcolz
+from bcolz.tests.common import (
+    MayBeDiskTest, TestCase, unittest, skipUnless)
+from bcolz.py2help import xrange
+
+
+class vlcarrayTest(MayBeDiskTest):
+
+    def setUp(self):
+        MayBeDiskTest.setUp(self)
+        self.strs = np.array([u'x' * (i % 17) + u'\xe9%d' % i
+                              for i in xrange(1003)], dtype=object)
+
+    def test00(self):
+        """Testing vlcarray creation and indexing"""
+        vl = bcolz.vlcarray(self.strs, chunklen=100, rootdir=self.rootdir)
+        if self.disk:
+            vl = bcolz.open(rootdir=self.rootdir)
+            self.assertTrue(isinstance(vl, bcolz.vlcarray))
+        self.assertEqual(len(vl), len(self.strs))
+        self.assertEqual(vl.kind, 'U')
+        self.assertEqual(vl.dtype, np.dtype('O'))
+        for i in (0, 1, 99, 100, 555, 1002, -1, -1003):
+            self.assertEqual(vl[i], self.strs[i])
+        assert_array_equal(vl[:], self.strs)
+        assert_array_equal(vl[3:1000:7], self.strs[3:1000:7])
+        assert_array_equal(vl[[5, 1002, 0, 5]], self.strs[[5, 1002, 0, 5]])
+        mask = np.arange(len(self.strs)) % 3 == 0
+        assert_array_equal(vl[mask], self.strs[mask])
+        self.assertRaises(IndexError, vl.__getitem__, 1003)
+
+    def test01(self):
+        """Testing vlcarray iterators"""
+        vl = bcolz.vlcarray(self.strs, chunklen=100, rootdir=self.rootdir)
+        self.assertEqual(list(vl), self.strs.tolist())
+        self.assertEqual(list(vl.iter(10, 900, 3, limit=50, skip=2)),
+                         self.strs[10:900:3][2:52].tolist())
+        mask = np.arange(len(self.strs)) % 7 == 0
+        self.assertEqual(list(vl.where(mask, skip=1)),
+                         self.strs[mask][1:].tolist())
+
+    def test02(self):
+        """Testing appending to a vlcarray"""
+        vl = bcolz.vlcarray(self.strs[:10], rootdir=self.rootdir)
+        vl.append(self.strs[10:])
+        vl.append(u'last')
+        vl.flush()
+        if self.disk:
+            vl = bcolz.open(rootdir=self.rootdir)
+        self.assertEqual(len(vl), len(self.strs) + 1)
+        assert_array_equal(vl[:-1], self.strs)
+        self.assertEqual(vl[-1], u'last')
+
+    def test03(self):
+        """Testing trimming and resizing a vlcarray"""
+        vl = bcolz.vlcarray(self.strs, chunklen=100, rootdir=self.rootdir)
+        vl.trim(103)
+        self.assertEqual(len(vl), 900)
+        vl.resize(905)
+        if self.disk:
+            vl = bcolz.open(rootdir=self.rootdir)
+        assert_array_equal(vl[:900], self.strs[:900])
+        self.assertEqual(vl[900:].tolist(), [u''] * 5)
+        self.assertEqual(len(vl.values), sum(
+            len(s.encode('utf-8')) for s in self.strs[:900]))
+
+    def test04(self):
+        """Testing vlcarray of bytes"""
+        strs = [b'a' * (i % 5000) for i in xrange(100)]
+        vl = bcolz.vlcarray(strs, rootdir=self.rootdir)
+        self.assertEqual(vl.kind, 'S')
+        self.assertEqual(vl[:].tolist(), strs)
+        # The bytes are stored without any padding
+        self.assertEqual(len(vl.values), sum(len(s) for s in strs))
+        self.assertRaises(TypeError, vl.append, u'unicode')
+
+    def test05(self):
+        """Testing vlcarrays as ctable columns"""
+        vl = bcolz.vlcarray(self.strs)
+        t = bcolz.ctable([vl, np.arange(len(vl))], names=['s', 'i'],
+                         rootdir=self.rootdir)
+        if self.disk:
+            t = bcolz.open(rootdir=self.rootdir, mode='a')
+            self.assertTrue(isinstance(t['s'], bcolz.vlcarray))
+        self.assertEqual(t.dtype, np.dtype([('s', 'O'), ('i', int)]))
+        self.assertEqual(t[5]['s'], self.strs[5])
+        self.assertEqual(t[10:20]['s'].tolist(), self.strs[10:20].tolist())
+        self.assertEqual([r.s for r in t.where('i > 990')],
+                         self.strs[991:].tolist())
+        t.append((u'new', 1003))
+        t.flush()
+        if self.disk:
+            t = bcolz.open(rootdir=self.rootdir)
+        self.assertEqual(len(t), 1004)
+        self.assertEqual(t[-1]['s'], u'new')
+
+    @skipUnless(bcolz.pandas_here, "pandas not here")
+    def test06(self):
+        """Testing string columns from a pandas dataframe"""
+        import pandas as pd
+        df = pd.DataFrame({'s': self.strs, 'i': np.arange(len(self.strs))})
+        t = bcolz.ctable.fromdataframe(df, strings='vl',
+                                       rootdir=self.rootdir)
+        self.assertTrue(isinstance(t['s'], bcolz.vlcarray))
+        df2 = t.todataframe()
+        self.assertEqual(df2['s'].tolist(), self.strs.tolist())
+
+    def test07(self):
+        """Testing iterblocks() over ctables with vlcarray/catcarray columns"""
+        cats = np.array(['a', 'b', 'c'], dtype=object)[
+            np.arange(len(self.strs)) % 3]
+        t = bcolz.ctable([bcolz.vlcarray(self.strs, chunklen=100),
+                          bcolz.catcarray(cats, chunklen=100),
+                          np.arange(len(self.strs))],
+                         names=['s', 'c', 'i'], rootdir=self.rootdir)
+        if self.disk:
+            t = bcolz.open(rootdir=self.rootdir)
+        blocks = list(bcolz.iterblocks(t, blen=3, start=0, stop=5))
+        self.assertEqual([len(block) for block in blocks], [3, 2])
+        block = np.concatenate(blocks)
+        self.assertEqual(block['s'].tolist(), self.strs[:5].tolist())
+        self.assertEqual(block['c'].tolist(), cats[:5].tolist())
+        assert_array_equal(block['i'], np.arange(5))
+        blocks = list(bcolz.iterblocks(t, blen=100, start=950))
+        block = np.concatenate(blocks)
+        self.assertEqual(block['s'].tolist(), self.strs[950:].tolist())
+        self.assertEqual(block['c'].tolist(), cats[950:].tolist())
+
+    @skipUnless(bcolz.pandas_here, "pandas not here")
+    def test08(self):
+        """Testing string columns with missing values from a dataframe"""
+        import pandas as pd
+        strs = self.strs.copy()
+        strs[10] = None
+        df = pd.DataFrame({'s': strs, 'i': np.arange(len(strs))})
+        t = bcolz.ctable.fromdataframe(df, strings='vl',
+                                       rootdir=self.rootdir)
+        # Missing values cannot go into a vlcarray
+        self.assertFalse(isinstance(t['s'], bcolz.vlcarray))
+        df2 = t.todataframe()
+        self.assertEqual(df2['s'].tolist(), strs.tolist())
+
+
+class vlcarrayMemoryTest(vlcarrayTest, TestCase):
+    disk = False
+
+
+class vlcarrayDiskTest(vlcarrayTest, TestCase):
+    disk = True
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
+
+
+# Local Variables:
+# mode: python
+# py-indent-offset: 4
+# tab-width: 4
+# fill-column: 72
+# End:
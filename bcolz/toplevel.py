@@ -19,6 +19,8 @@ import itertools as it
 import numpy as np
 import bcolz
 from bcolz.ctable import ROOTDIRS
+from bcolz.vlcarray import is_vlcarray
+from bcolz.catcarray import is_catcarray
 from .py2help import xrange, _inttypes
 
 
@@ -77,8 +79,10 @@ def set_nthreads(nthreads):
 
     Sets the number of threads to be used during carray operation.
 
-    This affects to both Blosc and Numexpr (if available).  If you want to
-    change this number only for Blosc, use `blosc_set_nthreads` instead.
+    This affects to Blosc, Numexpr (if available) and the pool of threads
+    that computes the partial results of reductions over the chunks.  If
+    you want to change this number only for Blosc, use
+    `blosc_set_nthreads` instead.
 
     Parameters
     ----------
@@ -96,6 +100,7 @@ def set_nthreads(nthreads):
 
     """
     nthreads_old = bcolz.blosc_set_nthreads(nthreads)
+    bcolz._set_nthreads(nthreads)
     if bcolz.numexpr_here:
         bcolz.numexpr.set_num_threads(nthreads)
     return nthreads_old
@@ -105,7 +110,7 @@ def open(rootdir, mode='a'):
     """
     open(rootdir, mode='a')
 
-    Open a disk-based carray/ctable.
+    Open a disk-based carray/vlcarray/catcarray/ctable.
 
     Parameters
     ----------
@@ -121,13 +126,18 @@ def open(rootdir, mode='a'):
 
     Returns
     -------
-    out : a carray/ctable object or IOError (if not objects are found)
+    out : a carray/vlcarray/catcarray/ctable object or IOError (if not
+        objects are found)
 
     """
     # First try with a carray
     rootsfile = os.path.join(rootdir, ROOTDIRS)
     if os.path.exists(rootsfile):
         return bcolz.ctable(rootdir=rootdir, mode=mode)
+    elif is_vlcarray(rootdir):
+        return bcolz.vlcarray(rootdir=rootdir, mode=mode)
+    elif is_catcarray(rootdir):
+        return bcolz.catcarray(rootdir=rootdir, mode=mode)
     else:
         return bcolz.carray(rootdir=rootdir, mode=mode)
 
@@ -432,8 +442,8 @@ def arange(start=None, stop=None, step=None, dtype=None, **kwargs):
     return obj
 
 
-def iterblocks(cobj, blen=None, start=0, stop=None):
-    """iterblocks(blen=None, start=0, stop=None)
+def iterblocks(cobj, blen=None, start=0, stop=None, prefetch=0):
+    """iterblocks(blen=None, start=0, stop=None, prefetch=0)
 
     Iterate over a `cobj` (carray/ctable) in blocks of size `blen`.
 
@@ -449,6 +459,10 @@ def iterblocks(cobj, blen=None, start=0, stop=None):
         Where the iterator starts.  The default is to start at the beginning.
     stop : int
         Where the iterator stops. The default is to stop at the end.
+    prefetch : int
+        The number of blocks to be read (and decompressed) in advance by a
+        background thread, so that I/O can overlap with the processing of
+        the current block.  The default is 0 (no prefetching).
 
     Returns
     -------
@@ -463,6 +477,24 @@ def iterblocks(cobj, blen=None, start=0, stop=None):
 
     """
 
+    if prefetch > 0:
+        return _prefetched_blocks(
+            bcolz.utils.prefetcher(_iterblocks(cobj, blen, start, stop),
+                                   prefetch))
+    return _iterblocks(cobj, blen, start, stop)
+
+
+def _prefetched_blocks(prefetcher):
+    """Yield the blocks in `prefetcher`, stopping it when done."""
+    try:
+        for buf in prefetcher:
+            yield buf
+    finally:
+        prefetcher.close()
+
+
+def _iterblocks(cobj, blen, start, stop):
+    """Generator for `iterblocks()`."""
     if stop is None or stop > len(cobj):
         stop = len(cobj)
     if isinstance(cobj, bcolz.ctable):
@@ -507,7 +539,7 @@ def walk(dir, classname=None, mode='a'):
         The directory from which the listing starts.
     classname : string
         If specified, only object of this class are returned.  The values
-        supported are 'carray' and 'ctable'.
+        supported are 'carray', 'vlcarray', 'catcarray' and 'ctable'.
     mode : string
         The mode in which the object should be opened.
 
@@ -524,7 +556,12 @@ def walk(dir, classname=None, mode='a'):
     for node in glob.glob(names):
         if os.path.isdir(node):
             try:
-                obj = bcolz.carray(rootdir=node, mode=mode)
+                if is_vlcarray(node):
+                    obj = bcolz.vlcarray(rootdir=node, mode=mode)
+                elif is_catcarray(node):
+                    obj = bcolz.catcarray(rootdir=node, mode=mode)
+                else:
+                    obj = bcolz.carray(rootdir=node, mode=mode)
             except:
                 try:
                     obj = bcolz.ctable(rootdir=node, mode=mode)
@@ -544,9 +581,14 @@ def walk(dir, classname=None, mode='a'):
             yield node
 
 
+# The filters that can be applied to the data before compressing it
+PREFILTERS = (None, 'delta', 'delta2', 'for')
+
+
 class cparams(object):
     """
-    cparams(clevel=None, shuffle=None, cname=None)
+    cparams(clevel=None, shuffle=None, cname=None, prefilter=None,
+            trimbits=0)
 
     Class to host parameters for compression and other filters.
 
@@ -558,9 +600,26 @@ class cparams(object):
         Whether the shuffle filter is active or not.
     cname : string ('blosclz', 'lz4', 'lz4hc', 'snappy', 'zlib')
         Select the compressor to use inside Blosc.
+    prefilter : string ('delta', 'delta2', 'for')
+        A filter for integer and datetime data that is applied to every
+        chunk before compressing it.  'delta' keeps the differences
+        between consecutive values, 'delta2' the differences of these
+        differences and 'for' (frame of reference) the differences with
+        the first value in the chunk.  This is useful for sorted data,
+        like timestamps or increasing ids.  Chunks with other types of
+        data are compressed as usual.  The default is no prefilter.
+    trimbits : int
+        The number of low bits of the mantissa of floating point values
+        that are set to zero before compressing them.  This is a lossy
+        filter that helps compressing data with less significant digits
+        than their type can hold: a float64 keeps about 4 significant
+        digits with ``trimbits=38``.  NaN and infinite values are kept
+        as they are, and chunks with other types of data are compressed
+        as usual.  The default is 0 (no trimming).
 
     In case some of the parameters are not passed, they will be
-    set to a default (see `setdefaults()` method).
+    set to a default (see `setdefaults()` method).  The prefilter and
+    trimbits are never taken from the defaults.
 
     See also
     --------
@@ -583,6 +642,16 @@ class cparams(object):
         """The compressor name."""
         return self._cname
 
+    @property
+    def prefilter(self):
+        """The prefilter applied before compression."""
+        return self._prefilter
+
+    @property
+    def trimbits(self):
+        """The number of low mantissa bits zeroed in floats."""
+        return self._trimbits
+
     @staticmethod
     def _checkparams(clevel, shuffle, cname):
         if clevel is not None:
@@ -628,18 +697,30 @@ class cparams(object):
         if cname is not None:
             dflts['cname'] = cname
 
-    def __init__(self, clevel=None, shuffle=None, cname=None):
+    def __init__(self, clevel=None, shuffle=None, cname=None,
+                 prefilter=None, trimbits=0):
         clevel, shuffle, cname = cparams._checkparams(clevel, shuffle, cname)
+        if prefilter not in PREFILTERS:
+            raise ValueError(
+                "`prefilter` must be one of %s" % (PREFILTERS,))
+        if not isinstance(trimbits, _inttypes) or trimbits < 0:
+            raise ValueError("`trimbits` must be a non-negative integer")
         dflts = bcolz.defaults.cparams
         self._clevel = dflts['clevel'] if clevel is None else clevel
         self._shuffle = dflts['shuffle'] if shuffle is None else shuffle
         self._cname = dflts['cname'] if cname is None else cname
+        self._prefilter = prefilter
+        self._trimbits = trimbits
 
     def __repr__(self):
         args = ["clevel=%d" % self._clevel,
                 "shuffle=%s" % self._shuffle,
                 "cname='%s'" % self._cname,
                 ]
+        if self._prefilter is not None:
+            args.append("prefilter='%s'" % self._prefilter)
+        if self._trimbits:
+            args.append("trimbits=%d" % self._trimbits)
         return '%s(%s)' % (self.__class__.__name__, ', '.join(args))
 
 
@@ -13,11 +13,18 @@ from __future__ import absolute_import
 
 import os
 import os.path
+import sys
 import subprocess
 import math
+import threading
 from time import time
 import numpy as np
 
+if sys.version_info >= (3, 0):
+    import queue
+else:
+    import Queue as queue
+
 
 def show_stats(explain, tref):
     "Show the used memory (only works for Linux 2.6.x)."
@@ -160,6 +167,75 @@ def build_carray(rootdir):
     return carray(rootdir=rootdir)
 
 
+class prefetcher(object):
+    """Iterate over `iterable` while a background thread reads ahead.
+
+    The thread produces up to `nitems` items in advance, so that the
+    I/O and decompression for the next items can overlap with the
+    processing of the current one.  Exceptions raised by `iterable` are
+    re-raised in the consumer.
+
+    The `iterable` should not keep references to the object holding the
+    prefetcher, or neither will be released until `close()` is called.
+    """
+
+    # How often (in seconds) a blocked producer checks for close()
+    poll_interval = 0.1
+
+    def __init__(self, iterable, nitems):
+        self._queue = queue.Queue(maxsize=max(1, nitems))
+        self._closed = threading.Event()
+        self._thread = threading.Thread(
+            target=self._produce, args=(iter(iterable), self._queue,
+                                        self._closed))
+        self._thread.daemon = True
+        self._thread.start()
+
+    @classmethod
+    def _produce(cls, iterator, queue_, closed):
+        try:
+            for item in iterator:
+                if not cls._put(queue_, closed, (True, item)):
+                    return
+        except BaseException as exc:
+            cls._put(queue_, closed, (False, exc))
+            return
+        cls._put(queue_, closed, (False, None))
+
+    @classmethod
+    def _put(cls, queue_, closed, entry):
+        while not closed.is_set():
+            try:
+                queue_.put(entry, timeout=cls.poll_interval)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._closed.is_set():
+            raise StopIteration
+        isitem, item = self._queue.get()
+        if isitem:
+            return item
+        self.close()
+        if item is None:
+            raise StopIteration
+        raise item
+
+    next = __next__
+
+    def close(self):
+        """Stop the background thread."""
+        self._closed.set()
+
+    def __del__(self):
+        self.close()
+
+
 # Main part
 # =========
 if __name__ == '__main__':
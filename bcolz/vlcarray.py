@@ -0,0 +1,379 @@
+########################################################################
+#
+#       License: BSD
+#       Created: October 18, 2026
+#
+########################################################################
+
+from __future__ import absolute_import
+
+import os
+import json
+import itertools
+
+import numpy as np
+import bcolz
+from bcolz import attrs
+from bcolz.carray_ext import META_DIR, STORAGE_FILE
+from bcolz.strcarray import strcarray
+from .py2help import _inttypes, unicode, xrange
+
+_inttypes += (np.integer,)
+islice = itertools.islice
+
+# The directories for the offsets and the values of a vlcarray
+OFFSETS_DIR = 'offsets'
+VALUES_DIR = 'values'
+
+
+def is_vlcarray(rootdir):
+    """Whether `rootdir` hosts a vlcarray."""
+    return os.path.isdir(os.path.join(rootdir, OFFSETS_DIR))
+
+
+class vlcarray(strcarray):
+    """
+    vlcarray(array=None, kind=None, cparams=None, expectedlen=None,
+    chunklen=None, rootdir=None, mode='a', layout=None)
+
+    A compressed and enlargeable container for variable length strings.
+
+    The strings are stored back to back in a carray of bytes (unicode
+    strings are encoded as UTF-8), and the end offset of every string is
+    kept in a carray of int64.  So, contrarily to carrays of 'S' or 'U'
+    types, the strings take just their own length, without padding.
+
+    A vlcarray can be used as a column of a ctable.  Its values are
+    returned as arrays of objects.
+
+    Parameters
+    ----------
+    array : a sequence of strings
+        This is taken as the input to create the vlcarray.
+    kind : 'S' or 'U', optional
+        Whether the values are bytes ('S') or unicode ('U') strings.  If
+        None, it is inferred from `array`.
+    cparams : instance of the `cparams` class, optional
+        Parameters to the internal Blosc compressor.
+    expectedlen : int, optional
+        A guess on the expected number of strings in this object.
+    chunklen : int, optional
+        The number of strings whose offsets fit into a chunk.
+    rootdir : str, optional
+        The directory where all the data and metadata will be stored.  If
+        specified, the vlcarray object will be disk-based and persistent.
+    mode : str, optional
+        The mode that a *persistent* vlcarray should be created/opened.
+        The values are the same than for `carray`.
+    layout : str, optional
+        The on-disk layout for the chunks of a *persistent* vlcarray being
+        created.  The values are the same than for `carray`.
+
+    """
+
+    _STORAGE_KEY = 'vlen'
+
+    def __init__(self, array=None, kind=None, cparams=None,
+                 expectedlen=None, chunklen=None, rootdir=None, mode='a',
+                 layout=None):
+        self._check_args(mode, kind)
+        self.rootdir = rootdir
+        self.mode = mode
+
+        if array is not None:
+            self._create(array, kind, cparams, expectedlen, chunklen, layout)
+            _new = True
+        elif rootdir is not None:
+            self._open()
+            _new = False
+        else:
+            raise ValueError(
+                "You need at least to pass an array or/and a rootdir")
+
+        # Attach the attrs to this object
+        self.attrs = attrs.attrs(self.rootdir, self.mode, _new=_new)
+
+    def _create(self, array, kind, cparams, expectedlen, chunklen, layout):
+        """Create a new vlcarray."""
+        if kind is None:
+            kind = self._infer_kind(array)
+        self.kind = kind
+        lengths, data = self._encode(array)
+        if expectedlen is None:
+            expectedlen = len(lengths)
+        ckwargs = dict(cparams=cparams, layout=layout)
+        self._create_rootdir()
+        ckwargs['rootdir'] = self._subdir(OFFSETS_DIR)
+        self.offsets = bcolz.carray(np.cumsum(lengths), dtype=np.dtype(np.int64),
+                                    expectedlen=expectedlen,
+                                    chunklen=chunklen, **ckwargs)
+        ckwargs['rootdir'] = self._subdir(VALUES_DIR)
+        self.values = bcolz.carray(data, dtype=np.dtype(np.uint8),
+                                   expectedlen=len(data), **ckwargs)
+        self.flush()
+
+    def _open(self):
+        """Open an existing vlcarray."""
+        if not os.path.isdir(self.rootdir):
+            raise IOError("root directory does not exist")
+        storagef = os.path.join(self.rootdir, META_DIR, STORAGE_FILE)
+        with open(storagef, 'rb') as storagefh:
+            storage = json.loads(storagefh.read().decode('ascii'))
+        self.kind = str(storage['vlen']['kind'])
+        self.offsets = bcolz.carray(rootdir=self._subdir(OFFSETS_DIR),
+                                    mode=self.mode)
+        self.values = bcolz.carray(rootdir=self._subdir(VALUES_DIR),
+                                   mode=self.mode)
+        if self.mode == 'w':
+            # The carrays have been emptied
+            self.flush()
+
+    @staticmethod
+    def _infer_kind(array):
+        """Infer the kind of strings in `array`."""
+        if isinstance(array, bytes):
+            return 'S'
+        dtype = getattr(array, 'dtype', None)
+        if dtype is not None and dtype.kind in ('S', 'U'):
+            return dtype.kind
+        for value in array:
+            if isinstance(value, bytes):
+                return 'S'
+            return 'U'
+        return 'U'
+
+    def _encode(self, array):
+        """Return the (lengths, data) of the strings in `array`."""
+        if isinstance(array, (bytes, unicode)):
+            array = [array]
+        strtype = bytes if self.kind == 'S' else unicode
+        values = []
+        for value in array:
+            if not isinstance(value, strtype):
+                raise TypeError(
+                    "vlcarray of kind '%s' cannot store %r" %
+                    (self.kind, value))
+            if self.kind == 'U':
+                value = value.encode('utf-8')
+            values.append(value)
+        lengths = np.fromiter((len(value) for value in values),
+                              dtype=np.int64, count=len(values))
+        data = np.frombuffer(b"".join(values), dtype=np.uint8)
+        return lengths, data
+
+    def _decode(self, value):
+        """Convert the bytes in `value` into a string of our kind."""
+        if self.kind == 'U':
+            return value.decode('utf-8')
+        return value
+
+    def _containers(self):
+        """Return the inner containers of this object."""
+        return self.offsets, self.values
+
+    def __setitem__(self, key, value):
+        raise NotImplementedError(
+            "modifying the strings of a vlcarray is not supported")
+
+    def __getitem__(self, key):
+        """
+        x.__getitem__(key) <==> x[key]
+
+        Returns values based on `key`.  Integers, slices (with positive
+        steps), lists or arrays of integers and boolean arrays are
+        supported.  The outcome for all but integers is an array of
+        objects.
+        """
+        # Integers
+        if isinstance(key, _inttypes):
+            if key < 0:
+                key += self.len
+            if key < 0 or key >= self.len:
+                raise IndexError("index out of range")
+            return self[key:key + 1][0]
+        # Slices
+        elif isinstance(key, slice):
+            start, stop, step = key.indices(self.len)
+            if step <= 0:
+                raise NotImplementedError(
+                    "step in slice can only be positive")
+            return self._getslice(start, stop, step)
+        # Lists and arrays of integers or booleans
+        if isinstance(key, bcolz.carray):
+            key = key[:]
+        key = np.asarray(key)
+        if key.dtype.kind == 'b':
+            if len(key) != self.len:
+                raise IndexError(
+                    "boolean array length must match len(self)")
+            key = np.nonzero(key)[0]
+        elif key.dtype.kind not in 'iu':
+            raise IndexError(
+                "arrays used as indices must be of integer (or boolean) type")
+        return self._take(key)
+
+    def _getslice(self, start, stop, step):
+        """Return the strings in [start:stop:step] as an array of objects."""
+        out = np.empty(len(xrange(start, stop, step)), dtype=np.object_)
+        if len(out) == 0:
+            return out
+        # Read the offsets and the bytes of the whole range at once
+        ends = self.offsets[start:stop]
+        base = self.offsets[start - 1] if start > 0 else 0
+        data = self.values[base:ends[-1]].tostring()
+        ends -= base
+        starts = np.empty_like(ends)
+        starts[0] = 0
+        starts[1:] = ends[:-1]
+        decode = self._decode
+        for i, pos in enumerate(xrange(0, len(ends), step)):
+            out[i] = decode(data[starts[pos]:ends[pos]])
+        return out
+
+    # This is a private function that is specific for `eval`
+    def _getrange(self, start, blen, out):
+        """Put the strings in [start:start+blen] into `out`."""
+        blen = min(blen, self.len - start)
+        out[:blen] = self._getslice(start, start + blen, 1)
+
+    def _take(self, indices):
+        """Return the strings in `indices` as an array of objects."""
+        indices = indices.astype(np.int64)
+        indices[indices < 0] += self.len
+        if len(indices) and (indices.min() < 0 or indices.max() >= self.len):
+            raise IndexError("index out of range")
+        out = np.empty(len(indices), dtype=np.object_)
+        # Read together the indices falling in the same chunk of offsets
+        order = np.argsort(indices, kind='mergesort')
+        sindices = indices[order]
+        nchunks = sindices // self.chunklen
+        bounds = np.nonzero(np.diff(nchunks))[0] + 1
+        for group in np.split(np.arange(len(sindices)), bounds):
+            if len(group) == 0:
+                continue
+            first, last = sindices[group[0]], sindices[group[-1]]
+            block = self._getslice(first, last + 1, 1)
+            out[order[group]] = block[sindices[group] - first]
+        return out
+
+    def iter(self, start=0, stop=None, step=1, limit=None, skip=0,
+             prefetch=0):
+        """
+        iter(start=0, stop=None, step=1, limit=None, skip=0, prefetch=0)
+
+        Iterator with `start`, `stop` and `step` bounds.  The meaning of
+        the parameters is the same than for `carray.iter()`; `prefetch`
+        is accepted for compatibility, but ignored.
+        """
+        if step <= 0:
+            raise NotImplementedError("step param can only be positive")
+        start, stop, step = slice(start, stop, step).indices(self.len)
+        istop = None
+        if limit is not None:
+            istop = limit + skip
+        return islice(self._iter(start, stop, step), skip, istop)
+
+    def _iter(self, start, stop, step):
+        """Iterate over the strings in [start:stop:step] by blocks."""
+        blen = self.chunklen * step
+        for i in xrange(start, stop, blen):
+            for value in self._getslice(i, min(i + blen, stop), step):
+                yield value
+
+    def where(self, boolarr, limit=None, skip=0):
+        """
+        where(boolarr, limit=None, skip=0)
+
+        Iterator that returns values of this object where `boolarr` is
+        true.  See `carray.where()` for the meaning of the parameters.
+        """
+        if not isinstance(boolarr, bcolz.carray):
+            boolarr = bcolz.carray(boolarr)
+        if len(boolarr) != self.len:
+            raise ValueError(
+                "`boolarr` must be of the same length than ``self``")
+        return self._where(boolarr.wheretrue(limit=limit, skip=skip))
+
+    def _where(self, indices):
+        """Iterate over the strings in `indices` by blocks."""
+        # carray iterators restart when iterated again, so walk them once
+        blen = self.chunklen
+        block = np.empty(blen, dtype=np.int64)
+        n = 0
+        for index in indices:
+            block[n] = index
+            n += 1
+            if n == blen:
+                for value in self._take(block):
+                    yield value
+                n = 0
+        for value in self._take(block[:n]):
+            yield value
+
+    def append(self, array):
+        """
+        append(array)
+
+        Append the strings in `array` (or a single string) to this
+        instance.
+        """
+        lengths, data = self._encode(array)
+        if len(lengths) == 0:
+            return
+        base = self.offsets[-1] if self.len > 0 else 0
+        self.values.append(data)
+        self.offsets.append(base + np.cumsum(lengths))
+
+    def trim(self, nitems):
+        """
+        trim(nitems)
+
+        Remove the trailing `nitems` from this instance.
+        """
+        if nitems > self.len:
+            raise ValueError("`nitems` must be less than total length")
+        if nitems <= 0:
+            self.resize(self.len - nitems)
+            return
+        length = self.len - nitems
+        end = self.offsets[length - 1] if length > 0 else 0
+        self.values.trim(len(self.values) - end)
+        self.offsets.trim(nitems)
+        self._update_disk_sizes()
+
+    def resize(self, nitems):
+        """
+        resize(nitems)
+
+        Resize the instance to have `nitems`.  New items are empty
+        strings.
+        """
+        if nitems < self.len:
+            self.trim(self.len - nitems)
+        elif nitems > self.len:
+            base = self.offsets[-1] if self.len > 0 else 0
+            self.offsets.append(np.repeat(np.int64(base), nitems - self.len))
+            self.flush()
+
+    def copy(self, **kwargs):
+        """
+        copy(**kwargs)
+
+        Return a copy of this object.  `kwargs` are the parameters
+        supported by the vlcarray constructor.
+        """
+        kwargs.setdefault('expectedlen', self.len)
+        kwargs.setdefault('cparams', self.cparams)
+        ccopy = vlcarray([], kind=self.kind, **kwargs)
+        chunklen = self.chunklen
+        for i in xrange(0, self.len, chunklen):
+            ccopy.append(self[i:i + chunklen])
+        ccopy.flush()
+        return ccopy
+
+
+# Local Variables:
+# mode: python
+# tab-width: 4
+# fill-column: 78
+# End: